@@ -1,22 +1,21 @@
 import datetime
-import json
-import requests
 import os
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request  
+from google_services import CALENDAR_SCOPES, CALENDAR_TOKEN_PATH, CREDS_PATH, get_service
+from groq_client import post_chat
+from model_router import route
+from json_locator import parse_lenient
+from storage import get_storage
 
-from dotenv import load_dotenv
+# Même jeton et mêmes scopes que agent_write_agenda : un seul gestionnaire d'identifiants
+SCOPES = CALENDAR_SCOPES
+CALENDAR_ID = "primary"
 
-load_dotenv()
+# Champs réellement utilisés : les réponses incrémentales restent de quelques Ko
+EVENT_FIELDS = "nextPageToken,nextSyncToken,items(id,etag,status,summary,start,end,location,description)"
 
-API_KEY = os.getenv("GROQ_API_KEY")
-
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-OUTPUT_FILE = "./json_files/google_agenda_structured.json" # Fichier de sortie
-SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
+# Événements envoyés au modèle par appel : une réponse reste loin de max_tokens
+LLM_CHUNK_SIZE = 20
 
 # -------------------------------------------------------------
 # Chargement d’un fichier (prompts)
@@ -32,189 +31,255 @@ def load_file(path: str) -> str:
 # -------------------------------------------------------------
 
 def groq_format(prompt: str, raw_content: str) -> str:
-    payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": raw_content},
-        ],
-        "temperature": 0.1
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}"
-    }
-
-    response = requests.post(GROQ_URL, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    def call(model):
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": raw_content},
+            ],
+            "temperature": 0.1
+        }
+
+        response = post_chat(payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    # Modèle rapide d'abord, 70B si la réponse n'est pas un JSON complet
+    content, _ = route(call, validate=_valider_reponse, text=raw_content, label="agenda")
+    return content
+
+
+def _valider_reponse(content: str):
+    if parse_lenient(content).repaired:
+        raise ValueError("Réponse tronquée")
 
 # -------------------------------------------------------------
 # Récupération Google Agenda
 # -------------------------------------------------------------
-def fetch_google_agenda():
-    creds = None
-    token_path = "./json_files/token_calendar.json" # Utilisation du même token que l'autre script
-    creds_path = "./json_files/credentials.json"
-
-    # Utilise token.json s'il existe
-    try:
-        if os.path.exists(token_path):
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-    except:
-        pass
-
-    # Si pas de creds → login
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(creds_path):
-                print(f"Erreur: {creds_path} introuvable.")
-                return []
-                
-            flow = InstalledAppFlow.from_client_secrets_file(
-                creds_path, SCOPES
-            )
-            creds = flow.run_local_server(port=0)
-
-        with open(token_path, "w", encoding="utf-8") as token:
-            token.write(creds.to_json())
-
-    service = build("calendar", "v3", credentials=creds)
-
-    # On regarde à partir de maintenant
-    now = datetime.datetime.utcnow().isoformat() + "Z"
-    print("Lecture du Google Agenda...")
-
-    events_result = service.events().list(
-        calendarId="primary",
-        timeMin=now,
-        maxResults=30,
-        singleEvents=True,
-        orderBy="startTime"
-    ).execute()
-
-    return events_result.get("items", [])
+def _sync_key() -> str:
+    return f"calendar_sync_token:{CALENDAR_ID}"
 
-# -------------------------------------------------------------
-# Gestion JSON Existant (Deduplication)
-# -------------------------------------------------------------
-def load_existing_data(filepath):
-    """Charge le JSON existant ou retourne une liste vide."""
-    if not os.path.exists(filepath):
-        return []
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
-
-def get_event_signatures(data):
-    """
-    Crée un set de signatures (titre + date) pour identifier les doublons.
-    On se base sur les clés 'text' et 'datetime_iso' de ton format précédent,
-    ou 'summary' et 'start' si le format varie.
-    """
-    signatures = set()
-    for item in data:
-        # Adaptation selon les clés que ton prompt génère habituellement
-        title = item.get("text") or item.get("summary") or item.get("titre")
-        date = item.get("datetime_iso") or item.get("date") or item.get("start")
-        
-        if title and date:
-            signatures.add((title, date))
-    return signatures
 
-# -------------------------------------------------------------
-# Agent principal
-# -------------------------------------------------------------
-def google_agenda_agent():
-    # 1. Lire Google Agenda (Tout récupérer)
-    google_events = fetch_google_agenda()
+def load_sync_token():
+    """Dernier nextSyncToken enregistré pour CALENDAR_ID (None → synchro complète)."""
+    return get_storage().get_state(_sync_key())
 
-    if not google_events:
-        print("Aucun événement trouvé sur Google Agenda.")
-        return
 
-    # 2. Charger les données locales existantes pour comparer
-    existing_data = load_existing_data(OUTPUT_FILE)
-    existing_signatures = get_event_signatures(existing_data)
-    
-    print(f" {len(existing_data)} événements déjà en base locale.")
-
-    # 3. Filtrer : garder uniquement les NOUVEAUX événements
-    events_to_process = []
-    
-    for e in google_events:
-        summary = e.get('summary', '')
-        # Récupérer la date (dateTime ou date pour toute la journée)
-        start_date = e.get("start", {}).get("dateTime", e.get("start", {}).get("date", ""))
-        
-        # On vérifie si ce couple (titre, date) existe déjà
-        if (summary, start_date) not in existing_signatures:
-            events_to_process.append(e)
+def save_sync_token(token: str):
+    get_storage().set_state(_sync_key(), token)
+
+
+def _http_status(error):
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def _rfc3339_now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def list_events(service, sync_token=None):
+    """
+    Parcourt toutes les pages de ``events.list``. Avec ``sync_token``, seuls
+    les événements modifiés ou supprimés depuis la dernière synchro sont
+    renvoyés ; un jeton expiré (410 Gone) déclenche une synchro complète.
+    Retourne ``(événements, nextSyncToken, complet)`` ; ``complet`` indique un
+    listing complet, qui ne contient pas les événements annulés.
+
+    La synchro complète est bornée par ``timeMin`` (événements pas encore
+    terminés) : seuls ceux-là sont traités, et l'historique d'un agenda avec
+    récurrences dépliées peut compter des dizaines de milliers d'occurrences.
+    """
+    events = []
+    page_token = None
+    # timeMin est incompatible avec syncToken ; le jeton obtenu garde ce filtre
+    time_min = None if sync_token else _rfc3339_now()
+    while True:
+        params = {
+            "calendarId": CALENDAR_ID,
+            "singleEvents": True,
+            "maxResults": 2500,
+            "fields": EVENT_FIELDS,
+        }
+        if sync_token:
+            params["syncToken"] = sync_token
         else:
-            # Optionnel : décommenter pour voir ce qui est ignoré
-            # print(f"  ↪ Doublon ignoré : {summary}")
+            params["timeMin"] = time_min
+        if page_token:
+            params["pageToken"] = page_token
+
+        try:
+            result = service.events().list(**params).execute()
+        except Exception as e:
+            if sync_token and _http_status(e) == 410:
+                print("Jeton de synchronisation expiré, resynchronisation complète...")
+                return list_events(service, None)
+            raise
+
+        events.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return events, result.get("nextSyncToken"), sync_token is None
+
+
+def _upcoming(events):
+    """Événements actifs qui ne sont pas encore terminés."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    upcoming = []
+    for e in events:
+        if e.get("status") == "cancelled":
+            continue
+        end = e.get("end", {})
+        try:
+            if end.get("dateTime"):
+                if datetime.datetime.fromisoformat(end["dateTime"].replace("Z", "+00:00")) < now:
+                    continue
+            elif end.get("date"):
+                if datetime.date.fromisoformat(end["date"]) <= now.date():
+                    continue
+        except ValueError:
             pass
+        upcoming.append(e)
+    return upcoming
+
+
+def fetch_google_agenda_changes():
+    """
+    Synchro incrémentale : ``(événements modifiés, nextSyncToken, complet)``,
+    annulés compris (``status == "cancelled"``) ; ``complet`` si Google a
+    renvoyé un listing complet (premier passage ou jeton expiré). Le jeton n'est pas enregistré ici ;
+    l'appelant le fait une fois les événements traités, pour ne rien perdre
+    en cas d'échec.
+    """
+    # Service partagé par tout le processus (reconstruit si le jeton change)
+    service = get_service("calendar", "v3", CALENDAR_TOKEN_PATH, SCOPES, CREDS_PATH)
+    if service is None:
+        return [], None, False
+
+    sync_token = load_sync_token()
+    print("Lecture du Google Agenda" + (" (modifications)..." if sync_token else " (synchro complète)..."))
+    return list_events(service, sync_token)
 
-    if not events_to_process:
-        print(" Tous les événements récupérés existent déjà localement. Rien à faire.")
-        return
 
-    print(f" {len(events_to_process)} nouveaux événements détectés à traiter.")
+def fetch_google_agenda():
+    events, next_token, _ = fetch_google_agenda_changes()
+    if next_token:
+        save_sync_token(next_token)
+    return _upcoming(events)
 
-    # 4. Convertir en texte brut SEULEMENT les nouveaux pour le modèle
+# -------------------------------------------------------------
+# Structuration par le modèle
+# -------------------------------------------------------------
+def _raw_text(events) -> str:
     raw_text = ""
-    for e in events_to_process:
+    for e in events:
         start = e.get("start", {}).get("dateTime", e.get("start", {}).get("date", ""))
         end = e.get("end", {}).get("dateTime", e.get("end", {}).get("date", ""))
         raw_text += f"- {e.get('summary', '')}\n"
+        raw_text += f"  Id    : {e['id']}\n"
         raw_text += f"  Début : {start}\n"
         raw_text += f"  Fin   : {end}\n"
         raw_text += f"  Lieu  : {e.get('location', '')}\n"
         raw_text += f"  Description : {e.get('description', '')}\n\n"
+    return raw_text
+
+
+def structurer(prompt: str, events):
+    """
+    Structure un paquet d'événements Google. Retourne ``(structurés, complet)`` :
+    chaque événement structuré porte l'``id`` Google (et l'``etag``) de sa
+    source ; ``complet`` est faux si la réponse a été réparée (tronquée) ou
+    ne couvre pas tout le paquet.
+    """
+    match = parse_lenient(groq_format(prompt, _raw_text(events)))
+    data = match.value
+    if isinstance(data, dict):
+        # Format du prompt : {"evenements": [...]} ; un objet seul vaut un événement
+        data = data["evenements"] if isinstance(data.get("evenements"), list) else [data]
+
+    sources = {e["id"]: e for e in events}
+    ids = [e["id"] for e in events]
+    structured = {}
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        event_id = item.get("id")
+        if event_id not in sources and len(data) == len(events):
+            event_id = ids[index]  # id non recopié : l'ordre fait foi si le compte est bon
+        if event_id in sources:
+            structured[event_id] = {**item, "id": event_id, "etag": sources[event_id].get("etag")}
+
+    return list(structured.values()), not match.repaired and len(structured) == len(events)
+
+# -------------------------------------------------------------
+# Agent principal
+# -------------------------------------------------------------
+def google_agenda_agent():
+    # 1. Lire Google Agenda (uniquement les changements depuis la dernière synchro)
+    changes, next_token, full = fetch_google_agenda_changes()
+    store = get_storage()
+
+    # 2. Suppressions : appliquées localement via l'identifiant Google. Un
+    #    listing complet (jeton expiré) n'annonce pas les suppressions : tout
+    #    événement local absent du listing est retiré
+    if full:
+        removed = store.retain_agenda_events(e["id"] for e in changes if e.get("status") != "cancelled")
+        if removed:
+            print(f" {removed} événement(s) local(aux) absent(s) de Google supprimé(s).")
+    cancelled = [e["id"] for e in changes if e.get("status") == "cancelled"]
+    if cancelled:
+        removed = store.delete_agenda_events(cancelled)
+        print(f" {len(cancelled)} événement(s) supprimé(s) depuis la dernière synchro ({removed} en local).")
+
+    # 3. Garder les événements à venir dont cette version n'est pas déjà enregistrée
+    events_to_process = [
+        e for e in _upcoming(changes)
+        if e.get("etag") is None or store.agenda_event_etag(e["id"]) != e["etag"]
+    ]
+
+    if not events_to_process:
+        print(" Aucun événement nouveau ou modifié à traiter.")
+        if next_token:
+            save_sync_token(next_token)
+        return
+
+    print(f" {len(events_to_process)} événement(s) nouveau(x) ou modifié(s) à traiter.")
 
-    # 5. Appliquer ton prompt spécialisé
-    # Assure-toi que agenda_prompt.txt demande bien de retourner une LISTE JSON
     prompt_path = "./prompt/agenda_prompt.txt"
     if not os.path.exists(prompt_path):
         print(f"Erreur: Prompt {prompt_path} introuvable.")
         return
-
     prompt = load_file(prompt_path)
-    
-    print(" Envoi à Groq pour structuration...")
-    json_response_str = groq_format(prompt, raw_text)
-
-    # 6. Parsing et Fusion
-    try:
-        # On essaye de nettoyer le résultat si Groq ajoute du markdown ```json ... ```
-        clean_json_str = json_response_str.replace("```json", "").replace("```", "").strip()
-        new_structured_data = json.loads(clean_json_str)
-
-        # Si Groq renvoie un seul objet, on le met dans une liste
-        if isinstance(new_structured_data, dict):
-            new_structured_data = [new_structured_data]
-            
-        # Fusion : Anciennes données + Nouvelles données
-        final_data = existing_data + new_structured_data
-        
-        # 7. Sauvegarde
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            json.dump(final_data, f, indent=2, ensure_ascii=False)
-
-        print(f"\n Succès ! {len(new_structured_data)} événements ajoutés.")
-        print(f" Total dans {OUTPUT_FILE} : {len(final_data)} événements.")
-
-    except json.JSONDecodeError:
-        print(" Erreur : Groq n'a pas renvoyé un JSON valide.")
-        print("Réponse brute :", json_response_str)
-    except Exception as e:
-        print(f" Erreur inattendue : {e}")
+
+    # 4. Structuration par paquets ; chaque paquet est enregistré (upsert sur
+    #    l'id Google) dès sa réponse, une relance ne crée donc pas de doublon
+    complete = True
+    saved = 0
+    for start in range(0, len(events_to_process), LLM_CHUNK_SIZE):
+        chunk = events_to_process[start:start + LLM_CHUNK_SIZE]
+        print(f" Envoi à Groq pour structuration ({start + len(chunk)}/{len(events_to_process)})...")
+        try:
+            structured, chunk_complete = structurer(prompt, chunk)
+        except ValueError:
+            print(" Erreur : Groq n'a pas renvoyé un JSON valide.")
+            complete = False
+            continue
+        except Exception as e:
+            print(f" Erreur inattendue : {e}")
+            complete = False
+            continue
+        saved += store.upsert_agenda_events(structured)
+        complete = complete and chunk_complete
+
+    # 5. Le jeton n'avance que si tout a été structuré : sinon la prochaine
+    #    synchro relit les mêmes changements au lieu de les perdre
+    if complete:
+        if next_token:
+            save_sync_token(next_token)
+        print(f"\n Succès ! {saved} événement(s) enregistré(s).")
+    else:
+        print(f"\n Synchro partielle : {saved} événement(s) enregistré(s), jeton non avancé.")
 
 # -------------------------------------------------------------
 if __name__ == "__main__":
-    google_agenda_agent()
\ No newline at end of file
+    google_agenda_agent()
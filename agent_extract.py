@@ -1,19 +1,31 @@
-import os
 import json
-import requests
-from datetime import datetime
-import dateparser
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, datetime
+from functools import lru_cache
+
+import llm_cache
+from groq_client import LIMITERS, post_chat, stream_chat
+from model_router import FAST_MODEL, choisir_modele, enregistrer, route
+from rule_extract import pre_extraire
+from json_locator import JsonScanner, find_json, strip_code_fences
+
+# Fin possible d'une balise ``` encore incomplète (```js… en attente de la suite)
+_SUITE_BALISE = re.compile(r"[\w-]*")
 
 # -------------------------------------------------
 # CONFIGURATION
 # -------------------------------------------------
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
-MODEL_NAME = "llama-3.1-8b-instant"
+# Modèle par défaut (le routeur peut escalader vers STRONG_MODEL)
+MODEL_NAME = FAST_MODEL
+CATEGORIES = ("agenda", "to_do", "note")
+# Langues reconnues par dateparser (évite la détection sur toutes les langues)
+DATE_LANGUAGES = ["fr", "en"]
 
 SYSTEM_PROMPT_FILE = "./prompt/system_prompt.txt"
 USER_PROMPT_FILE = "./prompt/user_prompt.txt"
-OUTPUT_JSON_FILE = "./json_files/extracted_items.json"
 
 # -------------------------------------------------
 # Charger les prompts
@@ -22,77 +34,288 @@ def load_prompt(path):
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-SYSTEM_PROMPT = load_prompt(SYSTEM_PROMPT_FILE)
-USER_PROMPT_TEMPLATE = load_prompt(USER_PROMPT_FILE)
+
+@lru_cache(maxsize=None)
+def get_prompts():
+    """(prompt système, gabarit utilisateur), lus au premier appel seulement."""
+    return load_prompt(SYSTEM_PROMPT_FILE), load_prompt(USER_PROMPT_FILE)
+
+
+def __getattr__(name):
+    # Compatibilité : agent_extract.SYSTEM_PROMPT reste accessible, mais paresseux
+    if name == "SYSTEM_PROMPT":
+        return get_prompts()[0]
+    if name == "USER_PROMPT_TEMPLATE":
+        return get_prompts()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -------------------------------------------------
 # Appel API Groq
 # -------------------------------------------------
-def appeler_groq(text_brut: str):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
+def _preparer_requete(text_brut: str, model: str = MODEL_NAME):
+    """Construit le payload et la clé de cache (None si le cache est désactivé)."""
     # Add today's date to context for relative date parsing
     today = datetime.now().strftime("%Y-%m-%d")
     text_with_context = f"[Current date: {today}]\n\n{text_brut}"
+    system_prompt, user_template = get_prompts()
+    user_prompt = user_template.format(text=text_with_context)
+    temperature = 0.0
+
+    cache_key = None
+    if llm_cache.should_cache(temperature):
+        cache_key = llm_cache.make_key(model, temperature, system_prompt, user_prompt, today)
 
     payload = {
-        "model": MODEL_NAME,
+        "model": model,
         "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(text=text_with_context)},
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
         ],
-        "temperature": 0.0,
+        "temperature": temperature,
         "max_tokens": 1000,
     }
+    return payload, cache_key
+
+
+def _appeler_modele(text_brut: str, model: str):
+    payload, cache_key = _preparer_requete(text_brut, model)
+
+    # Même texte, même jour → même réponse : on évite un appel réseau
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    r = requests.post(GROQ_CHAT_URL, headers=headers, json=payload)
+    r = post_chat(payload)
 
     if r.status_code != 200:
         raise RuntimeError(f"Erreur API Groq {r.status_code} : {r.text}")
 
-    return r.json()["choices"][0]["message"]["content"]
+    content = r.json()["choices"][0]["message"]["content"]
+    if cache_key:
+        llm_cache.put(cache_key, content)
+    return content
+
+
+def appeler_groq(text_brut: str, model: str = None):
+    """
+    Appelle Groq sur le modèle rapide, avec escalade vers le 70B si la réponse
+    ne passe pas ``valider_reponse``. Un ``model`` explicite désactive le routage.
+    """
+    if model:
+        return _appeler_modele(text_brut, model)
+
+    contenu, _ = route(
+        lambda m: _appeler_modele(text_brut, m),
+        validate=valider_reponse,
+        text=text_brut,
+        label="extraction",
+    )
+    return contenu
+
+def appeler_groq_stream(text_brut: str, model: str = None):
+    """
+    Variante streaming de ``appeler_groq`` : générateur des fragments de texte.
+
+    Le modèle est choisi selon la complexité de l'entrée (pas d'escalade en
+    cours de flux). Une réponse déjà en cache est renvoyée en un seul
+    fragment ; une réponse complète reçue en streaming est mise en cache à la fin.
+    """
+    reason = None
+    if not model:
+        model, reason = choisir_modele(text_brut)
+    payload, cache_key = _preparer_requete(text_brut, model)
+    debut = time.perf_counter()
+
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    morceaux = []
+    for delta in stream_chat(payload):
+        morceaux.append(delta)
+        yield delta
+
+    enregistrer("extraction-stream", model, reason, (time.perf_counter() - debut) * 1000)
+    if cache_key:
+        llm_cache.put(cache_key, "".join(morceaux))
 
 # -------------------------------------------------
 # EXTRACTION RÉSUMÉ + JSON
 # -------------------------------------------------
 def extraire_json(texte_modele: str):
-    texte = texte_modele.strip()
+    """Alias historique de ``extraire_message_et_items`` (résumé, items)."""
+    return extraire_message_et_items(texte_modele)
 
-    start = texte.find("[")
-    end = texte.rfind("]")
+def valider_items(items):
+    """Vérifie que les items respectent le schéma du prompt système (lève ValueError)."""
+    if not isinstance(items, list):
+        raise ValueError("Le JSON extrait n'est pas un tableau")
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError(f"Item hors schéma : {item!r}")
+        if item.get("category") not in CATEGORIES:
+            raise ValueError(f"Catégorie inconnue : {item.get('category')!r}")
+        if not isinstance(item.get("text"), str):
+            raise ValueError(f"Texte manquant : {item!r}")
 
-    if start == -1 or end == -1:
-        raise ValueError("Aucun JSON trouvé dans la réponse :\n" + texte_modele)
 
-    resume = texte[:start].strip()
-    json_part = texte[start:end+1].strip()
+def valider_reponse(texte_modele: str):
+    """Une réponse est exploitable si elle se découpe en message + items valides."""
+    _, items = extraire_message_et_items(texte_modele)
+    valider_items(items)
 
-    try:
-        items = json.loads(json_part)
-    except Exception as e:
-        raise ValueError("Erreur parsing JSON :\n" + json_part) from e
 
-    return resume, items
+class FluxExtraction:
+    """
+    Découpe au fil de l'eau une réponse streamée en message naturel + tableau JSON.
+
+    ``ajouter`` reçoit chaque fragment ; le message (texte avant le tableau)
+    grandit progressivement et les items sont parsés dès que le crochet
+    fermant du tableau arrive. Chaque caractère n'est examiné qu'une fois :
+    seul le texte ajouté depuis le fragment précédent est analysé.
+    """
+
+    def __init__(self):
+        self._scanner = JsonScanner()
+        self.items = None
+        self._debut = None
+        self._lu = 0            # texte brut déjà intégré au message
+        self._parties = []      # message sans balises ```, par morceaux
+        self._longueur = 0
+        self._visible = 0       # fin du dernier caractère non blanc du message
+        self._reste = ""        # fin retenue : peut-être une balise ``` incomplète
+
+    @property
+    def texte(self) -> str:
+        return self._scanner.text
+
+    @property
+    def message(self) -> str:
+        if len(self._parties) > 1:
+            self._parties = ["".join(self._parties)]
+        debut = self._parties[0] if self._parties else ""
+        return (debut + strip_code_fences(self._reste)).strip()
+
+    def _fin_message(self) -> int:
+        if self._debut is not None:
+            return self._debut
+        if self._scanner.open_start is not None:
+            # Un crochet est ouvert : on attend de savoir si c'est le JSON
+            return self._scanner.open_start
+        return len(self._scanner)
+
+    def _avancer(self):
+        fin = self._fin_message()
+        if fin <= self._lu:
+            return
+        brut = self._reste + self._scanner.slice(self._lu, fin)
+        self._lu = fin
+
+        # Une balise ``` coupée entre deux fragments n'est retirée qu'une fois complète
+        coupure = brut.rfind("`")
+        if coupure != -1 and _SUITE_BALISE.fullmatch(brut, coupure + 1):
+            coupure = len(brut[:coupure].rstrip("`"))
+            brut, self._reste = brut[:coupure], brut[coupure:]
+        else:
+            self._reste = ""
+
+        propre = strip_code_fences(brut)
+        if propre.strip():
+            self._visible = self._longueur + len(propre.rstrip())
+        self._parties.append(propre)
+        self._longueur += len(propre)
+
+    def ajouter(self, fragment: str) -> bool:
+        """Ajoute un fragment ; retourne True si le message visible a changé."""
+        avant = (self._visible, strip_code_fences(self._reste).strip())
+        for match in self._scanner.feed(fragment):
+            if self.items is None and isinstance(match.value, list):
+                self.items = match.value
+                self._debut = match.start
+        self._avancer()
+        return (self._visible, strip_code_fences(self._reste).strip()) != avant
+
+    def resultat(self):
+        """(message, items) une fois le flux terminé."""
+        if self.items is not None:
+            return self.message, self.items
+        # Réponse tronquée ou inattendue : analyse complète (réparation, erreurs)
+        return extraire_message_et_items(self.texte)
 
 # -------------------------------------------------
 # Normalisation des dates
 # -------------------------------------------------
+# Deux bases de sondage dans la journée : une expression qui donne le même
+# résultat pour les deux ne dépend que de la date (« 12 mars », « lundi 15h »)
+_SONDES = ((0, 0), (12, 30))
+
+
+@lru_cache(maxsize=8)
+def _date_parser(reference: datetime):
+    """Parseur dateparser réutilisable (langues restreintes, base relative fixée)."""
+    # Import différé : dateparser est lourd et inutile pour les dates déjà ISO
+    from dateparser.date import DateDataParser
+
+    return DateDataParser(languages=DATE_LANGUAGES, settings={"RELATIVE_BASE": reference})
+
+
+def _parser(expression: str, reference: datetime):
+    parsed = _date_parser(reference).get_date_data(expression).date_obj
+    return parsed.isoformat() if parsed else None
+
+
+@lru_cache(maxsize=4096)
+def _parser_a_la_date(expression: str, jour: date):
+    """
+    Mémoïsé sur (expression, jour) : ``(iso, False)`` si le résultat ne dépend
+    que de la date de référence, ``(None, True)`` s'il dépend aussi de l'heure
+    (« dans 2 heures », « demain » que dateparser place à l'heure courante).
+    """
+    resultats = {_parser(expression, datetime(jour.year, jour.month, jour.day, *sonde)) for sonde in _SONDES}
+    if len(resultats) == 1:
+        return resultats.pop(), False
+    return None, True
+
+
+@lru_cache(maxsize=1024)
+def _parser_relatif(expression: str, reference: datetime):
+    """Expressions relatives à l'heure : mémoïsées à la minute près."""
+    return _parser(expression, reference)
+
+
+def _parser_expression(expression: str, reference: datetime):
+    iso, relative = _parser_a_la_date(expression, reference.date())
+    if relative:
+        return _parser_relatif(expression, reference)
+    return iso
+
+
+def _iso_rapide(value: str):
+    """Chemin rapide : une chaîne déjà ISO 8601 n'a pas besoin de dateparser."""
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
 def normaliser_dates(items):
+    # Une seule référence pour tout le lot : « demain » a le même sens pour chaque item
+    reference = datetime.now().replace(second=0, microsecond=0)
+
     for it in items:
         raw = it.get("datetime_raw")
         iso = it.get("datetime_iso")
 
         if iso:
-            parsed = dateparser.parse(iso)
+            parsed = _iso_rapide(iso) or _parser_expression(iso, reference)
             if parsed:
-                it["datetime_iso"] = parsed.isoformat()
+                it["datetime_iso"] = parsed
 
         elif raw:
-            parsed = dateparser.parse(raw)
-            it["datetime_iso"] = parsed.isoformat() if parsed else None
+            it["datetime_iso"] = _parser_expression(raw, reference)
 
         else:
             it["datetime_iso"] = None
@@ -102,7 +325,7 @@ def normaliser_dates(items):
 # -------------------------------------------------
 # Sauvegarde conditionnelle
 # -------------------------------------------------
-def ajouter_items_si_user_accepte(items, accept: bool, output=OUTPUT_JSON_FILE):
+def ajouter_items_si_user_accepte(items, accept: bool):
     """
     Ajoute les items SI ET SEULEMENT SI l'utilisateur approuve.
     """
@@ -110,26 +333,26 @@ def ajouter_items_si_user_accepte(items, accept: bool, output=OUTPUT_JSON_FILE):
         print("[INFO] L'utilisateur n'a pas validé. Aucun élément ajouté.")
         return False
 
-    # Charger l'existant
-    if os.path.exists(output):
-        with open(output, "r", encoding="utf-8") as f:
-            existants = json.load(f)
-    else:
-        existants = []
+    from storage import get_item_store, get_storage
 
-    # Ajouter
-    existants.extend(items)
+    store = get_item_store()
+    store.add_items(items)
+    # Historique cherchable : le stockage des items est vidé une fois envoyés
+    get_storage().index_items(items)
 
-    with open(output, "w", encoding="utf-8") as f:
-        json.dump(existants, f, indent=2, ensure_ascii=False)
-
-    print(f"[OK] {len(items)} élément(s) ajouté(s) → {output}")
+    print(f"[OK] {len(items)} élément(s) ajouté(s) → {store.path}")
     return True
 
 # -------------------------------------------------
 # Pipeline principal (ne sauvegarde plus)
 # -------------------------------------------------
 def extraire(text_brut: str):
+    # Cas simples ("Acheter du pain") : extraction locale, sans appel réseau
+    rapide = pre_extraire(text_brut)
+    if rapide:
+        message, items = rapide
+        return message, normaliser_dates(items)
+
     print("[INFO] Analyse en cours...")
     contenu = appeler_groq(text_brut)
 
@@ -139,6 +362,127 @@ def extraire(text_brut: str):
     return message, items
 
 
+# -------------------------------------------------
+# Extraction par lots (backfill de notes / mémos vocaux)
+# -------------------------------------------------
+def _extraire_resultat(index: int, text_brut: str) -> dict:
+    """Extraction d'un texte ; les erreurs sont capturées pour ne pas interrompre le lot."""
+    try:
+        rapide = pre_extraire(text_brut)
+        if rapide:
+            message, items = rapide
+        else:
+            # La fenêtre AIMD partagée limite encore le parallélisme si Groq renvoie des 429
+            with LIMITERS["chat"]:
+                contenu = appeler_groq(text_brut)
+            message, items = extraire_message_et_items(contenu)
+        items = normaliser_dates(items)
+        return {"index": index, "text": text_brut, "message": message, "items": items, "error": None}
+    except Exception as e:
+        return {"index": index, "text": text_brut, "message": None, "items": [], "error": str(e)}
+
+
+def extraire_batch(texts, max_concurrency: int = 4, ordered: bool = True):
+    """
+    Extrait plusieurs textes en parallèle (au plus ``max_concurrency`` appels en vol).
+
+    Générateur de dicts ``{"index", "text", "message", "items", "error"}`` :
+    dans l'ordre des entrées si ``ordered`` est vrai, sinon dans l'ordre
+    d'achèvement. Les textes sont consommés au fur et à mesure, un itérable
+    de plusieurs milliers d'entrées ne sera donc pas chargé d'un bloc.
+    """
+    inputs = enumerate(texts)
+    window = max(1, max_concurrency) * 2
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        def submit_next():
+            try:
+                index, text_brut = next(inputs)
+            except StopIteration:
+                return None
+            return pool.submit(_extraire_resultat, index, text_brut)
+
+        if ordered:
+            pending = deque()
+            while len(pending) < window:
+                future = submit_next()
+                if future is None:
+                    break
+                pending.append(future)
+            while pending:
+                yield pending.popleft().result()
+                future = submit_next()
+                if future is not None:
+                    pending.append(future)
+        else:
+            pending = set()
+            while len(pending) < window:
+                future = submit_next()
+                if future is None:
+                    break
+                pending.add(future)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    nxt = submit_next()
+                    if nxt is not None:
+                        pending.add(nxt)
+
+
+async def extraire_batch_async(texts, max_concurrency: int = 4, ordered: bool = True):
+    """
+    Variante asyncio de ``extraire_batch`` (générateur asynchrone).
+
+    Comme la version synchrone, les textes sont consommés au fil de l'eau :
+    au plus ``2 * max_concurrency`` tâches existent à la fois.
+    """
+    import asyncio
+
+    inputs = enumerate(texts)
+    window = max(1, max_concurrency) * 2
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(index, text_brut):
+        async with semaphore:
+            return await asyncio.to_thread(_extraire_resultat, index, text_brut)
+
+    def submit_next():
+        try:
+            index, text_brut = next(inputs)
+        except StopIteration:
+            return None
+        return asyncio.create_task(run(index, text_brut))
+
+    pending = deque()
+    try:
+        while len(pending) < window:
+            task = submit_next()
+            if task is None:
+                break
+            pending.append(task)
+        if ordered:
+            while pending:
+                result = await pending[0]
+                pending.popleft()
+                yield result
+                task = submit_next()
+                if task is not None:
+                    pending.append(task)
+        else:
+            while pending:
+                done, rest = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending = deque(rest)
+                for task in done:
+                    yield task.result()
+                    nxt = submit_next()
+                    if nxt is not None:
+                        pending.append(nxt)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 def extraire_message_et_items(texte_modele: str):
     """
     Le modèle renvoie :
@@ -146,24 +490,17 @@ def extraire_message_et_items(texte_modele: str):
     2) Un tableau JSON d'items extraits
     """
 
-    texte = texte_modele.strip()
-
-    # Localiser le JSON
-    start = texte.find("[")
-    end = texte.rfind("]")
+    texte = strip_code_fences(texte_modele).strip()
 
-    if start == -1 or end == -1:
+    # Localiser le JSON (crochets de la prose ignorés, fin tronquée réparée)
+    match = find_json(texte, types=(list,))
+    if match is None:
         raise ValueError("Aucun JSON trouvé dans la réponse :\n" + texte_modele)
+    if match.repaired:
+        print(f"[WARN] Réponse tronquée : {len(match.value)} item(s) récupéré(s).")
 
-    message_utilisateur = texte[:start].strip()
-    json_part = texte[start:end+1].strip()
-
-    try:
-        items = json.loads(json_part)
-    except Exception as e:
-        raise ValueError("Erreur parsing JSON :\n" + json_part) from e
-
-    return message_utilisateur, items
+    message_utilisateur = texte[:match.start].strip()
+    return message_utilisateur, match.value
 
 
 # -------------------------------------------------
@@ -1,50 +1,23 @@
 """
-Google Keep Integration - Local JSON Mode
-Notes are stored locally in JSON and can be synced to Google Keep later
+Google Keep Integration - Local SQLite Mode
+Notes are stored locally (``storage``, shared with the Streamlit app) and can be synced to Google Keep later.
+Reads and writes go through the in-memory ``NotesRepository``.
 """
-import os
-import json
 import uuid
 from datetime import datetime
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from notes_repository import get_notes_repository
 
-NOTES_JSON_FILE = "./notes_data.json"
+COLORS = ["RED", "ORANGE", "YELLOW", "GREEN", "TEAL", "BLUE", "PURPLE", "BROWN", "GRAY"]
 
 
 class EaseNotesAgent:
-    """Gère les notes (mode JSON local)"""
+    """Gère les notes (base SQLite locale)"""
     
-    def __init__(self):
+    def __init__(self, repository=None):
         """Initialise l'agent de notes"""
-        self.notes_file = NOTES_JSON_FILE
-        self.load_or_create_notes_file()
-        print("[✓] Agent notes initialisé (JSON local)")
-    
-    def load_or_create_notes_file(self):
-        """Charge ou crée le fichier de notes"""
-        if not os.path.exists(self.notes_file):
-            with open(self.notes_file, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-    
-    def _load_notes(self):
-        """Charge les notes du fichier JSON"""
-        try:
-            with open(self.notes_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erreur lors de la lecture des notes: {e}")
-            return []
-    
-    def _save_notes(self, notes):
-        """Sauvegarde les notes dans le fichier JSON"""
-        try:
-            with open(self.notes_file, "w", encoding="utf-8") as f:
-                json.dump(notes, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde des notes: {e}")
+        self.notes = repository or get_notes_repository()
+        print("[✓] Agent notes initialisé (SQLite local)")
     
     def authenticate(self):
         """Placeholder pour compatibilité"""
@@ -63,22 +36,19 @@ class EaseNotesAgent:
             dict: Informations sur la note créée
         """
         try:
-            notes = self._load_notes()
-            
             note_id = str(uuid.uuid4())
             note = {
                 "id": note_id,
                 "title": title,
                 "text": text,
-                "color": color if color in ["RED", "ORANGE", "YELLOW", "GREEN", "TEAL", "BLUE", "PURPLE", "BROWN", "GRAY"] else "YELLOW",
+                "color": color if color in COLORS else "YELLOW",
                 "archived": False,
                 "pinned": False,
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
             }
             
-            notes.append(note)
-            self._save_notes(notes)
+            self.notes.add(note)
             
             print(f"[✓] Note créée: {title}")
             return {
@@ -100,7 +70,7 @@ class EaseNotesAgent:
             list: Liste des notes avec titre et contenu
         """
         try:
-            notes = self._load_notes()
+            notes = self.notes.all()
             
             result = []
             for note in notes:
@@ -139,6 +109,24 @@ class EaseNotesAgent:
             print(f"[✗] Erreur lors du filtrage des notes: {e}")
             return []
     
+    def search(self, query: str, limit: int = 20):
+        """
+        Recherche plein texte dans les titres et contenus des notes
+        (préfixes, accents ignorés : "reu" trouve "Réunion")
+        
+        Args:
+            query: Mots recherchés (tous requis)
+            limit: Nombre maximal de résultats
+        
+        Returns:
+            list: Notes correspondantes, les plus pertinentes d'abord
+        """
+        try:
+            return self.notes.search(query, limit)
+        except Exception as e:
+            print(f"[✗] Erreur lors de la recherche de notes: {e}")
+            return []
+    
     def update_note(self, note_id: str, title: str = None, text: str = None):
         """
         Met à jour une note existante
@@ -152,19 +140,15 @@ class EaseNotesAgent:
             dict: Informations sur la note mise à jour
         """
         try:
-            notes = self._load_notes()
-            
-            note = next((n for n in notes if n["id"] == note_id), None)
-            if not note:
-                return {"success": False, "error": "Note non trouvée"}
-            
+            changes = {"updated_at": datetime.now().isoformat()}
             if title:
-                note["title"] = title
+                changes["title"] = title
             if text:
-                note["text"] = text
+                changes["text"] = text
             
-            note["updated_at"] = datetime.now().isoformat()
-            self._save_notes(notes)
+            note = self.notes.update(note_id, **changes)
+            if not note:
+                return {"success": False, "error": "Note non trouvée"}
             
             return {
                 "success": True,
@@ -188,15 +172,9 @@ class EaseNotesAgent:
             dict: Résultat de la suppression
         """
         try:
-            notes = self._load_notes()
-            
-            note = next((n for n in notes if n["id"] == note_id), None)
-            if not note:
+            if not self.notes.delete(note_id):
                 return {"success": False, "error": "Note non trouvée"}
             
-            notes = [n for n in notes if n["id"] != note_id]
-            self._save_notes(notes)
-            
             return {
                 "success": True,
                 "deleted_id": note_id,
@@ -217,16 +195,10 @@ class EaseNotesAgent:
             dict: Résultat de l'archivage
         """
         try:
-            notes = self._load_notes()
-            
-            note = next((n for n in notes if n["id"] == note_id), None)
+            note = self.notes.update(note_id, archived=True, updated_at=datetime.now().isoformat())
             if not note:
                 return {"success": False, "error": "Note non trouvée"}
             
-            note["archived"] = True
-            note["updated_at"] = datetime.now().isoformat()
-            self._save_notes(notes)
-            
             return {
                 "success": True,
                 "id": note_id,
@@ -1,6 +1,45 @@
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional
+from datetime import datetime, timedelta, timezone
 from get_tasks_service import get_tasks_service 
+from google_services import BATCH_LIMIT, iter_items
+
+# Tailles de page (maximums de l'API : 1000 listes, 100 tâches)
+TASKLIST_PAGE_SIZE = int(os.getenv("TASKS_TASKLIST_PAGE_SIZE", "1000"))
+TASK_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "100"))
+
+# Listes lues en parallèle (le service partagé est thread-safe, cf. google_services)
+FETCH_WORKERS = int(os.getenv("TASKS_FETCH_WORKERS", "8"))
+
+# Ligne ajoutée aux notes d'une tâche créée avec une référence (clé de l'outbox)
+TASK_REF_PREFIX = "easemyday-ref:"
+
+
+def _rfc3339(due: datetime) -> str:
+    """Date d'échéance au format RFC3339 UTC, ex: "2025-11-25T18:00:00Z"."""
+    if due.tzinfo is not None:
+        due = due.astimezone(timezone.utc).replace(tzinfo=None)
+    return due.isoformat() + "Z"
+
+
+def _parse_due(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _http_status(error) -> Optional[int]:
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def _task_body(title: str, due: Optional[datetime] = None, notes: Optional[str] = None) -> Dict:
+    body = {"title": title}
+    if due:
+        body["due"] = _rfc3339(due)
+    if notes:
+        body["notes"] = notes
+    return body
 
 
 class EaseTasksAgent:
@@ -8,17 +47,71 @@ class EaseTasksAgent:
         self.service = get_tasks_service()
 
     # 1. Lister les listes de tâches
-    def list_tasklists(self) -> List[Dict]:
-        results = self.service.tasklists().list().execute()
-        return results.get("items", [])
+    def iter_tasklists(self, fields: Optional[str] = None, page_size: Optional[int] = None) -> Iterator[Dict]:
+        """Toutes les listes, page par page ; ``fields`` ex. ``"id,title"``."""
+        return iter_items(
+            self.service.tasklists().list,
+            fields=fields,
+            maxResults=page_size or TASKLIST_PAGE_SIZE,
+        )
+
+    def list_tasklists(self, fields: Optional[str] = None) -> List[Dict]:
+        return list(self.iter_tasklists(fields=fields))
 
     # 2. Lire les tâches d'une liste
-    def get_tasks(self, tasklist_id: str, show_completed: bool = True) -> List[Dict]:
-        results = self.service.tasks().list(
+    def iter_tasks(
+        self,
+        tasklist_id: str,
+        show_completed: bool = True,
+        fields: Optional[str] = None,
+        page_size: Optional[int] = None,
+        **params,
+    ) -> Iterator[Dict]:
+        """Toutes les tâches de la liste, page par page ; ``fields`` ex. ``"id,title,status"``.
+
+        ``params`` : paramètres supplémentaires de ``tasks.list``
+        (``updatedMin``, ``showDeleted``, ``showHidden``...).
+        """
+        return iter_items(
+            self.service.tasks().list,
+            fields=fields,
             tasklist=tasklist_id,
-            showCompleted=show_completed
-        ).execute()
-        return results.get("items", [])
+            showCompleted=show_completed,
+            maxResults=page_size or TASK_PAGE_SIZE,
+            **params,
+        )
+
+    def get_tasks(self, tasklist_id: str, show_completed: bool = True, fields: Optional[str] = None, **params) -> List[Dict]:
+        return list(self.iter_tasks(tasklist_id, show_completed=show_completed, fields=fields, **params))
+
+    # 2 bis. Lire toutes les listes en parallèle
+    def get_all_tasks(
+        self,
+        tasklists: Optional[List[Dict]] = None,
+        fields: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        **params,
+    ) -> List[Dict]:
+        """Tâches de chaque liste, lues en parallèle (pool borné).
+
+        Retourne, dans l'ordre des listes, ``{"tasklist", "tasks", "error"}`` :
+        une liste en échec a ``tasks == []`` et son message dans ``error``,
+        sans empêcher la lecture des autres.
+        """
+        if tasklists is None:
+            tasklists = self.list_tasklists(fields="id,title")
+        if not tasklists:
+            return []
+
+        def fetch(tasklist):
+            try:
+                return {"tasklist": tasklist, "tasks": self.get_tasks(tasklist["id"], fields=fields, **params), "error": None}
+            except Exception as e:
+                return {"tasklist": tasklist, "tasks": [], "error": str(e)}
+
+        workers = min(max_workers or FETCH_WORKERS, len(tasklists))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fetch, tasklists))
 
     # 3. Créer une tâche
     def create_task(
@@ -28,55 +121,132 @@ class EaseTasksAgent:
         due: Optional[datetime] = None,
         notes: Optional[str] = None
     ) -> Dict:
-        body = {
-            "title": title,
-        }
-        if due:
-            # format RFC3339, ex: "2025-11-25T18:00:00.000Z"
-            body["due"] = due.isoformat() + "Z"
-        if notes:
-            body["notes"] = notes
+        body = _task_body(title, due, notes)
 
         task = self.service.tasks().insert(
             tasklist=tasklist_id, body=body
         ).execute()
         return task
 
+    # 3 bis. Créer plusieurs tâches en une requête batch
+    def create_tasks(self, tasklist_id: str, items: List[Dict], refs: Optional[List[str]] = None) -> Dict:
+        """Crée une tâche par item extrait (``text``, ``datetime_iso``, ``datetime_raw``).
+
+        Les insertions sont regroupées en requêtes batch de ``BATCH_LIMIT``
+        appels au plus : une trentaine d'items partent en un seul aller-retour.
+        Retourne ``{"created", "skipped", "results"}`` ; ``results`` suit l'ordre
+        de ``items`` avec, pour chacun, ``{"title", "task"}`` ou
+        ``{"title", "error", "http_status"}``. ``refs`` (un par item) est écrit
+        dans les notes, préfixé par ``TASK_REF_PREFIX`` : la tâche reste
+        retrouvable si la réponse se perd.
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending = []
+
+        for index, item in enumerate(items):
+            title = item.get("text") or "Sans titre"
+            notes = [item.get("datetime_raw")]
+            if refs:
+                notes.append(f"{TASK_REF_PREFIX}{refs[index]}")
+            try:
+                body = _task_body(title, _parse_due(item.get("datetime_iso")), "\n".join(filter(None, notes)))
+            except ValueError as e:
+                results[index] = {"title": title, "error": f"date invalide : {e}", "http_status": 400}
+                continue
+            pending.append((index, title, body))
+
+        responses = self._run_batch(
+            (index, self.service.tasks().insert(tasklist=tasklist_id, body=body))
+            for index, _, body in pending
+        )
+        for index, title, _ in pending:
+            response, error = responses.get(index, (None, "aucune réponse"))
+            if error:
+                results[index] = {"title": title, "error": str(error), "http_status": _http_status(error)}
+            else:
+                results[index] = {"title": title, "task": response}
+
+        created = sum(1 for r in results if "task" in r)
+        return {"created": created, "skipped": len(items) - created, "results": results}
+
+    # Requêtes batch : ``requests`` est un itérable de (clé, HttpRequest)
+    def _run_batch(self, requests) -> Dict:
+        """Exécute par paquets de ``BATCH_LIMIT`` ; retourne {clé: (réponse, erreur)}.
+
+        Un paquet qui échoue en bloc (réseau, 5xx du point d'accès batch) ne
+        bloque pas les suivants : ses appels sans réponse reçoivent l'erreur.
+        """
+        requests = list(requests)
+        keys = [key for key, _ in requests]
+        responses = {}
+
+        def callback(request_id, response, exception):
+            responses[keys[int(request_id)]] = (response, exception)
+
+        for start in range(0, len(requests), BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for i in range(start, min(start + BATCH_LIMIT, len(requests))):
+                batch.add(requests[i][1], request_id=str(i))
+            try:
+                batch.execute()
+            except Exception as e:
+                for i in range(start, min(start + BATCH_LIMIT, len(requests))):
+                    responses.setdefault(keys[i], (None, e))
+        return responses
+
+    # PATCH : un seul aller-retour, seuls les champs modifiés sont envoyés
+    def _patch_request(self, tasklist_id: str, task_id: str, body: Dict, etag: Optional[str] = None):
+        request = self.service.tasks().patch(tasklist=tasklist_id, task=task_id, body=body)
+        if etag:
+            # Précondition : échoue (412) si la tâche a changé depuis sa lecture
+            request.headers["If-Match"] = etag
+        return request
+
+    @staticmethod
+    def _status_body(status: str) -> Dict:
+        if status == "needsAction":
+            # Effacer la date d'achèvement en même temps que le statut
+            return {"status": "needsAction", "completed": None}
+        return {"status": status}
+
     # 4. Marquer comme terminée
-    def complete_task(self, tasklist_id: str, task_id: str) -> Dict:
-        task = self.service.tasks().get(
-            tasklist=tasklist_id,
-            task=task_id
-        ).execute()
-        task["status"] = "completed"
-        updated = self.service.tasks().update(
-            tasklist=tasklist_id,
-            task=task_id,
-            body=task
-        ).execute()
-        return updated
+    def complete_task(self, tasklist_id: str, task_id: str, etag: Optional[str] = None) -> Dict:
+        return self._patch_request(tasklist_id, task_id, self._status_body("completed"), etag).execute()
 
-    def reopen_task(self, tasklist_id: str, task_id: str) -> Dict:
+    def reopen_task(self, tasklist_id: str, task_id: str, etag: Optional[str] = None) -> Dict:
         """Revert a completed task back to pending (needsAction).
 
         Google Tasks uses the ``status`` field where ``"needsAction"`` indicates a pending task.
-        This method fetches the task, sets its status back to ``needsAction`` and updates it.
+        A single PATCH sets it (idempotent if the task is already pending).
         """
-        task = self.service.tasks().get(
-            tasklist=tasklist_id,
-            task=task_id
-        ).execute()
-        # Only change if it was completed to avoid unnecessary API calls
-        if task.get("status") == "completed":
-            task["status"] = "needsAction"
-            updated = self.service.tasks().update(
-                tasklist=tasklist_id,
-                task=task_id,
-                body=task
-            ).execute()
-            return updated
-        # If already pending, just return the original task dict
-        return task
+        return self._patch_request(tasklist_id, task_id, self._status_body("needsAction"), etag).execute()
+
+    # 4 bis. Changer le statut de plusieurs tâches en une requête batch
+    def bulk_set_status(self, task_refs: List[Dict], status: str) -> Dict:
+        """Applique ``status`` (``"completed"`` ou ``"needsAction"``) à chaque tâche.
+
+        ``task_refs`` : dicts ``{"list_id", "task_id"}`` (``"etag"`` optionnel),
+        comme ceux affichés dans la barre latérale. Retourne
+        ``{"updated", "skipped", "results"}`` dans l'ordre de ``task_refs``.
+        """
+        if status not in ("completed", "needsAction"):
+            raise ValueError(f"Statut de tâche inconnu : {status}")
+
+        body = self._status_body(status)
+        responses = self._run_batch(
+            (index, self._patch_request(ref["list_id"], ref["task_id"], body, ref.get("etag")))
+            for index, ref in enumerate(task_refs)
+        )
+        results = []
+        for index, ref in enumerate(task_refs):
+            response, error = responses.get(index, (None, "aucune réponse"))
+            if error:
+                results.append({"task_id": ref["task_id"], "error": str(error), "http_status": _http_status(error)})
+            else:
+                results.append({"task_id": ref["task_id"], "task": response})
+
+        updated = sum(1 for r in results if "task" in r)
+        return {"updated": updated, "skipped": len(results) - updated, "results": results}
 
     # 5. Modifier date d'échéance ou titre
     def update_task(
@@ -85,26 +255,21 @@ class EaseTasksAgent:
         task_id: str,
         title: Optional[str] = None,
         due: Optional[datetime] = None,
-        notes: Optional[str] = None
+        notes: Optional[str] = None,
+        etag: Optional[str] = None,
     ) -> Dict:
-        task = self.service.tasks().get(
-            tasklist=tasklist_id,
-            task=task_id
-        ).execute()
-
+        body = {}
         if title:
-            task["title"] = title
+            body["title"] = title
         if due:
-            task["due"] = due.isoformat() + "Z"
+            body["due"] = _rfc3339(due)
         if notes:
-            task["notes"] = notes
+            body["notes"] = notes
+        if not body:
+            # Rien à modifier : simple lecture
+            return self.service.tasks().get(tasklist=tasklist_id, task=task_id).execute()
 
-        updated = self.service.tasks().update(
-            tasklist=tasklist_id,
-            task=task_id,
-            body=task
-        ).execute()
-        return updated
+        return self._patch_request(tasklist_id, task_id, body, etag).execute()
 
 if __name__ == "__main__":
     agent = EaseTasksAgent()
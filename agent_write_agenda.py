@@ -1,28 +1,26 @@
-import json
+import bisect
 import datetime
 from datetime import timezone
-import os.path
-import sys
 import re
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.discovery import Resource
-from google.auth.transport.requests import Request
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+
+from google_services import BATCH_LIMIT, CALENDAR_SCOPES, CALENDAR_TOKEN_PATH, CREDS_PATH, get_service, iter_items
+from storage import get_item_store
+from time_patterns import TIME_RANGE_PATTERNS
+
+if TYPE_CHECKING:
+    from googleapiclient.discovery import Resource
 
 # ========================================
 # CONSTANTES DE CONFIGURATION GLOBALES
 # ========================================
 
-# Google Calendar API - OAuth scopes
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Google Calendar API - OAuth scopes (partagés avec agenda_agent)
+SCOPES = CALENDAR_SCOPES
 
 # Chemins de fichiers
-INPUT_FILE = "./json_files/extracted_items.json"
-TOKEN_PATH = "./json_files/token_calendar.json"
-CREDS_PATH = "./json_files/credentials.json"
+TOKEN_PATH = CALENDAR_TOKEN_PATH
 
 # Paramètres du calendrier
 CALENDAR_ID = "primary"
@@ -38,13 +36,7 @@ def extract_end_time_from_text(text: str, start_time: datetime.datetime) -> date
     Extrait l'heure de fin depuis le texte (ex: "16h-19h", "16h à 19h", "16h30-18h45")
     Si trouvée, retourne un datetime de fin. Sinon, retourne start_time + 1 heure.
     """
-    # Patterns pour matcher les intervalles horaires
-    patterns = [
-        r'(\d{1,2})h(\d{0,2})\s*[-à]\s*(\d{1,2})h(\d{0,2})',  # "16h-19h", "16h30-18h45"
-        r'(\d{1,2}):(\d{2})\s*[-à]\s*(\d{1,2}):(\d{2})',       # "16:00-19:00"
-    ]
-    
-    for pattern in patterns:
+    for pattern in TIME_RANGE_PATTERNS:
         match = re.search(pattern, text)
         if match:
             groups = match.groups()
@@ -66,11 +58,122 @@ def extract_end_time_from_text(text: str, start_time: datetime.datetime) -> date
     return start_time + datetime.timedelta(hours=1)
 
 
+def _http_status(error) -> Optional[int]:
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def _parse_event_time(value: Dict[str, str]) -> Optional[datetime.datetime]:
+    """Champ start/end d'un événement Google → datetime avec fuseau (None si absent)."""
+    if value.get("dateTime"):
+        dt = datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    elif value.get("date"):
+        # Événement sur la journée entière : minuit heure locale
+        dt = datetime.datetime.fromisoformat(value["date"])
+    else:
+        return None
+    return dt if dt.tzinfo else dt.astimezone()
+
+
+class IntervalIndex:
+    """
+    Index d'intervalles en mémoire, trié par début. Une requête de
+    chevauchement ne parcourt que les intervalles commençant entre
+    ``start - durée max`` et ``end`` (recherche dichotomique).
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._intervals = []   # (début, fin, libellé), même ordre que _starts
+        self._max_duration = datetime.timedelta(0)
+
+    def add(self, start: datetime.datetime, end: datetime.datetime, label: str):
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._intervals.insert(i, (start, end, label))
+        self._max_duration = max(self._max_duration, end - start)
+
+    def overlap(self, start: datetime.datetime, end: datetime.datetime):
+        """Premier intervalle qui chevauche [start, end), ou None."""
+        lo = bisect.bisect_left(self._starts, start - self._max_duration)
+        hi = bisect.bisect_left(self._starts, end)
+        for interval in self._intervals[lo:hi]:
+            if interval[1] > start:
+                return interval
+        return None
+
+
+def fetch_busy_index(service, time_min: datetime.datetime, time_max: datetime.datetime,
+                     own_ids=()) -> IntervalIndex:
+    """
+    Un seul ``events.list`` (paginé) sur toute la fenêtre [time_min, time_max].
+    Un événement dont on ne sait pas lire les horaires occupe toute la fenêtre.
+    Les événements dont l'id est dans ``own_ids`` (déjà créés par un essai
+    précédent) ne sont pas indexés mais listés dans ``index.existing``.
+    """
+    index = IntervalIndex()
+    index.existing = set()
+    own_ids = set(own_ids)
+    events = iter_items(
+        service.events().list,
+        fields="id,summary,start,end",
+        calendarId=CALENDAR_ID,
+        timeMin=time_min.isoformat(),
+        timeMax=time_max.isoformat(),
+        singleEvents=True,
+        orderBy='startTime',
+        timeZone=TIMEZONE,
+        maxResults=2500,
+    )
+    for event in events:
+        if event.get('id') in own_ids:
+            index.existing.add(event['id'])
+            continue
+        summary = event.get('summary', 'Événement inconnu')
+        try:
+            start = _parse_event_time(event.get('start', {}))
+            end = _parse_event_time(event.get('end', {}))
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            start, end = time_min, time_max
+        index.add(start, end, summary)
+    return index
+
+
+def insert_events(service, event_bodies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insère les événements ; retourne pour chacun ``{"event"}`` ou ``{"error"}``
+    dans l'ordre d'entrée. Un seul événement part en appel direct, plusieurs
+    en requêtes batch de ``BATCH_LIMIT``.
+    """
+    if len(event_bodies) == 1:
+        try:
+            return [{"event": service.events().insert(calendarId=CALENDAR_ID, body=event_bodies[0]).execute()}]
+        except Exception as e:
+            return [{"error": e}]
+
+    results: List[Dict[str, Any]] = [{} for _ in event_bodies]
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = {"error": exception} if exception is not None else {"event": response}
+
+    for start in range(0, len(event_bodies), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=callback)
+        for i in range(start, min(start + BATCH_LIMIT, len(event_bodies))):
+            batch.add(service.events().insert(calendarId=CALENDAR_ID, body=event_bodies[i]), request_id=str(i))
+        try:
+            batch.execute()
+        except Exception as e:
+            for i in range(start, min(start + BATCH_LIMIT, len(event_bodies))):
+                results[i] = results[i] or {"error": e}
+    return results
+
+
 # ========================================
 # FONCTIONS
 # ========================================
 
-def authenticate_google_calendar() -> Optional[Resource]:
+def authenticate_google_calendar() -> Optional["Resource"]:
     
     """
     Authentifie l'utilisateur avec l'API Google Calendar en utilisant 
@@ -79,88 +182,42 @@ def authenticate_google_calendar() -> Optional[Resource]:
     Returns:
         Un objet de service Google Calendar API, ou None en cas d'échec critique.
     """
-    creds = None
-
-    # Tenter de charger les identifiants existants
-    try:
-        if os.path.exists(TOKEN_PATH):
-            creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    except Exception as e:
-        print(f"Erreur lors du chargement du jeton existant : {e}")
-
-    # Si les identifiants ne sont pas valides ou n'existent pas
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            # Rafraîchir le jeton
-            print("Jeton expiré, rafraîchissement...")
-            creds.refresh(Request())
-        else:
-            # Exécuter le flux OAuth2 complet
-            if not os.path.exists(CREDS_PATH):
-                print(f"Fichier d'identifiants client non trouvé : {CREDS_PATH}")
-                return None
-            print("Démarrage du flux d'authentification OAuth...")
-            flow = InstalledAppFlow.from_client_secrets_file(CREDS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        # Sauvegarder le nouveau jeton
-        with open(TOKEN_PATH, "w", encoding="utf-8") as token:
-            token.write(creds.to_json())
-        print(f"Jeton sauvegardé dans {TOKEN_PATH}.")
-
-    # Construire l'objet de service
+    # Service construit une fois par processus (voir google_services)
     try:
-        service = build("calendar", "v3", credentials=creds)
-        return service
+        return get_service("calendar", "v3", TOKEN_PATH, SCOPES, CREDS_PATH)
     except Exception as e:
         print(f"Erreur lors de la construction du service Google Calendar : {e}")
         return None
 
 
-def create_events_from_json() -> Dict[str, int]:
+def create_events(service, agenda_items: List[Dict[str, Any]],
+                  event_ids: Optional[List[Optional[str]]] = None) -> List[Dict[str, Any]]:
     """
-    Lit les données du fichier INPUT_FILE, filtre les éléments "agenda",
-    et crée des événements dans Google Calendar après vérification des conflits,
-    en utilisant les constantes globales.
+    Crée les événements des items "agenda" : une lecture de l'agenda pour
+    les conflits, puis une requête batch pour les insertions.
+
+    ``event_ids`` (optionnel, base32hex) fixe l'id Google de chaque événement :
+    un nouvel essai après une réponse perdue ne crée pas de doublon.
 
     Returns:
-        Un dictionnaire contenant le nombre d'événements créés et ignorés.
+        Pour chaque item, dans l'ordre, ``{"status", ...}`` avec status parmi
+        "created", "no_date", "invalid_date", "conflict" ou "error".
     """
-    # ----------------------------------------
-    # 1. Authentification
-    # ----------------------------------------
-    service = authenticate_google_calendar()
-    if service is None:
-        return {"created": 0, "skipped": 0}
-
-    # ----------------------------------------
-    # 2. Chargement et filtrage des données
-    # ----------------------------------------
-    if not os.path.exists(INPUT_FILE):
-        print(f"Fichier d'entrée non trouvé : {INPUT_FILE}")
-        return {"created": 0, "skipped": 0}
-
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        data: List[Dict[str, Any]] = json.load(f)
-
-    # Filtrer les éléments avec category = "agenda"
-    agenda_items = [item for item in data if item.get("category") == "agenda"]
-    print(f"{len(agenda_items)} événements 'agenda' trouvés à traiter.")
-    print("-" * 40)
+    event_ids = event_ids or [None] * len(agenda_items)
+    results: List[Dict[str, Any]] = [{} for _ in agenda_items]
 
     # ----------------------------------------
-    # 3. Création des événements
+    # 1. Préparation des événements
     # ----------------------------------------
-    created_count = 0
-    skipped_count = 0
+    candidates = []
 
-    for item in agenda_items:
+    for index, item in enumerate(agenda_items):
         text: str = item.get("text", "Sans titre")
         date_iso: Optional[str] = item.get("datetime_iso")
 
         if not date_iso:
             print(f"-> Ignoré (pas de date): {text}")
-            skipped_count += 1
+            results[index] = {"status": "no_date"}
             continue
 
         # Calculer les heures de début et de fin
@@ -168,7 +225,7 @@ def create_events_from_json() -> Dict[str, int]:
             dt_start = datetime.datetime.fromisoformat(date_iso)
         except ValueError:
             print(f"| Format de date invalide pour : {text} ({date_iso})")
-            skipped_count += 1
+            results[index] = {"status": "invalid_date"}
             continue
 
         # Correction pour les dates "naïves" : ajouter le fuseau horaire local
@@ -178,53 +235,53 @@ def create_events_from_json() -> Dict[str, int]:
 
         # Extraire l'heure de fin depuis le texte
         dt_end = extract_end_time_from_text(text, dt_start)
+        candidates.append((index, item, text, dt_start, dt_end))
+
+    if not candidates:
+        return results
+
+    # ----------------------------------------
+    # 2. Vérification des conflits : une seule lecture de l'agenda
+    # ----------------------------------------
+    try:
+        busy = fetch_busy_index(
+            service,
+            min(c[3] for c in candidates),
+            max(c[4] for c in candidates),
+            own_ids=[i for i in event_ids if i],
+        )
+    except Exception as e:
+        print(f"X Erreur lors de la vérification du conflit : {e}")
+        for index, *_ in candidates:
+            results[index] = {"status": "error", "error": e}
+        return results
 
+    to_insert = []
+    for index, item, text, dt_start, dt_end in candidates:
         # Convertir en chaîne avec l'offset de fuseau horaire pour l'API
         start_str = dt_start.isoformat()
         end_str = dt_end.isoformat()
 
-        # ----------------------------------------
-        # Vérification des conflits
-        # ----------------------------------------
-        try:
-            events_result = service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=start_str,
-                timeMax=end_str,
-                singleEvents=True,
-                orderBy='startTime',
-                timeZone=TIMEZONE
-            ).execute()
-
-            existing_events = events_result.get('items', [])
-
-            if existing_events:
-                # CONFLIT TROUVÉ
-                collision_summary = existing_events[0].get('summary', 'Événement inconnu')
-                # Vérifier que l'événement en conflit commence exactement à la même heure
-                ev_start = existing_events[0].get('start', {}).get('dateTime')
-                try:
-                    ev_dt = datetime.datetime.fromisoformat(ev_start)
-                except Exception:
-                    ev_dt = None
-                if ev_dt and ev_dt.date() == dt_start.date() and ev_dt.time() == dt_start.time():
-                    print(f"X Créneau pris: '{text}' à {start_str}")
-                    print(f"    -> Conflit avec : '{collision_summary}'")
-                else:
-                    # Ignorer les conflits provenant d'un jour différent
-                    print(f"Ignorer conflit potentiel avec '{collision_summary}' (différent jour)")
-                skipped_count += 1
-                continue
-        
-        except Exception as e:
-            print(f"X Erreur lors de la vérification du conflit : {e}")
-            skipped_count += 1 
+        if event_ids[index] in busy.existing:
+            print(f"V Événement déjà présent : {text} ({start_str})")
+            results[index] = {"status": "created", "event": {"id": event_ids[index], "summary": text}}
+            continue
+
+        conflict = busy.overlap(dt_start, dt_end)
+        if conflict:
+            # CONFLIT TROUVÉ
+            ev_dt, _, collision_summary = conflict
+            if ev_dt == dt_start:
+                print(f"X Créneau pris: '{text}' à {start_str}")
+                print(f"    -> Conflit avec : '{collision_summary}'")
+            else:
+                print(f"Ignorer conflit potentiel avec '{collision_summary}' (chevauchement partiel)")
+            results[index] = {"status": "conflict", "conflict": collision_summary}
             continue
 
-        # ----------------------------------------
-        # Création de l'événement
-        # ----------------------------------------
-        event_body = {
+        # Le créneau est réservé pour les items suivants du même lot
+        busy.add(dt_start, dt_end, text)
+        body = {
             "summary": text,
             "description": f"Ajouté par EaseMyDay. \nNote originale: {item.get('text', '')}",
             "start": {
@@ -236,18 +293,57 @@ def create_events_from_json() -> Dict[str, int]:
                 "timeZone": TIMEZONE
             },
         }
+        if event_ids[index]:
+            body["id"] = event_ids[index]
+        to_insert.append((index, start_str, body))
 
-        try:
-            created_event = service.events().insert(
-                calendarId=CALENDAR_ID, body=event_body
-            ).execute()
+    # ----------------------------------------
+    # 3. Création des événements (requête batch)
+    # ----------------------------------------
+    inserted = insert_events(service, [body for _, _, body in to_insert]) if to_insert else []
+    for (index, start_str, body), result in zip(to_insert, inserted):
+        error = result.get("error")
+        if "event" in result or _http_status(error) == 409:
+            # 409 : l'id existe déjà, l'événement a été créé par un essai précédent
+            event = result.get("event") or {"id": body.get("id"), "summary": body["summary"]}
+            print(f"V Événement ajouté : {event.get('summary')} ({start_str})")
+            results[index] = {"status": "created", "event": event}
+        else:
+            print(f"X Erreur lors de l'ajout de l'événement : {error}")
+            results[index] = {"status": "error", "error": error}
 
-            created_count += 1
-            print(f"V Événement ajouté : {created_event.get('summary')} ({start_str})")
-        
-        except Exception as e:
-            print(f"X Erreur lors de l'ajout de l'événement : {e}")
-            skipped_count += 1 
+    return results
+
+
+def create_events_from_json() -> Dict[str, int]:
+    """
+    Lit les items "agenda" du stockage local (``storage``) et crée des événements dans Google Calendar après vérification des conflits,
+    en utilisant les constantes globales.
+
+    Returns:
+        Un dictionnaire contenant le nombre d'événements créés et ignorés.
+    """
+    # ----------------------------------------
+    # 1. Authentification
+    # ----------------------------------------
+    service = authenticate_google_calendar()
+    if service is None:
+        return {"created": 0, "skipped": 0}
+
+    # ----------------------------------------
+    # 2. Chargement et filtrage des données
+    # ----------------------------------------
+    # Filtrage par catégorie fait par la base (index sur category)
+    agenda_items = get_item_store().list_items(category="agenda")
+    print(f"{len(agenda_items)} événements 'agenda' trouvés à traiter.")
+    print("-" * 40)
+
+    # ----------------------------------------
+    # 3. Création des événements
+    # ----------------------------------------
+    results = create_events(service, agenda_items)
+    created_count = sum(1 for r in results if r["status"] == "created")
+    skipped_count = len(results) - created_count
 
     print("-" * 40)
     print(f"Résumé : {created_count} ajoutés, {skipped_count} bloqués (créneau pris ou erreur).")
@@ -1,171 +1,82 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import json
-import os
 import io
-import requests
-from dotenv import load_dotenv
 from audio_recorder_streamlit import audio_recorder
-from datetime import datetime, timezone
+from datetime import datetime
 import uuid
-import json
 
 # Fonctions de ton agent
 from agent_extract import (
     appeler_groq,
+    appeler_groq_stream,
+    FluxExtraction,
     extraire_message_et_items,
+    valider_items,
     normaliser_dates,
     ajouter_items_si_user_accepte
 )
-from agent_write_agenda import create_events_from_json
+from rule_extract import pre_extraire
 # Import the agenda synchronization function
 from agenda_agent import google_agenda_agent
 from agent_task import EaseTasksAgent
-from get_tasks_service import get_tasks_service
+from tasks_mirror import get_mirror
+from outbox import get_outbox
 # Import the smart suggestion function
 from smart_suggest import smart_suggest
+from groq_client import get_api_key, post_transcription
+from storage import get_item_store, get_storage
+from notes_repository import get_notes_repository
 
 # -------------------------------------------------
-# NOTE HELPERS (local JSON storage in ./json_files)
+# NOTE HELPERS (local SQLite storage, shared with EaseNotesAgent through NotesRepository)
 # -------------------------------------------------
-NOTES_JSON = "./json_files/notes.json"
-
 def load_notes():
-    """Load notes from the JSON file (creates it if missing)."""
-    if not os.path.exists(NOTES_JSON):
-        with open(NOTES_JSON, "w", encoding="utf-8") as f:
-            json.dump([], f)
-        return []
-    with open(NOTES_JSON, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_notes(notes):
-    """Write the notes list back to the JSON file."""
-    with open(NOTES_JSON, "w", encoding="utf-8") as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    """Load all notes (in-memory repository, reloaded only when the database changed)."""
+    return get_notes_repository().all()
 
 def add_notes_to_local(json_data):
     """Create local notes from extracted items (category == 'note')."""
-    notes = load_notes()
-    created_count = 0
+    notes = []
     for item in json_data:
         if item.get("category") == "note":
-            note = {
+            notes.append({
                 "id": str(uuid.uuid4()),
                 "title": item.get("title", "Sans titre"),
                 "text": item.get("text", ""),
                 "datetime": item.get("datetime_iso", ""),
                 "created_at": datetime.now().isoformat(),
                 "archived": False,
-            }
-            notes.append(note)
-            created_count += 1
-    save_notes(notes)
+            })
+    repository = get_notes_repository()
+    for note in notes:
+        repository.add(note)
+    repository.flush()
+    created_count = len(notes)
     # Return a summary similar to other add_* functions
     return {"created": created_count, "skipped": 0}
-    # Also clear the extracted items file to avoid re‑processing stale data
-    try:
-        with open("./json_files/extracted_items.json", "w", encoding="utf-8") as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
 
 def delete_note(note_id):
     """Remove a note by its UUID."""
-    notes = load_notes()
-    notes = [n for n in notes if n["id"] != note_id]
-    save_notes(notes)
-
-# Chargement .env
-load_dotenv()
+    get_notes_repository().delete(note_id)
 
 # -------------------------------------------------------
 # FONCTIONS UTILITAIRES
 # -------------------------------------------------------
 def get_google_tasks():
-    """Récupère les tâches de Google Tasks"""
-    try:
-        service = get_tasks_service()
-        tasklists = service.tasklists().list(maxResults=10).execute()
-        task_list_items = tasklists.get("items", [])
-        
-        all_tasks = []
-        for tasklist in task_list_items:
-            tasks = service.tasks().list(tasklist=tasklist["id"], maxResults=20).execute()
-            task_items = tasks.get("items", [])
-            for task in task_items:
-                all_tasks.append({
-                    "title": task.get("title", "Sans titre"),
-                    "status": task.get("status", "needsAction"),
-                    "list": tasklist.get("title", "Sans nom"),
-                    "list_id": tasklist.get("id"),
-                    "task_id": task.get("id")
-                })
-        return all_tasks
-    except Exception as e:
-        st.error(f"Erreur lors de la récupération des tâches: {e}")
-        return []
+    """Tâches Google servies par le miroir local (aucun appel réseau au rendu)"""
+    mirror = get_mirror()
+    if mirror.is_empty:
+        # Premier démarrage sans copie locale : laisser une chance à la synchro initiale
+        mirror.request_refresh(wait=5)
+    if mirror.last_error:
+        st.warning(f"Synchronisation Google Tasks incomplète : {mirror.last_error}")
+    return mirror.snapshot()
 
 
-def add_tasks_to_google(json_data):
-    """Ajoute les tâches de catégorie 'to_do' à Google Tasks"""
-    try:
-        agent = EaseTasksAgent()
-        tasklists = agent.list_tasklists()
-        
-        if not tasklists:
-            st.warning("Aucune liste de tâches trouvée dans Google Tasks")
-            return {"created": 0, "skipped": 0}
-        
-        # Utiliser la première liste de tâches
-        default_tasklist = tasklists[0]["id"]
-        
-        created_count = 0
-        skipped_count = 0
-        
-        for item in json_data:
-            if item.get("category") == "to_do":
-                title = item.get("text", "Sans titre")
-                due_date = item.get("datetime_iso")
-                notes = item.get("datetime_raw")
-                
-                try:
-                    # Convertir la date ISO si elle existe
-                    due_datetime = None
-                    if due_date:
-                        try:
-                            due_datetime = datetime.fromisoformat(due_date)
-                        except Exception:
-                            # Fallback: try adding UTC offset
-                            due_datetime = datetime.fromisoformat(due_date.replace("Z", "+00:00"))
-                    
-                    # Ensure timezone awareness
-                    if due_datetime and due_datetime.tzinfo is None:
-                        due_datetime = due_datetime.replace(tzinfo=timezone.utc)
-                    
-                    agent.create_task(
-                        tasklist_id=default_tasklist,
-                        title=title,
-                        due=due_datetime,
-                        notes=notes
-                    )
-                    created_count += 1
-                    print(f"✓ Tâche créée: {title}")
-                except Exception as e:
-                    skipped_count += 1
-                    print(f"✗ Erreur lors de la création de {title}: {e}")
-        
-        # After processing, clear the extracted items file to avoid re‑processing
-        try:
-            with open("./json_files/extracted_items.json", "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            st.warning(f"Impossible de vider extracted_items.json: {e}")
-
-        return {"created": created_count, "skipped": skipped_count}
-    except Exception as e:
-        st.error(f"Erreur lors de l'ajout des tâches: {e}")
-        return {"created": 0, "skipped": 0}
+def get_google_outbox():
+    """Outbox des écritures Google ; le miroir des tâches s'y abonne à sa création"""
+    get_mirror()
+    return get_outbox()
 
 
 def get_notes():
@@ -176,36 +87,29 @@ def get_notes():
 # DOWNLOAD TASKS TO LOCAL STORAGE
 # -------------------------------------------------------
 def download_tasks_to_local() -> int:
-    """Fetch tasks from Google Tasks and merge them into ``extracted_items.json``.
+    """Fetch tasks from Google Tasks and store them as extracted items.
 
     The function retrieves tasks from the first task list, converts each task to the
-    internal ``extracted_items`` schema (category ``to_do``) and appends them to the
-    existing ``extracted_items.json`` file. It returns the number of tasks added.
+    internal ``extracted_items`` schema (category ``to_do``) and inserts them in the
+    local database. Tasks already downloaded (same Google id) are skipped. It
+    returns the number of tasks added.
     """
     try:
         agent = EaseTasksAgent()
-        tasklists = agent.list_tasklists()
+        tasklists = agent.list_tasklists(fields="id")
         if not tasklists:
             st.warning("Aucune liste de tâches trouvée dans Google Tasks.")
             return 0
         # Use the first task list by default
         default_tasklist = tasklists[0]["id"]
         # Retrieve tasks without completed ones (show_completed=False) and filter just in case
-        tasks = agent.get_tasks(default_tasklist, show_completed=False)
+        tasks = agent.get_tasks(default_tasklist, show_completed=False, fields="id,title,status")
         # Ensure we only keep tasks that are not completed
         tasks = [t for t in tasks if t.get("status") != "completed"]
         if not tasks:
             st.info("Aucune tâche à télécharger.")
             return 0
 
-        # Load existing extracted items (or start with an empty list)
-        extracted_path = "./json_files/extracted_items.json"
-        if os.path.exists(extracted_path):
-            with open(extracted_path, "r", encoding="utf-8") as f:
-                extracted_items = json.load(f)
-        else:
-            extracted_items = []
-
         # Transform Google Tasks entries into the expected schema
         new_items = []
         for task in tasks:
@@ -214,16 +118,14 @@ def download_tasks_to_local() -> int:
                 "category": "to_do",
                 "text": task.get("title", "Sans titre"),
                 "status": task.get("status", "needsAction"),
+                "external_id": task.get("id"),
                 # Optional fields that downstream code may use
                 "datetime_iso": None,
                 "datetime_raw": None,
             })
 
-        # Append and write back
-        extracted_items.extend(new_items)
-        with open(extracted_path, "w", encoding="utf-8") as f:
-            json.dump(extracted_items, f, ensure_ascii=False, indent=2)
-        return len(new_items)
+        # Insert only (no full rewrite); already known tasks are ignored
+        return get_item_store().add_items(new_items)
     except Exception as e:
         st.error(f"Erreur lors du téléchargement des tâches : {e}")
         return 0
@@ -238,14 +140,12 @@ def download_tasks_to_local() -> int:
 # TRANSCRIPTION AUDIO
 # -------------------------------------------------------
 def transcribe_audio_memory(audio_bytes):
-    api_key = os.getenv("GROQ_API_KEY")
+    # .env chargé ici au premier besoin, pas à l'import de l'application
+    api_key = get_api_key()
     if not api_key:
         st.error("Clé API GROQ manquante.")
         return None
 
-    url = "https://api.groq.com/openai/v1/audio/transcriptions"
-    headers = {"Authorization": f"Bearer {api_key}"}
-
     try:
         file_obj = io.BytesIO(audio_bytes)
         file_obj.name = "audio.wav"
@@ -256,7 +156,7 @@ def transcribe_audio_memory(audio_bytes):
             "response_format": (None, "json")
         }
 
-        response = requests.post(url, headers=headers, files=files)
+        response = post_transcription(files, api_key=api_key)
         if response.status_code == 200:
             return response.json().get("text", "")
         else:
@@ -279,13 +179,14 @@ with st.sidebar:
     st.subheader("📝 Mes Tâches")
     
     if st.button("🔄 Actualiser les tâches", key="refresh_tasks"):
+        get_mirror().request_refresh(wait=5)
         st.rerun()
 
     # New button: download tasks from Google Tasks to local storage
     if st.button("📥 Télécharger les tâches locales", key="download_tasks"):
         count = download_tasks_to_local()
         if count:
-            st.success(f"✅ {count} tâche(s) téléchargée(s) dans ./json_files/tasks.json.")
+            st.success(f"✅ {count} tâche(s) téléchargée(s) dans la base locale.")
         else:
             st.info("Aucune tâche téléchargée.")
     
@@ -298,7 +199,15 @@ with st.sidebar:
             completed_tasks = [t for t in tasks if t["status"] == "completed"]
             
             st.markdown(f"**Tâches en attente:** {len(pending_tasks)}")
-            for task in pending_tasks[:10]:  # Afficher max 10
+            visible_pending = pending_tasks[:10]  # Afficher max 10
+            if visible_pending and st.button("✅ Tout terminer", key="complete_all_visible"):
+                try:
+                    # Miroir mis à jour tout de suite, l'outbox envoie une seule requête batch
+                    get_mirror().set_status(visible_pending, "completed")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Erreur lors du marquage des tâches : {e}")
+            for task in visible_pending:
                 # Use a unique key based on task ID; Streamlit automatically manages its state
                 checkbox_key = f"task_{task['task_id']}"
                 checked = st.checkbox(
@@ -308,8 +217,8 @@ with st.sidebar:
                 # When the user checks the box, mark the task as completed in Google Tasks
                 if checked and not st.session_state.get(f"completed_{task['task_id']}", False):
                     try:
-                        agent = EaseTasksAgent()
-                        agent.complete_task(task['list_id'], task['task_id'])
+                        # Mise à jour optimiste : l'outbox appelle Google en arrière-plan
+                        get_mirror().set_status([task], "completed")
                         st.success(f"✅ Tâche '{task['title']}' marquée comme terminée.")
                         st.session_state[f"completed_{task['task_id']}"] = True
                     except Exception as e:
@@ -325,8 +234,7 @@ with st.sidebar:
                             undo_key = f"undo_{task['task_id']}"
                             if st.button("↩️", key=undo_key):
                                 try:
-                                    agent = EaseTasksAgent()
-                                    agent.reopen_task(task['list_id'], task['task_id'])
+                                    get_mirror().set_status([task], "needsAction")
                                     st.success(f"✅ Tâche '{task['title']}' réactivée.")
                                     # Refresh the sidebar to reflect the change
                                     st.rerun()
@@ -339,10 +247,44 @@ with st.sidebar:
     
     st.divider()
     
+    st.subheader("🔄 Synchronisation")
+
+    outbox_keys = st.session_state.get("outbox_keys") or []
+    if outbox_keys:
+        labels = {
+            "pending": "⏳ en attente",
+            "done": "✅ envoyé",
+            "skipped": "⚠️ ignoré",
+            "failed": "❌ échec",
+        }
+        for entry in get_google_outbox().status(outbox_keys):
+            line = f"{labels[entry['state']]} — {entry['label'][:40]}"
+            if entry["error"] and entry["state"] != "done":
+                line += f" ({entry['error']})"
+            st.caption(line)
+        if st.button("🔄 Actualiser la synchronisation", key="refresh_outbox"):
+            st.rerun()
+    else:
+        st.caption("Aucune écriture en attente")
+
+    st.divider()
+
     st.subheader("📝 Mes Notes")
     
     if st.button("🔄 Actualiser les notes", key="refresh_notes"):
         st.rerun()
+
+    # Recherche plein texte (notes et éléments extraits, accents ignorés)
+    search_query = st.text_input("🔍 Rechercher", key="search_query", placeholder="ex. réu budget")
+    if search_query:
+        get_notes_repository().flush()
+        hits = get_storage().search(search_query, limit=10)
+        for hit in hits:
+            icon = "📄" if hit["kind"] == "note" else "📌"
+            label = hit["title"] if hit["kind"] == "note" else hit["text"]
+            st.caption(f"{icon} {(label or '')[:60]}")
+        if not hits:
+            st.caption("Aucun résultat")
     
     try:
         notes = get_notes()
@@ -457,6 +399,9 @@ with col_chat:
     # -------------------------------------------------------
     # TRAITEMENT MESSAGE
     # -------------------------------------------------------
+    # True when the history was already drawn while streaming the answer
+    rendered_live = False
+
     if final_input:
         # Create unique message ID to prevent duplicate processing
         # Use a stable hash based only on the content to avoid duplicate processing
@@ -466,12 +411,37 @@ with col_chat:
             st.session_state.last_message_id = message_id
             st.session_state.messages.append({"role": "user", "content": final_input})
 
-            with st.spinner("Analyse en cours..."):
-                raw = appeler_groq(final_input)
-                message_user, json_data = extraire_message_et_items(raw)
-                json_data = normaliser_dates(json_data)
+            # Draw the history now so the answer can be streamed below it
+            with chat_container:
+                for msg in st.session_state.messages:
+                    st.chat_message(msg["role"]).write(msg["content"])
+                assistant_bubble = st.chat_message("assistant")
+                live_placeholder = assistant_bubble.empty()
+            rendered_live = True
+
+            # Simple one-liners are extracted locally, without calling the LLM
+            rapide = pre_extraire(final_input)
+            if rapide:
+                message_user, json_data = rapide
+            else:
+                # Stream the natural-language part token by token; the JSON array is
+                # parsed as soon as its closing bracket arrives.
+                flux = FluxExtraction()
+                for delta in appeler_groq_stream(final_input):
+                    if flux.ajouter(delta):
+                        live_placeholder.markdown(flux.message + " ▌")
+                try:
+                    message_user, json_data = flux.resultat()
+                    valider_items(json_data)
+                except ValueError:
+                    # Unusable fast-model answer: the routed call escalates to the 70B model
+                    message_user, json_data = extraire_message_et_items(appeler_groq(final_input))
+                    live_placeholder.markdown(message_user)
+            json_data = normaliser_dates(json_data)
 
             st.session_state.last_extracted = json_data
+            # Une acceptation = une extraction : un double clic ne renvoie rien à Google
+            st.session_state.extraction_id = uuid.uuid4().hex
             
             # Détecter si un vrai item existe
             has_extractable_items = (
@@ -493,6 +463,7 @@ with col_chat:
                 response_text += "\n\nAucun élément à enregistrer."
 
             st.session_state.messages.append({"role": "assistant", "content": response_text})
+            live_placeholder.markdown(response_text)
             
             # Reset audio flag to prevent duplicate processing
 
@@ -501,12 +472,12 @@ with col_chat:
     
     # Display all messages in the container (after processing)
     with chat_container:
-        for msg in st.session_state.messages:
-            st.chat_message(msg["role"]).write(msg["content"])
-        else:
-            # Message was already processed, clear the flag so next message can be processed
-            if not st.session_state.pending_save:
-                st.session_state.last_message_id = None
+        if not rendered_live:
+            for msg in st.session_state.messages:
+                st.chat_message(msg["role"]).write(msg["content"])
+        # Message was already processed, clear the flag so next message can be processed
+        if not st.session_state.pending_save:
+            st.session_state.last_message_id = None
 
     # -------------------------------------------------------
     # SUGGESTIONS SECTION
@@ -520,30 +491,11 @@ with col_chat:
         if st.button("💡 Afficher des suggestions"):
             st.session_state.suggest_clicks += 1
             # Prepare data for smart suggestions: combine extracted items with agenda items
-            extracted_path = "./json_files/extracted_items.json"
-            agenda_path = "./json_files/google_agenda_structured.json"
-            combined_path = "./json_files/_suggest_input.json"
-            try:
-                with open(extracted_path, "r", encoding="utf-8") as f:
-                    extracted_data = json.load(f)
-            except Exception:
-                extracted_data = []
-            try:
-                with open(agenda_path, "r", encoding="utf-8") as f:
-                    agenda_data = json.load(f)
-            except Exception:
-                agenda_data = []
-            # Merge both lists (agenda items may have a different schema; we keep them as‑is)
-            combined_data = extracted_data + agenda_data
-            # Write temporary combined file for the suggestion agent
-            try:
-                with open(combined_path, "w", encoding="utf-8") as f:
-                    json.dump(combined_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                st.error(f"Erreur lors de la création du fichier de suggestions : {e}")
-                combined_path = extracted_path  # fallback to extracted only
-            # Run the smart suggestion agent on the combined data
-            result = smart_suggest(json_path=combined_path)
+            # Agenda items may have a different schema; we keep them as‑is
+            combined_data = get_item_store().list_items() + get_storage().list_agenda_events()
+            # Run the smart suggestion agent on the combined data (cached while
+            # the combined input is unchanged)
+            result = smart_suggest(data=combined_data, use_cache=True)
             suggestions = result.get("output", {})
             st.subheader("Suggestions générées")
 
@@ -599,32 +551,25 @@ with col_chat:
                 ajouter_items_si_user_accepte(current_items, True)
                 st.success("Les éléments ont été ajoutés.")
 
-                # Si des éléments "agenda" existent, créer les événements Google Calendar
-                agenda_items = [item for item in current_items if item.get("category") == "agenda"]
-                if agenda_items:
-                    with st.spinner(" Ajout des événements au calendrier..."):
-                        result = create_events_from_json()
-                        st.success(f" {result['created']} événement(s) ajouté(s) au calendrier!")
-                        if result['skipped'] > 0:
-                            st.warning(f" {result['skipped']} événement(s) ignoré(s) (créneau pris ou erreur)")
-
-                # Si des éléments "to_do" existent, créer les tâches Google Tasks
-                todo_items = [item for item in current_items if item.get("category") == "to_do"]
-                if todo_items:
-                    with st.spinner(" Ajout des tâches..."):
-                        result = add_tasks_to_google(current_items)
-                        st.success(f" {result['created']} tâche(s) ajoutée(s) à Google Tasks!")
-                        if result['skipped'] > 0:
-                            st.warning(f" {result['skipped']} tâche(s) ignorée(s)")
+                # Événements et tâches : mis en file (outbox), envoyés à Google en arrière-plan
+                outbox = get_google_outbox()
+                keys = outbox.enqueue_items(current_items, st.session_state.get("extraction_id"))
+                if keys:
+                    st.session_state.outbox_keys = (st.session_state.get("outbox_keys") or []) + keys
+                    st.info(f" {len(keys)} élément(s) en cours de synchronisation avec Google.")
+                    # Les items sont désormais dans l'outbox (durable) : ne pas les retraiter
+                    try:
+                        get_item_store().clear_items()
+                    except Exception as e:
+                        st.warning(f"Impossible de vider les éléments extraits: {e}")
 
                 # Si des éléments "note" existent, créer les notes locales
                 note_items = [item for item in current_items if item.get("category") == "note"]
                 if note_items:
-                    with st.spinner(" Ajout des notes..."):
-                        result = add_notes_to_local(current_items)
-                        st.success(f" {result['created']} note(s) ajoutée(s)!")
-                        if result['skipped'] > 0:
-                            st.warning(f" {result['skipped']} note(s) ignorée(s)")
+                    result = add_notes_to_local(current_items)
+                    st.success(f" {result['created']} note(s) ajoutée(s)!")
+                    if result['skipped'] > 0:
+                        st.warning(f" {result['skipped']} note(s) ignorée(s)")
                 # Reset temporary variables
                 current_items = []
                 st.session_state.pending_save = False
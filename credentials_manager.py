@@ -0,0 +1,213 @@
+"""
+Gestion centralisée des identifiants OAuth Google.
+
+Un ``CredentialManager`` par fichier de jeton (et jeu de scopes) garde les
+identifiants en mémoire et les rafraîchit en arrière-plan, ``REFRESH_MARGIN``
+avant leur expiration : les requêtes utilisateur ne paient jamais un
+rafraîchissement OAuth (sauf jeton déjà expiré, au réveil de la machine).
+Les rafraîchissements concurrents sont fusionnés, et le fichier de jeton
+n'est réécrit (atomiquement) que si son contenu change.
+"""
+import datetime
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+CREDS_PATH = "./json_files/credentials.json"
+
+# Rafraîchir ce délai avant l'expiration (les jetons Google durent 1 h)
+REFRESH_MARGIN = datetime.timedelta(seconds=int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300")))
+# Nouvel essai après un échec de rafraîchissement en arrière-plan
+RETRY_DELAY = 60.0
+
+
+def _utcnow() -> datetime.datetime:
+    # google-auth stocke ``expiry`` en UTC naïf
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class CredentialManager:
+    def __init__(self, token_path: str, scopes, creds_path: str = CREDS_PATH):
+        self.token_path = token_path
+        self.scopes = list(scopes)
+        self.creds_path = creds_path
+        self.creds = None
+
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._mtime: Optional[float] = None   # mtime du jeton tel que lu ou écrit par nous
+        self._written: Optional[str] = None   # dernier contenu connu du fichier
+
+    # -------------------------------------------------
+    # Accès
+    # -------------------------------------------------
+    def get(self):
+        """Identifiants valides ; ne bloque que si le jeton est déjà expiré."""
+        creds = self.creds
+        if creds is not None and not self._needs_refresh(creds, datetime.timedelta(0)):
+            return creds
+        with self._lock:
+            if self.creds is None:
+                self._load()
+            elif self._needs_refresh(self.creds, datetime.timedelta(0)):
+                self._refresh_locked(interactive=True)
+            return self.creds
+
+    def refresh(self, force: bool = False):
+        """Rafraîchit si l'expiration est proche ; un seul appel réseau pour N appelants."""
+        with self._lock:
+            if self.creds is None:
+                return None
+            # Si un autre thread vient de rafraîchir, rien à faire
+            if force or self._needs_refresh(self.creds, REFRESH_MARGIN):
+                self._refresh_locked()
+            return self.creds
+
+    def sync_from_disk(self) -> bool:
+        """Recharge le jeton s'il a été modifié par un autre processus ; True si c'est le cas."""
+        with self._lock:
+            mtime = _mtime(self.token_path)
+            if mtime is None or mtime == self._mtime or self.creds is None:
+                return False
+            creds = self._read_token()
+            if creds is None:
+                return False
+            self.creds = creds
+            self._mtime = mtime
+            self._written = creds.to_json()
+            self._schedule()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    # -------------------------------------------------
+    # Chargement / rafraîchissement (verrou tenu)
+    # -------------------------------------------------
+    @staticmethod
+    def _needs_refresh(creds, margin: datetime.timedelta) -> bool:
+        if creds.expiry is None:
+            return not creds.valid
+        return creds.expiry - margin <= _utcnow()
+
+    def _read_token(self):
+        from google.oauth2.credentials import Credentials
+
+        try:
+            if os.path.exists(self.token_path):
+                return Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        except Exception as e:
+            print(f"Erreur lors du chargement du jeton existant : {e}")
+        return None
+
+    def _authorize(self):
+        """Flux OAuth interactif (premier lancement ou jeton révoqué)."""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        if not os.path.exists(self.creds_path):
+            print(f"Fichier d'identifiants client non trouvé : {self.creds_path}")
+            return None
+        flow = InstalledAppFlow.from_client_secrets_file(self.creds_path, self.scopes)
+        return flow.run_local_server(port=0)
+
+    @staticmethod
+    def _refresh_creds(creds):
+        from google.auth.transport.requests import Request
+
+        creds.refresh(Request())
+
+    def _load(self):
+        creds = self._read_token()
+        self._mtime = _mtime(self.token_path)
+        if creds is not None:
+            self._written = creds.to_json()
+
+        if creds is not None and not creds.valid and creds.refresh_token:
+            self.creds = creds
+            self._refresh_locked(interactive=True)
+            return
+        if creds is None or not creds.valid:
+            creds = self._authorize()
+            if creds is None:
+                return
+        self.creds = creds
+        self._save()
+        self._schedule()
+
+    def _refresh_locked(self, interactive: bool = False):
+        if self.creds.refresh_token:
+            self._refresh_creds(self.creds)
+        elif interactive:
+            # Pas de refresh_token : seule une nouvelle autorisation est possible
+            creds = self._authorize()
+            if creds is None:
+                return
+            self.creds = creds
+        else:
+            return
+        self._save()
+        self._schedule()
+
+    def _save(self):
+        """Écriture atomique, uniquement si le contenu a changé."""
+        data = self.creds.to_json()
+        if data == self._written:
+            return
+        tmp_path = f"{self.token_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.token_path)
+        self._written = data
+        self._mtime = _mtime(self.token_path)
+
+    # -------------------------------------------------
+    # Minuterie de rafraîchissement proactif
+    # -------------------------------------------------
+    def _schedule(self, delay: Optional[float] = None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if delay is None:
+            if self.creds is None or self.creds.expiry is None:
+                return
+            delay = max((self.creds.expiry - REFRESH_MARGIN - _utcnow()).total_seconds(), 0)
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Échec du rafraîchissement du jeton {self.token_path} : {e}")
+            with self._lock:
+                self._schedule(RETRY_DELAY)
+
+
+_managers: Dict[Tuple[str, Tuple[str, ...]], CredentialManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(token_path: str, scopes, creds_path: str = CREDS_PATH) -> CredentialManager:
+    """Gestionnaire partagé pour ce fichier de jeton et ces scopes."""
+    key = (os.path.abspath(token_path), tuple(sorted(scopes)))
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = CredentialManager(token_path, scopes, creds_path)
+        return manager
+
+
+def get_credentials(token_path: str, scopes, creds_path: str = CREDS_PATH):
+    """Identifiants prêts à l'emploi (None si aucune autorisation possible)."""
+    return get_manager(token_path, scopes, creds_path).get()
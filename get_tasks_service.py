@@ -1,34 +1,15 @@
 from __future__ import annotations
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-import os.path
-import requests
-from google.auth.transport.requests import Request
 
+from google_services import CREDS_PATH, TASKS_SCOPES, TASKS_TOKEN_PATH, get_service
 
-SCOPES = ["https://www.googleapis.com/auth/tasks"]
 
-def get_tasks_service():
-    creds = None
-
-    if os.path.exists("./json_files/token.json"):
-        creds = Credentials.from_authorized_user_file("./json_files/token.json", SCOPES)
+SCOPES = TASKS_SCOPES
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                "./json_files/credentials.json", SCOPES
-            )
-            creds = flow.run_local_server(port=0)
+TOKEN_PATH = TASKS_TOKEN_PATH
 
-        with open("./json_files/token.json", "w") as token:
-            token.write(creds.to_json())
-
-    service = build("tasks", "v1", credentials=creds)
-    return service
+def get_tasks_service():
+    # Service partagé par tout le processus (reconstruit si token.json change)
+    return get_service("tasks", "v1", TOKEN_PATH, SCOPES, CREDS_PATH)
 
 if __name__ == "__main__":
     service = get_tasks_service()
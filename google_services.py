@@ -0,0 +1,126 @@
+"""
+Cache process-wide des services Google API (Tasks, Calendar).
+
+Chaque service est construit une seule fois par processus et par jeu
+d'identifiants (API, version, fichier de jeton, scopes), à partir des
+documents de découverte embarqués dans ``googleapiclient`` (aucun appel
+réseau pour la découverte). Le service est partageable entre sessions
+Streamlit : chaque requête reçoit son propre ``httplib2.Http`` (qui n'est
+pas thread-safe). Les identifiants viennent de ``credentials_manager`` ;
+si le gestionnaire en change (jeton remplacé sur disque, nouvelle
+autorisation), le service est reconstruit ; ``invalidate_services`` force la
+reconstruction.
+"""
+import os
+import threading
+from typing import Iterable, Optional
+
+from credentials_manager import CREDS_PATH, get_manager
+
+# Scopes et jetons partagés : un seul jeton calendrier, en lecture/écriture
+TASKS_SCOPES = ["https://www.googleapis.com/auth/tasks"]
+CALENDAR_SCOPES = ["https://www.googleapis.com/auth/calendar"]
+TASKS_TOKEN_PATH = "./json_files/token.json"
+CALENDAR_TOKEN_PATH = "./json_files/token_calendar.json"
+
+# Appels par requête batch, pour Tasks comme pour Calendar. Google accepte
+# jusqu'à 1000 appels par batch mais Calendar déconseille d'aller au-delà de
+# 50 ; une seule valeur prudente borne aussi le nombre d'items touchés quand
+# un paquet entier échoue.
+BATCH_LIMIT = 50
+
+_lock = threading.Lock()
+# (api, version, jeton, scopes) -> (identifiants, service construit avec eux)
+_services = {}
+
+
+def _key(api: str, version: str, token_path: str, scopes: Iterable[str]):
+    return api, version, os.path.abspath(token_path), tuple(sorted(scopes))
+
+
+# -------------------------------------------------
+# Construction des services
+# -------------------------------------------------
+def build_service(api: str, version: str, creds):
+    """Construit un service thread-safe (découverte statique, pas de cache disque)."""
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.discovery import build
+    from googleapiclient.http import HttpRequest
+
+    def request_builder(http, *args, **kwargs):
+        # httplib2.Http n'est pas thread-safe : un transport neuf par requête
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        return HttpRequest(http, *args, **kwargs)
+
+    authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return build(
+        api,
+        version,
+        http=authorized_http,
+        requestBuilder=request_builder,
+        static_discovery=True,
+        cache_discovery=False,
+    )
+
+
+def get_service(api: str, version: str, token_path: str, scopes, creds_path: str = CREDS_PATH):
+    """
+    Service Google partagé pour ce jeu d'identifiants, construit au premier
+    appel puis réutilisé. Les identifiants sont ceux du ``CredentialManager``
+    (rafraîchis en place, en arrière-plan) ; le service est reconstruit quand
+    le gestionnaire en détient de nouveaux (jeton remplacé par un autre
+    processus, nouvelle autorisation). Retourne None si l'authentification
+    est impossible.
+    """
+    key = _key(api, version, token_path, scopes)
+    manager = get_manager(token_path, scopes, creds_path)
+
+    # Hors verrou global : un rafraîchissement réseau ou le flux OAuth
+    # interactif ne bloque que les appelants de ce gestionnaire
+    manager.sync_from_disk()
+    creds = manager.get()
+    if creds is None:
+        return None
+
+    with _lock:
+        cached = _services.get(key)
+        if cached is not None and cached[0] is creds:
+            return cached[1]
+        # Découverte statique : construction locale, sans appel réseau
+        service = build_service(api, version, creds)
+        _services[key] = (creds, service)
+        return service
+
+
+def invalidate_services(token_path: Optional[str] = None):
+    """Oublie les services en cache (tous, ou ceux liés à ``token_path``)."""
+    with _lock:
+        if token_path is None:
+            _services.clear()
+            return
+        path = os.path.abspath(token_path)
+        for key in [k for k in _services if k[2] == path]:
+            del _services[key]
+
+
+# -------------------------------------------------
+# Lectures paginées
+# -------------------------------------------------
+def iter_items(method, fields: Optional[str] = None, **params):
+    """
+    Parcourt paresseusement toutes les pages d'une méthode ``list`` (ex.
+    ``service.tasks().list``). ``fields`` restreint chaque élément aux
+    attributs utiles (ex. ``"id,title"``) : réponse partielle, plus légère.
+    """
+    if fields:
+        params["fields"] = f"nextPageToken,items({fields})"
+    page_token = None
+    while True:
+        if page_token:
+            params["pageToken"] = page_token
+        result = method(**params).execute()
+        yield from result.get("items", [])
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return
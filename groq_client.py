@@ -0,0 +1,327 @@
+"""
+Client HTTP partagé pour l'API Groq.
+
+Une seule ``requests.Session`` (pool de connexions keep-alive) est réutilisée
+par tous les appels : extraction, formatage d'agenda, suggestions et
+transcription audio. On évite ainsi une poignée de main TCP+TLS par message.
+
+Les réponses 429 / 5xx sont rejouées avec un backoff exponentiel « jitteré »
+qui respecte les en-têtes ``retry-after`` et ``x-ratelimit-reset-*``. Une
+fenêtre de concurrence adaptative (AIMD) par endpoint permet aux traitements
+par lots de rester juste sous le quota.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+
+# ``requests`` n'est importé qu'à la création de la session (démarrage plus rapide)
+if TYPE_CHECKING:
+    import requests
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+GROQ_CHAT_URL = f"{GROQ_BASE_URL}/chat/completions"
+GROQ_TRANSCRIPTION_URL = f"{GROQ_BASE_URL}/audio/transcriptions"
+
+# Nombre maximal de connexions gardées ouvertes vers api.groq.com
+POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "10"))
+
+# Timeouts (connexion, lecture) en secondes, par endpoint
+CHAT_TIMEOUT = (3.05, 60)
+TRANSCRIPTION_TIMEOUT = (3.05, 120)
+
+# Rejeu des erreurs transitoires
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5   # secondes
+BACKOFF_MAX = 30.0   # secondes
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# -------------------------------------------------
+# Session partagée
+# -------------------------------------------------
+def _build_session(pool_size: int) -> requests.Session:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Retourne la session partagée (créée au premier appel)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(POOL_SIZE)
+    return _session
+
+
+def configure(pool_size: int = None):
+    """Reconstruit la session, par exemple avec une autre taille de pool."""
+    global _session, POOL_SIZE
+    with _session_lock:
+        if pool_size:
+            POOL_SIZE = pool_size
+        old = _session
+        _session = _build_session(POOL_SIZE)
+    if old is not None:
+        old.close()
+
+
+# -------------------------------------------------
+# Fenêtre de concurrence adaptative (AIMD)
+# -------------------------------------------------
+class AdaptiveLimiter:
+    """
+    Sémaphore dont la taille suit un schéma AIMD : +1 par fenêtre de succès,
+    division par deux à chaque 429 (au plus une fois par ``cooldown`` secondes,
+    pour ne pas réagir plusieurs fois à la même rafale).
+
+    À utiliser comme context manager autour des appels de lots / tâches de fond.
+    Les appels interactifs ne l'acquièrent pas mais l'alimentent en signaux.
+    """
+
+    def __init__(self, initial: float = 4, minimum: float = 1, maximum: float = 16, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def on_success(self):
+        with self._cond:
+            # Augmentation additive : +1 après environ « limit » succès
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+
+
+LIMITERS = {
+    "chat": AdaptiveLimiter(initial=int(os.getenv("GROQ_CHAT_CONCURRENCY", "4"))),
+    "transcription": AdaptiveLimiter(initial=int(os.getenv("GROQ_TRANSCRIPTION_CONCURRENCY", "2"))),
+}
+
+
+# -------------------------------------------------
+# Rejeu avec backoff
+# -------------------------------------------------
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value):
+    """
+    Convertit une durée d'en-tête en secondes.
+
+    Formats acceptés : ``"2"``, ``"1.5"``, ``"7.66s"``, ``"2m59.56s"``,
+    ``"120ms"`` ou une date HTTP (``retry-after``). Retourne None si illisible.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * factors[u] for n, u in parts)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(response, attempt: int) -> float:
+    headers = response.headers if response is not None else {}
+    delay = parse_duration(headers.get("retry-after"))
+
+    if delay is None and response is not None and response.status_code == 429:
+        # Groq indique quand les quotas requêtes / tokens se rechargent
+        resets = []
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if reset is not None and remaining in (None, "0"):
+                resets.append(reset)
+        if resets:
+            delay = max(resets)
+
+    if delay is not None:
+        return min(BACKOFF_MAX, delay) + random.uniform(0, BACKOFF_BASE)
+    # « Full jitter » : uniforme entre 0 et la borne exponentielle
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _send_with_retry(send, endpoint: str, rewind=None) -> requests.Response:
+    """
+    Exécute ``send()`` et rejoue les 429 / 5xx et erreurs réseau transitoires.
+
+    ``rewind`` est appelé avant chaque nouvel essai (ex. rembobiner un fichier).
+    La dernière réponse est renvoyée telle quelle si les essais sont épuisés.
+    """
+    import requests
+
+    limiter = LIMITERS[endpoint]
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt and rewind:
+            rewind()
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(_retry_delay(None, attempt))
+            continue
+
+        if response.status_code == 429:
+            limiter.on_throttle()
+        elif response.status_code < 400:
+            limiter.on_success()
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            delay = _retry_delay(response, attempt)
+            print(f"[GROQ] {endpoint}: HTTP {response.status_code}, nouvel essai dans {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+            continue
+        return response
+
+
+_env_loaded = False
+
+
+def load_env():
+    """Charge le fichier .env une seule fois, au premier besoin."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_api_key():
+    """Clé Groq : environnement, sinon .env (chargé à ce moment seulement)."""
+    # La clé est lue à chaque appel : le .env peut être chargé après l'import
+    key = os.getenv("GROQ_API_KEY")
+    if not key:
+        load_env()
+        key = os.getenv("GROQ_API_KEY")
+    return key
+
+
+def _auth_headers(api_key: str = None) -> dict:
+    return {"Authorization": f"Bearer {api_key or get_api_key()}"}
+
+
+# -------------------------------------------------
+# Endpoints
+# -------------------------------------------------
+def post_chat(payload: dict, timeout=CHAT_TIMEOUT, api_key: str = None) -> requests.Response:
+    """POST /chat/completions sur la session partagée."""
+    headers = _auth_headers(api_key)
+    headers["Content-Type"] = "application/json"
+    return _send_with_retry(
+        lambda: get_session().post(GROQ_CHAT_URL, headers=headers, json=payload, timeout=timeout),
+        "chat",
+    )
+
+
+def post_transcription(files: dict, timeout=TRANSCRIPTION_TIMEOUT, api_key: str = None) -> requests.Response:
+    """POST /audio/transcriptions (multipart) sur la session partagée."""
+    def rewind():
+        for value in files.values():
+            if isinstance(value, tuple) and len(value) > 1 and hasattr(value[1], "seek"):
+                value[1].seek(0)
+
+    return _send_with_retry(
+        lambda: get_session().post(
+            GROQ_TRANSCRIPTION_URL,
+            headers=_auth_headers(api_key),
+            files=files,
+            timeout=timeout,
+        ),
+        "transcription",
+        rewind=rewind,
+    )
+
+
+def stream_chat(payload: dict, timeout=CHAT_TIMEOUT, api_key: str = None):
+    """
+    POST /chat/completions avec ``stream: true`` (Server-Sent Events).
+
+    Générateur des fragments de texte (``delta.content``) au fil de leur arrivée.
+    """
+    headers = _auth_headers(api_key)
+    headers["Content-Type"] = "application/json"
+    body = dict(payload, stream=True)
+
+    # Seul l'établissement du flux est rejoué : une fois les premiers octets
+    # reçus, une coupure remonte à l'appelant.
+    response = _send_with_retry(
+        lambda: get_session().post(GROQ_CHAT_URL, headers=headers, json=body, timeout=timeout, stream=True),
+        "chat",
+    )
+    with response as r:
+        if r.status_code != 200:
+            raise RuntimeError(f"Erreur API Groq {r.status_code} : {r.text}")
+
+        # Les lignes sont décodées en UTF-8 nous-mêmes : text/event-stream
+        # n'annonce pas toujours de charset.
+        for raw_line in r.iter_lines():
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
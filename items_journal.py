@@ -0,0 +1,195 @@
+"""
+Journal JSON Lines (ajout seul) des items extraits acceptés.
+
+Alternative à la table ``items`` de ``storage`` (``ITEMS_BACKEND=journal``) :
+chaque acceptation ajoute ses items en une seule écriture suivie d'un
+``fsync``, quelle que soit la taille de l'historique. Un vidage ajoute un
+enregistrement ``clear`` au lieu de réécrire le fichier ; ``compact`` réécrit
+périodiquement le journal à partir de l'état matérialisé (les seuls items
+vivants), dès que les enregistrements morts sont au moins aussi nombreux :
+le fichier reste borné à environ deux fois l'état courant.
+
+Format, une ligne par enregistrement :
+    {"op": "add", "item": {...}}
+    {"op": "clear", "category": "agenda"}   (category null : tout)
+
+L'état en mémoire est rattrapé à partir du dernier offset lu : seules les
+lignes ajoutées depuis (par ce processus ou un autre) sont relues. Les
+écritures prennent le verrou exclusif de ``json_store`` ; les lectures n'en
+ont pas besoin (seules les lignes complètes sont appliquées).
+"""
+import json
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import json_store
+
+ITEMS_JOURNAL = os.getenv("ITEMS_JOURNAL", "./json_files/extracted_items.jsonl")
+# Compaction dès que les enregistrements morts atteignent ce seuil et les vivants
+COMPACT_MIN_RECORDS = int(os.getenv("ITEMS_JOURNAL_COMPACT_MIN", "1000"))
+
+
+def _encode(record: Dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class ItemsJournal:
+    def __init__(self, path: str = ITEMS_JOURNAL, compact_min: int = COMPACT_MIN_RECORDS):
+        self.path = path
+        self.compact_min = compact_min
+        self._lock = threading.RLock()
+        self._items: List[Dict] = []
+        self._external_ids = set()
+        self._records = 0         # enregistrements appliqués (vivants ou non)
+        self._offset = 0          # octets déjà appliqués
+        self._inode = None
+        self._partial = False     # dernière ligne incomplète (écriture interrompue)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    # -------------------------------------------------
+    # Lecture incrémentale
+    # -------------------------------------------------
+    def read_since(self, offset: int = 0) -> Tuple[List[Dict], int]:
+        """
+        Enregistrements complets écrits après ``offset`` et nouvel offset :
+        un lecteur peut suivre le journal (tail) sans le relire en entier.
+        """
+        records = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        print(f"[JOURNAL] Ligne illisible ignorée dans {self.path}")
+        except FileNotFoundError:
+            pass
+        return records, offset
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Parcourt le journal en flux, sans le charger en mémoire."""
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+        except FileNotFoundError:
+            return
+
+    def _catch_up(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        # Fichier remplacé (compaction par un autre processus) ou supprimé : relecture
+        inode = (st.st_dev, st.st_ino) if st else None
+        if inode != self._inode or (st and st.st_size < self._offset):
+            self._items, self._external_ids, self._records, self._offset = [], set(), 0, 0
+            self._inode = inode
+        if st is None or st.st_size == self._offset:
+            self._partial = False
+            return
+        records, self._offset = self.read_since(self._offset)
+        self._partial = self._offset < st.st_size
+        for record in records:
+            self._apply(record)
+
+    def _apply(self, record: Dict):
+        self._records += 1
+        if record.get("op") == "add":
+            item = record["item"]
+            self._items.append(item)
+            if item.get("external_id"):
+                self._external_ids.add(item["external_id"])
+        elif record.get("op") == "clear":
+            category = record.get("category")
+            kept = [i for i in self._items if category is not None and i.get("category") != category]
+            self._items = kept
+            self._external_ids = {i["external_id"] for i in kept if i.get("external_id")}
+
+    # -------------------------------------------------
+    # Interface commune avec ``storage.Storage``
+    # -------------------------------------------------
+    def add_items(self, items: Iterable[Dict]) -> int:
+        """Une seule écriture + fsync ; items dont ``external_id`` est connu ignorés."""
+        # Verrou exclusif : rattrapage, dédoublonnage et ajout sans entrelacement entre processus
+        with self._lock, json_store.file_lock(self.path, exclusive=True):
+            self._catch_up()
+            new, seen = [], set(self._external_ids)
+            for item in items:
+                external_id = item.get("external_id")
+                if external_id and external_id in seen:
+                    continue
+                seen.add(external_id)
+                new.append(item)
+            if new:
+                self._append(b"".join(_encode({"op": "add", "item": item}) for item in new))
+        # Les vidages d'autres processus laissent aussi des enregistrements morts
+        self._maybe_compact()
+        return len(new)
+
+    def list_items(self, category: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            self._catch_up()
+            if category is None:
+                return list(self._items)
+            return [i for i in self._items if i.get("category") == category]
+
+    def clear_items(self, category: Optional[str] = None) -> int:
+        with self._lock:
+            with json_store.file_lock(self.path, exclusive=True):
+                count = len(self.list_items(category))
+                self._append(_encode({"op": "clear", "category": category}))
+            self._maybe_compact()
+            return count
+
+    def _append(self, data: bytes):
+        if self._partial:
+            # Terminer la ligne tronquée : l'enregistrement suivant reste lisible
+            data = b"\n" + data
+        # Appelé sous verrou exclusif : la compaction ne peut pas remplacer le fichier entre-temps
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._catch_up()
+
+    # -------------------------------------------------
+    # Compaction
+    # -------------------------------------------------
+    @property
+    def dead_records(self) -> int:
+        """Enregistrements du fichier absents de l'état matérialisé (vidages, items vidés)."""
+        return self._records - len(self._items)
+
+    def _maybe_compact(self):
+        # Seuil relatif : chaque réécriture est amortie par autant d'enregistrements morts
+        with self._lock:
+            dead = self.dead_records
+            if dead >= self.compact_min and dead >= len(self._items):
+                self.compact()
+
+    def compact(self) -> int:
+        """Réécrit le journal avec les seuls items vivants ; retourne les enregistrements repliés."""
+        with self._lock, json_store.file_lock(self.path, exclusive=True):
+            self._catch_up()
+            folded = self.dead_records
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(_encode({"op": "add", "item": item}) for item in self._items))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._inode, self._offset = None, 0
+            self._catch_up()
+            return folded
@@ -0,0 +1,190 @@
+"""
+Localisation robuste du JSON dans une réponse de modèle.
+
+Un seul passage linéaire sur le texte (chaînes et échappements compris)
+repère les valeurs JSON de premier niveau, ignore les crochets parasites de
+la prose, retire les blocs de code markdown et sait réparer une réponse
+tronquée (coupure ``max_tokens`` au milieu d'un tableau) en ne gardant que
+les éléments complets.
+"""
+import json
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Optional
+
+# start/end : position dans le texte analysé ; repaired : tableau tronqué réparé
+JsonMatch = namedtuple("JsonMatch", ["start", "end", "value", "repaired"])
+
+_PAIRS = {"[": "]", "{": "}"}
+_FENCE = re.compile(r"```[\w-]*")
+
+
+def strip_code_fences(text: str) -> str:
+    """Retire les balises ```json / ``` (le contenu est conservé)."""
+    return _FENCE.sub("", text)
+
+
+class JsonScanner:
+    """
+    Scanner incrémental : ``feed`` peut être appelé fragment par fragment
+    (streaming) ; chaque caractère n'est examiné qu'une fois.
+    """
+
+    def __init__(self):
+        self.values = []       # valeurs de premier niveau valides (JsonMatch)
+        self._chunks = []      # fragments reçus (jamais recopiés à chaque ajout)
+        self._offsets = []     # position de début de chaque fragment
+        self._length = 0
+        self._stack = []       # [ouvrant, position, fin du dernier élément complet]
+        self._in_string = False
+        self._escape = False
+        self._nested = {}      # profondeur -> [(start, end)] des conteneurs fermés
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def text(self) -> str:
+        """Texte complet reçu (assemblé à la demande)."""
+        if len(self._chunks) > 1:
+            self._chunks, self._offsets = ["".join(self._chunks)], [0]
+        return self._chunks[0] if self._chunks else ""
+
+    def slice(self, start: int, end: int) -> str:
+        """``text[start:end]`` sans reconstituer tout le tampon."""
+        parts = []
+        for k in range(max(bisect_right(self._offsets, start) - 1, 0), len(self._chunks)):
+            offset = self._offsets[k]
+            if offset >= end:
+                break
+            parts.append(self._chunks[k][max(start - offset, 0):end - offset])
+        return "".join(parts)
+
+    @property
+    def open_start(self) -> Optional[int]:
+        """Position du conteneur encore ouvert le plus externe (None si aucun)."""
+        return self._stack[0][1] if self._stack else None
+
+    def feed(self, chunk: str):
+        """Ajoute du texte ; retourne les nouvelles valeurs de premier niveau trouvées."""
+        base = self._length
+        if chunk:
+            self._chunks.append(chunk)
+            self._offsets.append(base)
+            self._length += len(chunk)
+        found = []
+
+        for i, c in enumerate(chunk, base):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                # Les guillemets de la prose (hors crochets) ne comptent pas
+                if self._stack:
+                    self._in_string = True
+            elif c in _PAIRS:
+                self._stack.append([c, i, None])
+            elif c in "]}":
+                if not self._stack or _PAIRS[self._stack[-1][0]] != c:
+                    continue  # fermant orphelin
+                _, start, _ = self._stack.pop()
+                end = i + 1
+                if self._stack:
+                    self._stack[-1][2] = end
+                    self._nested.setdefault(len(self._stack), []).append((start, end))
+                else:
+                    match = self._parse(start, end)
+                    if match:
+                        self.values.append(match)
+                        found.append(match)
+            elif c == "," and self._stack:
+                self._stack[-1][2] = i
+
+        return found
+
+    def _parse(self, start: int, end: int, repaired: bool = False, suffix: str = ""):
+        try:
+            value = json.loads(self.slice(start, end) + suffix)
+        except ValueError:
+            return None
+        return JsonMatch(start, self._length if repaired else end, value, repaired)
+
+    def _repair(self, types):
+        """Ferme un JSON tronqué en coupant après le dernier élément complet d'un tableau."""
+        for base in range(len(self._stack)):
+            stack = self._stack[base:]
+            for level in range(len(stack) - 1, -1, -1):
+                opener, start, last_end = stack[level]
+                # Sans élément complet, il n'y a rien à sauver : un [] « réparé » perdrait tout en silence
+                if opener != "[" or last_end is None:
+                    continue
+                closers = "".join(_PAIRS[o[0]] for o in reversed(stack[:level + 1]))
+                match = self._parse(stack[0][1], last_end, repaired=True, suffix=closers)
+                if match and isinstance(match.value, types):
+                    return match
+        return None
+
+    def first(self, types=(list, dict), repair: bool = True) -> Optional[JsonMatch]:
+        """
+        Première valeur du type demandé : au premier niveau, sinon réparation
+        d'une fin tronquée, sinon à la plus faible profondeur (crochet ouvrant
+        parasite resté ouvert dans la prose), sinon en reprenant l'analyse
+        juste après ce crochet parasite (un guillemet de la prose a pu fausser
+        la lecture de la suite).
+        """
+        for match in self.values:
+            if isinstance(match.value, types):
+                return match
+
+        if repair and self._stack:
+            match = self._repair(types)
+            if match:
+                return match
+
+        for depth in sorted(self._nested):
+            for start, end in self._nested[depth]:
+                match = self._parse(start, end)
+                if match and isinstance(match.value, types):
+                    return match
+            break  # seule la profondeur minimale est un candidat « premier niveau »
+
+        if self._stack:
+            offset = self._stack[0][1] + 1
+            rest = JsonScanner()
+            rest.feed(self.slice(offset, self._length))
+            match = rest.first(types, repair)
+            if match:
+                return match._replace(start=match.start + offset, end=match.end + offset)
+        return None
+
+
+def find_json(text: str, types=(list, dict), repair: bool = True) -> Optional[JsonMatch]:
+    """Localise la première valeur JSON (tableau ou objet) dans ``text``."""
+    scanner = JsonScanner()
+    scanner.feed(text)
+    return scanner.first(types, repair)
+
+
+def parse_lenient(text: str, types=(list, dict)) -> JsonMatch:
+    """
+    Comme ``loads_lenient`` mais retourne le ``JsonMatch`` : ``repaired``
+    indique une réponse tronquée dont seuls les éléments complets ont été
+    gardés (à ne pas traiter comme une réponse complète).
+    """
+    match = find_json(strip_code_fences(text), types)
+    if match is None:
+        raise ValueError("Aucun JSON valide trouvé dans la réponse :\n" + text)
+    return match
+
+
+def loads_lenient(text: str, types=(list, dict)):
+    """
+    ``json.loads`` tolérant : blocs de code, prose autour, fin tronquée.
+    Lève ``ValueError`` si aucun JSON exploitable n'est trouvé.
+    """
+    return parse_lenient(text, types).value
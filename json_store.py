@@ -0,0 +1,145 @@
+"""
+Fichiers JSON partagés entre threads et processus (plusieurs workers
+Streamlit sur un même dossier de données).
+
+- Écriture atomique : fichier temporaire dans le même dossier, ``fsync``
+  puis ``os.replace`` ; un crash ne laisse jamais un JSON tronqué.
+- Verrous consultatifs ``fcntl.flock`` sur un fichier annexe ``<fichier>.lock``
+  (le fichier de données, remplacé à chaque écriture, ne peut pas porter
+  le verrou) : partagé pour lire, exclusif pour écrire.
+- Compteur de version, stocké dans ce même fichier annexe et incrémenté à
+  chaque écriture : un lecteur dont la version est à jour ne reparse pas.
+"""
+import copy
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Tuple
+
+_cache: Dict[str, Tuple[int, Any]] = {}  # chemin absolu -> (version, données)
+_cache_lock = threading.Lock()
+
+
+def _lock_path(path: str) -> str:
+    return f"{path}.lock"
+
+
+# -------------------------------------------------
+# Verrous
+# -------------------------------------------------
+@contextmanager
+def file_lock(path: str, exclusive: bool = False, blocking: bool = True):
+    """
+    Verrou lecteur/écrivain inter-processus sur ``path``. Chaque appel ouvre
+    son propre descripteur : deux threads du même processus s'excluent aussi.
+    Produit le descripteur du fichier annexe (qui contient la version).
+    Sans ``blocking``, lève ``BlockingIOError`` si le verrou est déjà pris.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd = os.open(_lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        fcntl.flock(fd, flags if blocking else flags | fcntl.LOCK_NB)
+        yield fd
+    finally:
+        os.close(fd)  # libère le verrou
+
+
+def _read_version(fd: int) -> int:
+    raw = os.pread(fd, 32, 0)
+    try:
+        return int(raw.decode("ascii") or 0)
+    except ValueError:
+        return 0
+
+
+def version(path: str) -> int:
+    """Version courante (0 si le fichier n'a jamais été écrit par ce module)."""
+    try:
+        fd = os.open(_lock_path(path), os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    try:
+        return _read_version(fd)
+    finally:
+        os.close(fd)
+
+
+# -------------------------------------------------
+# Écriture / lecture
+# -------------------------------------------------
+def _replace(path: str, data: Any, **dump_kwargs):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _bump(fd: int, path: str, data: Any) -> int:
+    new_version = _read_version(fd) + 1
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, str(new_version).encode("ascii"), 0)
+    with _cache_lock:
+        _cache[os.path.abspath(path)] = (new_version, copy.deepcopy(data))
+    return new_version
+
+
+def write_json(path: str, data: Any, **dump_kwargs) -> int:
+    """Écrit ``data`` atomiquement, sous verrou exclusif ; retourne la nouvelle version."""
+    with file_lock(path, exclusive=True) as fd:
+        _replace(path, data, **dump_kwargs)
+        return _bump(fd, path, data)
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """
+    Contenu de ``path`` (copie modifiable), ou ``default`` si absent ou
+    illisible. Le fichier n'est reparsé que si sa version a changé depuis la
+    dernière lecture ou écriture dans ce processus.
+    """
+    key = os.path.abspath(path)
+    with file_lock(path) as fd:
+        current = _read_version(fd)
+        with _cache_lock:
+            cached = _cache.get(key)
+        if cached is not None and cached[0] == current:
+            return copy.deepcopy(cached[1])
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return default
+    with _cache_lock:
+        _cache[key] = (current, data)
+    return copy.deepcopy(data)
+
+
+def update_json(path: str, update: Callable[[Any], Any], default: Any = None, **dump_kwargs) -> Any:
+    """
+    Lecture-modification-écriture sous un seul verrou exclusif : aucun autre
+    processus ne peut écrire entre la lecture et l'écriture. ``update`` reçoit
+    le contenu courant et retourne le nouveau, qui est aussi retourné.
+    """
+    with file_lock(path, exclusive=True) as fd:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                current = json.load(f)
+        except (OSError, ValueError):
+            current = default
+        data = update(current)
+        _replace(path, data, **dump_kwargs)
+        _bump(fd, path, data)
+        return data
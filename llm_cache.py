@@ -0,0 +1,139 @@
+"""
+Cache disque des réponses LLM, adressé par contenu.
+
+La clé est un hash SHA-256 du modèle, de la température, du prompt système,
+du prompt utilisateur rendu et du contexte de date. Chaque entrée est un petit
+fichier JSON ; l'éviction combine une durée de vie (TTL) et une taille
+maximale (LRU, basée sur la date de dernier accès = mtime).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+CACHE_DIR = os.getenv("GROQ_CACHE_DIR", "./json_files/llm_cache")
+CACHE_ENABLED = os.getenv("GROQ_CACHE", "1") != "0"
+# Autorise la mise en cache des appels avec temperature > 0
+CACHE_NONZERO_TEMPERATURE = os.getenv("GROQ_CACHE_NONZERO", "0") == "1"
+CACHE_TTL = int(os.getenv("GROQ_CACHE_TTL", str(7 * 24 * 3600)))  # secondes
+CACHE_MAX_ENTRIES = int(os.getenv("GROQ_CACHE_MAX_ENTRIES", "2000"))
+# Le répertoire n'est parcouru que si l'estimation dépasse la limite, ou toutes
+# les EVICT_EVERY écritures (entrées ajoutées par d'autres processus)
+EVICT_EVERY = int(os.getenv("GROQ_CACHE_EVICT_EVERY", "100"))
+
+_lock = threading.Lock()
+_estimate: Optional[int] = None  # nombre d'entrées estimé depuis le dernier parcours
+_writes_since_scan = 0
+
+
+# -------------------------------------------------
+# Clés
+# -------------------------------------------------
+def make_key(model: str, temperature: float, system_prompt: str, user_prompt: str, date_context: str = "") -> str:
+    raw = json.dumps(
+        [model, float(temperature), system_prompt, user_prompt, date_context],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def should_cache(temperature: float, allow_nonzero: bool = False) -> bool:
+    """Une réponse n'est réutilisable que si la génération est déterministe."""
+    if not CACHE_ENABLED:
+        return False
+    return temperature <= 0 or allow_nonzero or CACHE_NONZERO_TEMPERATURE
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+# -------------------------------------------------
+# Lecture / écriture
+# -------------------------------------------------
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get(key: str) -> Optional[str]:
+    path = _entry_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # JSON valide mais pas une entrée (fichier corrompu ou étranger) : absent
+    if not isinstance(entry, dict):
+        _remove(path)
+        return None
+
+    if time.time() - entry.get("created_at", 0) > CACHE_TTL:
+        _remove(path)
+        return None
+
+    # Marquer l'entrée comme récemment utilisée (LRU)
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry.get("content")
+
+
+def put(key: str, content: str):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.time(), "content": content}, f, ensure_ascii=False)
+    added = not os.path.exists(path)
+    os.replace(tmp_path, path)
+
+    global _estimate, _writes_since_scan
+    with _lock:
+        _writes_since_scan += 1
+        if _estimate is not None and added:
+            _estimate += 1
+        due = _estimate is None or _estimate > CACHE_MAX_ENTRIES or _writes_since_scan >= EVICT_EVERY
+    if due:
+        _evict()
+
+
+def _evict():
+    """
+    Supprime les entrées les moins récemment utilisées au-delà de
+    CACHE_MAX_ENTRIES, en descendant 10 % sous la limite : le prochain
+    parcours n'a lieu qu'après autant de nouvelles entrées.
+    """
+    global _estimate, _writes_since_scan
+    with _lock:
+        _writes_since_scan = 0
+        try:
+            entries = [e for e in os.scandir(CACHE_DIR) if e.name.endswith(".json")]
+        except OSError:
+            return
+        _estimate = len(entries)
+        if len(entries) <= CACHE_MAX_ENTRIES:
+            return
+        overflow = len(entries) - (CACHE_MAX_ENTRIES - CACHE_MAX_ENTRIES // 10)
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:overflow]:
+            _remove(entry.path)
+        _estimate -= overflow
+
+
+def clear():
+    """Vide complètement le cache."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".json"):
+            _remove(entry.path)
@@ -0,0 +1,94 @@
+"""
+Routage des appels LLM par niveaux de modèle.
+
+Chaque requête part d'abord sur le modèle rapide (8B). On ne passe au 70B
+que si l'entrée dépasse un seuil de complexité, ou si la sortie du modèle
+rapide échoue à la validation (JSON invalide, schéma incorrect).
+Chaque appel routé est journalisé : modèle retenu, raison de l'escalade, latence.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+FAST_MODEL = "llama-3.1-8b-instant"
+STRONG_MODEL = "llama-3.3-70b-versatile"
+
+# Au-delà de ces seuils, l'entrée part directement sur le gros modèle
+COMPLEXITY_MAX_CHARS = int(os.getenv("ROUTER_MAX_CHARS", "600"))
+COMPLEXITY_MAX_SENTENCES = int(os.getenv("ROUTER_MAX_SENTENCES", "8"))
+
+# Derniers appels routés (consultables pour le suivi)
+ROUTING_LOG = deque(maxlen=500)
+_log_lock = threading.Lock()
+
+_SENTENCE_END = re.compile(r"[.!?\n]+")
+
+
+# -------------------------------------------------
+# Choix du modèle
+# -------------------------------------------------
+def est_complexe(text: str) -> bool:
+    if len(text) > COMPLEXITY_MAX_CHARS:
+        return True
+    phrases = [p for p in _SENTENCE_END.split(text) if p.strip()]
+    return len(phrases) > COMPLEXITY_MAX_SENTENCES
+
+
+def choisir_modele(text: str):
+    """Retourne (modèle, raison) pour une entrée donnée."""
+    if est_complexe(text):
+        return STRONG_MODEL, "complexity"
+    return FAST_MODEL, None
+
+
+def enregistrer(label: str, model: str, reason: Optional[str], latency_ms: float):
+    """Journalise un appel (aussi utilisé par les chemins non routés, ex. streaming)."""
+    record = {
+        "label": label,
+        "model": model,
+        "escalation_reason": reason,
+        "latency_ms": round(latency_ms, 1),
+        "timestamp": time.time(),
+    }
+    with _log_lock:
+        ROUTING_LOG.append(record)
+    print(f"[ROUTER] {label}: {model} ({latency_ms:.0f} ms)" + (f" — escalade : {reason}" if reason else ""))
+    return record
+
+
+def derniers_appels(n: int = 20):
+    with _log_lock:
+        return list(ROUTING_LOG)[-n:]
+
+
+# -------------------------------------------------
+# Appel routé
+# -------------------------------------------------
+def route(call: Callable[[str], str], validate: Callable[[str], object] = None, text: str = "", label: str = "llm"):
+    """
+    Exécute ``call(model)`` sur le modèle le moins cher adapté.
+
+    ``validate(content)`` doit lever ``ValueError`` si la sortie est
+    inutilisable ; on relance alors sur ``STRONG_MODEL``. Retourne
+    ``(content, model)``.
+    """
+    start = time.perf_counter()
+    model, reason = choisir_modele(text)
+    content = call(model)
+
+    if validate is not None and model != STRONG_MODEL:
+        try:
+            validate(content)
+        except ValueError as e:
+            reason = f"invalid_output: {str(e).splitlines()[0] if str(e) else type(e).__name__}"
+            model = STRONG_MODEL
+            content = call(model)
+
+    enregistrer(label, model, reason, (time.perf_counter() - start) * 1000)
+    return content, model
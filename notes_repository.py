@@ -0,0 +1,187 @@
+"""
+Dépôt de notes en mémoire, adossé à la table ``notes`` de ``storage``.
+
+Les notes sont gardées dans un dict indexé par id, avec des index
+secondaires (archivées, épinglées) : lecture et recherche par id en O(1),
+sans requête. La table n'est relue que si ``notes_version`` (compteur tenu
+par triggers SQLite, donc aussi incrémenté par les autres processus) a
+changé. Les mutations sont appliquées en mémoire puis écrites par lots,
+``FLUSH_DELAY`` secondes après la première (ou sur ``flush()``).
+"""
+import atexit
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from storage import NOTE_FIELDS, get_storage
+
+FLUSH_DELAY = float(os.getenv("NOTES_FLUSH_DELAY", "0.5"))  # secondes
+# Après un échec d'écriture : nouvel essai avec backoff, plafonné
+FLUSH_RETRY_MAX = float(os.getenv("NOTES_FLUSH_RETRY_MAX", "60"))  # secondes
+
+
+class NotesRepository:
+    def __init__(self, store=None, flush_delay: float = FLUSH_DELAY):
+        self.store = store or get_storage()
+        self.flush_delay = flush_delay
+
+        self._lock = threading.RLock()
+        self._notes: Dict[str, Dict] = {}     # id -> note, ordre de création
+        self._archived: Set[str] = set()
+        self._pinned: Set[str] = set()
+        self._version: Optional[int] = None   # notes_version au dernier chargement
+
+        # Écritures en attente : id -> note complète (upsert) ou None (suppression)
+        self._dirty: Dict[str, Optional[Dict]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._failures = 0  # échecs d'écriture consécutifs (backoff)
+
+    # -------------------------------------------------
+    # Chargement
+    # -------------------------------------------------
+    def _sync(self):
+        """Recharge si la table a été modifiée ailleurs ; les écritures en attente sont conservées."""
+        version = self.store.notes_version()
+        if version == self._version:
+            return
+        self._notes = {note["id"]: note for note in self.store.list_notes()}
+        for note_id, note in self._dirty.items():
+            if note is None:
+                self._notes.pop(note_id, None)
+            else:
+                self._notes[note_id] = note
+        self._archived = {i for i, n in self._notes.items() if n.get("archived")}
+        self._pinned = {i for i, n in self._notes.items() if n.get("pinned")}
+        self._version = version
+
+    def _index(self, note: Dict):
+        for flag, index in (("archived", self._archived), ("pinned", self._pinned)):
+            if note.get(flag):
+                index.add(note["id"])
+            else:
+                index.discard(note["id"])
+
+    # -------------------------------------------------
+    # Lecture
+    # -------------------------------------------------
+    def get(self, note_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._sync()
+            note = self._notes.get(note_id)
+            return dict(note) if note else None
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            self._sync()
+            return [dict(n) for n in self._notes.values()]
+
+    def archived(self) -> List[Dict]:
+        with self._lock:
+            self._sync()
+            return [dict(self._notes[i]) for i in self._notes if i in self._archived]
+
+    def pinned(self) -> List[Dict]:
+        with self._lock:
+            self._sync()
+            return [dict(self._notes[i]) for i in self._notes if i in self._pinned]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Notes classées par pertinence (index FTS de ``storage``), écritures en attente comprises."""
+        self.flush()
+        with self._lock:
+            self._sync()
+            hits = self.store.search(query, limit, kinds=("note",))
+            return [dict(self._notes[h["id"]], score=h["score"]) for h in hits if h["id"] in self._notes]
+
+    # -------------------------------------------------
+    # Mutations (mémoire immédiate, disque différé)
+    # -------------------------------------------------
+    def add(self, note: Dict) -> Dict:
+        with self._lock:
+            self._sync()
+            note = dict(note)
+            self._notes[note["id"]] = note
+            self._index(note)
+            self._mark(note["id"], note)
+            return dict(note)
+
+    def update(self, note_id: str, **changes) -> Optional[Dict]:
+        with self._lock:
+            self._sync()
+            note = self._notes.get(note_id)
+            if note is None:
+                return None
+            note.update({k: v for k, v in changes.items() if k in NOTE_FIELDS})
+            self._index(note)
+            self._mark(note_id, note)
+            return dict(note)
+
+    def delete(self, note_id: str) -> bool:
+        with self._lock:
+            self._sync()
+            if self._notes.pop(note_id, None) is None:
+                return False
+            self._archived.discard(note_id)
+            self._pinned.discard(note_id)
+            self._mark(note_id, None)
+            return True
+
+    def _mark(self, note_id: str, note: Optional[Dict]):
+        self._dirty[note_id] = dict(note) if note else None
+        if self.flush_delay <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._schedule(self.flush_delay)
+
+    def _schedule(self, delay: float):
+        self._timer = threading.Timer(delay, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        # Une exception ne doit pas mourir dans le thread du Timer : flush a reprogrammé l'essai
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[NOTES] Échec de l'écriture des notes (nouvel essai programmé) : {e}")
+
+    def flush(self):
+        """Écrit les modifications en attente en une transaction."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            try:
+                before, after, changed = self.store.save_notes(
+                    upserts=[n for n in dirty.values() if n is not None],
+                    deletes=[i for i, n in dirty.items() if n is None],
+                )
+            except Exception:
+                # Rien n'est perdu : nouvel essai programmé, avec backoff
+                self._dirty = {**dirty, **self._dirty}
+                self._failures += 1
+                if self.flush_delay > 0:
+                    self._schedule(min(FLUSH_RETRY_MAX, self.flush_delay * 2 ** self._failures))
+                raise
+            self._failures = 0
+            # Nos propres écritures ne doivent pas déclencher de rechargement ; une
+            # écriture d'un autre processus (avant ou pendant) garde le rechargement
+            if self._version == before and after - before == changed:
+                self._version = after
+
+
+_repository: Optional[NotesRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_notes_repository() -> NotesRepository:
+    """Dépôt partagé par tout le processus ; écritures en attente vidées à la sortie."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = NotesRepository()
+            atexit.register(_repository.flush)
+        return _repository
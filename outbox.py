@@ -0,0 +1,397 @@
+"""
+File d'attente durable (outbox) des écritures Google.
+
+Accepter des items ne fait plus qu'ajouter des entrées à ce fichier ; un
+thread d'arrière-plan les envoie à Google par lots (batch), avec nouvelles
+tentatives et backoff. Chaque entrée porte une clé d'idempotence dérivée de
+son contenu et de l'acceptation qui l'a créée : un double clic n'ajoute rien,
+accepter deux fois le même item crée bien deux écritures, et un événement
+réessayé après une réponse perdue garde le même id Google (pas de doublon).
+
+États d'une entrée : "pending" → "done", "skipped" (conflit, date absente...)
+ou "failed" (erreur définitive ou tentatives épuisées).
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import json_store
+
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "./json_files/outbox.json")
+FLUSH_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", "5"))  # secondes
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+# Entrées terminées conservées (affichage du statut), puis purgées
+KEEP_DONE_SECONDS = 24 * 3600
+
+EVENT_INSERT = "event_insert"
+TASK_INSERT = "task_insert"
+TASK_STATUS = "task_status"
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def make_key(kind: str, payload: Dict, nonce: str = "") -> str:
+    """Clé d'idempotence : hex (valide comme id d'événement Google, base32hex)."""
+    raw = json.dumps([kind, payload, nonce], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _retryable(http_status: Optional[int]) -> bool:
+    # Pas de statut HTTP : erreur réseau, issue inconnue → on réessaie
+    return http_status is None or http_status in RETRY_STATUSES
+
+
+class Outbox:
+    def __init__(self, path: str = OUTBOX_FILE, interval: float = FLUSH_INTERVAL,
+                 senders: Optional[Dict[str, Callable]] = None):
+        self.path = path
+        self.interval = interval
+        self.senders = senders or {
+            EVENT_INSERT: send_event_inserts,
+            TASK_INSERT: send_task_inserts,
+            TASK_STATUS: send_status_changes,
+        }
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.entries: Dict[str, Dict] = {}
+        self._version = 0  # version json_store du fichier au dernier chargement
+        # Appelés après chaque lot avec le type d'écriture et les entrées mises à jour
+        # (ex. le miroir des tâches : rafraîchir, ou restaurer une tâche en échec)
+        self.listeners: List[Callable[[str, List[Dict]], None]] = []
+        self.load()
+
+    # -------------------------------------------------
+    # Persistance
+    # -------------------------------------------------
+    def _merge(self, entries: List[Dict]):
+        """Intègre les entrées écrites par un autre processus (la plus récente gagne)."""
+        for entry in entries:
+            mine = self.entries.get(entry["key"])
+            if mine is None or entry["updated_at"] > mine["updated_at"]:
+                self.entries[entry["key"]] = entry
+
+    def load(self):
+        """Relit le fichier s'il a changé (autre worker Streamlit) et fusionne."""
+        if json_store.version(self.path) == self._version and self._version:
+            return
+        entries = json_store.read_json(self.path, [])
+        with self._lock:
+            self._merge(entries)
+            self._version = json_store.version(self.path)
+
+    def save(self):
+        def merge_and_purge(on_disk):
+            with self._lock:
+                self._merge(on_disk or [])
+                now = time.time()
+                self.entries = {
+                    k: e for k, e in self.entries.items()
+                    if e["state"] == "pending" or now - e["updated_at"] < KEEP_DONE_SECONDS
+                }
+                return list(self.entries.values())
+
+        # Lecture + fusion + écriture sous un même verrou : pas d'entrée perdue entre workers
+        with self._lock:
+            json_store.update_json(self.path, merge_and_purge, [], indent=2)
+            self._version = json_store.version(self.path)
+
+    # -------------------------------------------------
+    # Ajout
+    # -------------------------------------------------
+    def enqueue(self, kind: str, payload: Dict, label: str = "", nonce: str = "") -> str:
+        """Ajoute une écriture ; sans effet si la même est déjà en attente ou faite."""
+        return self.enqueue_all([(kind, payload, label, nonce)])[0]
+
+    def enqueue_all(self, writes: List[tuple], superseded: Optional[Callable[[Dict], bool]] = None) -> List[str]:
+        """
+        Ajoute des écritures ``(kind, payload, label, nonce)`` sous un même
+        verrou, avec une seule sauvegarde du fichier. ``superseded`` marque
+        d'abord comme ignorées les entrées en attente qu'il désigne.
+        """
+        now = time.time()
+        keys = []
+        with self._lock:
+            changed = False
+            if superseded is not None:
+                for entry in self.entries.values():
+                    if entry["state"] == "pending" and superseded(entry):
+                        entry["state"], entry["error"] = "skipped", "remplacé par un changement plus récent"
+                        entry["updated_at"] = now
+                        changed = True
+            for kind, payload, label, nonce in writes:
+                key = make_key(kind, payload, nonce)
+                keys.append(key)
+                existing = self.entries.get(key)
+                # Un changement de statut peut légitimement être rejoué (terminer, rouvrir, terminer...)
+                replayable = existing is not None and existing["state"] != "pending" and kind == TASK_STATUS
+                if existing is None or existing["state"] == "failed" or replayable:
+                    self.entries[key] = {
+                        "key": key,
+                        "kind": kind,
+                        "payload": payload,
+                        "label": label,
+                        "state": "pending",
+                        "attempts": 0,
+                        "next_attempt": now,
+                        "first_attempt_at": None,
+                        "error": None,
+                        "result": None,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    changed = True
+            if changed:
+                self.save()
+        self._wakeup.set()
+        return keys
+
+    def enqueue_items(self, items: List[Dict], acceptance_id: Optional[str] = None) -> List[str]:
+        """
+        Items extraits acceptés : "agenda" → événement, "to_do" → tâche.
+
+        ``acceptance_id`` identifie l'acceptation (un id par extraction côté
+        interface) : la rejouer n'ajoute rien, alors qu'une nouvelle
+        acceptation d'items identiques crée de nouvelles écritures. Sans id,
+        chaque appel est une acceptation distincte.
+        """
+        nonce = acceptance_id or uuid.uuid4().hex
+        kinds = {"agenda": EVENT_INSERT, "to_do": TASK_INSERT}
+        writes = []
+        for item in items:
+            kind = kinds.get(item.get("category"))
+            if kind is not None:
+                payload = {k: item.get(k) for k in ("text", "datetime_iso", "datetime_raw")}
+                writes.append((kind, payload, item.get("text", ""), nonce))
+        return self.enqueue_all(writes)
+
+    def enqueue_status(self, task_refs: List[Dict], status: str) -> List[str]:
+        """
+        Changements de statut ; remplacent un changement encore en attente sur
+        la même tâche. ``previous_status`` d'une référence est conservé dans
+        l'entrée (restauration par le miroir en cas d'échec).
+        """
+        task_ids = {r["task_id"] for r in task_refs}
+        writes = []
+        for ref in task_refs:
+            payload = {"list_id": ref["list_id"], "task_id": ref["task_id"], "status": status}
+            if ref.get("previous_status"):
+                payload["previous_status"] = ref["previous_status"]
+            writes.append((TASK_STATUS, payload, ref.get("title", ""), ""))
+        return self.enqueue_all(
+            writes, superseded=lambda e: e["kind"] == TASK_STATUS and e["payload"]["task_id"] in task_ids,
+        )
+
+    # -------------------------------------------------
+    # Lecture (statut par item pour l'interface)
+    # -------------------------------------------------
+    def status(self, keys: Optional[List[str]] = None) -> List[Dict]:
+        with self._lock:
+            if keys is None:
+                entries = sorted(self.entries.values(), key=lambda e: e["created_at"])
+            else:
+                entries = [self.entries[k] for k in keys if k in self.entries]
+            return [dict(e) for e in entries]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for e in self.entries.values() if e["state"] == "pending")
+
+    # -------------------------------------------------
+    # Envoi
+    # -------------------------------------------------
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        Envoie les entrées dues, un lot par type. Retourne le nombre traité.
+        Un seul worker envoie à la fois : les autres passent leur tour.
+        """
+        with self._flush_lock:
+            try:
+                with json_store.file_lock(f"{self.path}.flush", exclusive=True, blocking=False):
+                    return self._flush(now or time.time())
+            except BlockingIOError:
+                return 0
+
+    def _flush(self, now: float) -> int:
+        self.load()
+        with self._lock:
+            due = [e for e in self.entries.values() if e["state"] == "pending" and e["next_attempt"] <= now]
+            for entry in due:
+                entry["first_attempt_at"] = entry["first_attempt_at"] or now
+
+        by_kind: Dict[str, List[Dict]] = {}
+        for entry in due:
+            by_kind.setdefault(entry["kind"], []).append(dict(entry))
+
+        for kind, entries in by_kind.items():
+            try:
+                outcomes = self.senders[kind](entries)
+            except Exception as e:
+                # Lot entier en échec (réseau, authentification) : tout sera réessayé
+                outcomes = {entry["key"]: ("retry", str(e)) for entry in entries}
+            self._record(outcomes, now)
+            updated = self.status([entry["key"] for entry in entries])
+            for listener in self.listeners:
+                try:
+                    listener(kind, updated)
+                except Exception as e:
+                    print(f"[OUTBOX] Erreur dans un abonné : {e}")
+        return len(due)
+
+    def _record(self, outcomes: Dict[str, tuple], now: float):
+        with self._lock:
+            for key, (state, detail) in outcomes.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                entry["attempts"] += 1
+                entry["updated_at"] = time.time()
+                if state == "retry":
+                    entry["error"] = detail
+                    if entry["attempts"] >= MAX_ATTEMPTS:
+                        entry["state"] = "failed"
+                    else:
+                        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (entry["attempts"] - 1))
+                        entry["next_attempt"] = now + delay * random.uniform(0.5, 1.0)
+                elif state == "done":
+                    entry["state"], entry["result"], entry["error"] = "done", detail, None
+                else:
+                    entry["state"], entry["error"] = state, detail
+            self.save()
+
+    # -------------------------------------------------
+    # Thread d'arrière-plan
+    # -------------------------------------------------
+    def start(self):
+        """Démarre le thread d'envoi (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[OUTBOX] Erreur lors de l'envoi : {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+
+# -------------------------------------------------
+# Expéditeurs : entrées → {clé: (état, détail)}
+# -------------------------------------------------
+def send_event_inserts(entries: List[Dict]) -> Dict[str, tuple]:
+    from agent_write_agenda import authenticate_google_calendar, create_events
+
+    service = authenticate_google_calendar()
+    if service is None:
+        raise RuntimeError("Google Calendar indisponible (authentification)")
+
+    # La clé d'idempotence sert d'id d'événement : un nouvel essai ne duplique rien
+    results = create_events(service, [e["payload"] for e in entries], event_ids=[e["key"] for e in entries])
+    outcomes = {}
+    for entry, result in zip(entries, results):
+        status = result["status"]
+        if status == "created":
+            outcomes[entry["key"]] = ("done", {"event_id": result["event"].get("id")})
+        elif status == "error":
+            error = result.get("error")
+            http_status = getattr(getattr(error, "resp", None), "status", None)
+            outcomes[entry["key"]] = ("retry" if _retryable(http_status) else "failed", str(error))
+        else:
+            detail = f"conflit avec « {result['conflict']} »" if status == "conflict" else status
+            outcomes[entry["key"]] = ("skipped", detail)
+    return outcomes
+
+
+def _already_created(agent, tasklist_id: str, entries: List[Dict]) -> Dict[str, Dict]:
+    """
+    Tâches d'un essai précédent dont la réponse s'est perdue : l'API Tasks
+    n'accepte pas d'id client, la clé de l'entrée est donc écrite dans les
+    notes de la tâche et recherchée parmi les tâches modifiées depuis le
+    premier essai.
+    """
+    from agent_task import TASK_REF_PREFIX
+
+    retried = [e for e in entries if e["attempts"] > 0]
+    if not retried:
+        return {}
+    since = min(e["first_attempt_at"] for e in retried) - 60
+    recent = agent.get_tasks(
+        tasklist_id,
+        fields="id,notes",
+        updatedMin=time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(since)),
+    )
+    by_ref = {}
+    for task in recent:
+        for line in (task.get("notes") or "").splitlines():
+            if line.startswith(TASK_REF_PREFIX):
+                by_ref.setdefault(line[len(TASK_REF_PREFIX):].strip(), task)
+    return {e["key"]: by_ref[e["key"]] for e in retried if e["key"] in by_ref}
+
+
+def send_task_inserts(entries: List[Dict]) -> Dict[str, tuple]:
+    from agent_task import EaseTasksAgent
+
+    agent = EaseTasksAgent()
+    tasklists = agent.list_tasklists(fields="id")
+    if not tasklists:
+        return {e["key"]: ("failed", "Aucune liste de tâches dans Google Tasks") for e in entries}
+    tasklist_id = tasklists[0]["id"]
+
+    outcomes = {}
+    found = _already_created(agent, tasklist_id, entries)
+    for key, task in found.items():
+        outcomes[key] = ("done", {"task_id": task.get("id")})
+    todo = [e for e in entries if e["key"] not in found]
+
+    report = agent.create_tasks(tasklist_id, [e["payload"] for e in todo], refs=[e["key"] for e in todo])
+    for entry, result in zip(todo, report["results"]):
+        if "task" in result:
+            outcomes[entry["key"]] = ("done", {"task_id": result["task"].get("id")})
+        else:
+            state = "retry" if _retryable(result.get("http_status")) else "failed"
+            outcomes[entry["key"]] = (state, result["error"])
+    return outcomes
+
+
+def send_status_changes(entries: List[Dict]) -> Dict[str, tuple]:
+    from agent_task import EaseTasksAgent
+
+    agent = EaseTasksAgent()
+    outcomes = {}
+    for status in {e["payload"]["status"] for e in entries}:
+        group = [e for e in entries if e["payload"]["status"] == status]
+        report = agent.bulk_set_status([e["payload"] for e in group], status)
+        for entry, result in zip(group, report["results"]):
+            if "task" in result:
+                outcomes[entry["key"]] = ("done", None)
+            else:
+                state = "retry" if _retryable(result.get("http_status")) else "failed"
+                outcomes[entry["key"]] = (state, result["error"])
+    return outcomes
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Outbox partagée par tout le processus, thread d'envoi démarré."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+            _outbox.start()
+        return _outbox
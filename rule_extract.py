@@ -0,0 +1,243 @@
+"""
+Pré-extraction déterministe (sans LLM) pour les messages simples.
+
+« Acheter du pain », « Appeler le docteur lundi à 15h » : une phrase, une
+action, une date éventuelle que l'on sait résoudre. Pour ces cas, on produit
+directement le même schéma d'items que ``extraire_message_et_items`` ; dès
+qu'un doute subsiste (plusieurs actions, date ambiguë, question...), on
+renvoie None et l'appelant passe par Groq.
+"""
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+
+from time_patterns import TIME_RANGE_PATTERNS
+
+# -------------------------------------------------
+# CONFIGURATION
+# -------------------------------------------------
+SEUIL_CONFIANCE = 0.85
+# « 2h » sans « à » ni jour devant est souvent une durée (« 2h de parking »)
+CONFIANCE_HEURE_ISOLEE = 0.6
+LONGUEUR_MAX = 120
+# « 12/10 » tapé le 14/10 : passé récent ou faute de frappe plutôt que l'an
+# prochain ; une date sans année tombant à moins de ce nombre de jours dans le
+# passé est laissée au modèle
+JOURS_PASSES_AMBIGUS = 7
+
+# Verbes d'action en tête de phrase → to_do (ou agenda s'il y a une heure)
+VERBES_TACHE = {
+    "acheter", "appeler", "envoyer", "payer", "faire", "prendre", "reserver",
+    "ranger", "nettoyer", "finir", "terminer", "preparer", "ecrire", "repondre",
+    "recuperer", "laver", "reviser", "imprimer", "commander", "rendre", "poster",
+    "contacter", "telephoner", "rappeler", "verifier", "remplir", "signer",
+    "renouveler", "planifier", "organiser", "mettre", "sortir", "changer",
+}
+# Verbes qui, avec une heure, décrivent un rendez-vous
+VERBES_AGENDA = {"appeler", "telephoner", "rappeler", "voir", "rencontrer", "retrouver", "rejoindre"}
+PREFIXES_TACHE = ("penser a ", "ne pas oublier de ", "ne pas oublier d'", "il faut ", "je dois ")
+
+MOTS_AGENDA = {
+    "rdv", "rendez-vous", "reunion", "meeting", "entretien", "rencontre", "cours",
+    "diner", "dejeuner", "visite", "consultation", "seance", "anniversaire", "soiree",
+}
+PREFIXES_NOTE = ("note :", "note:", "idee :", "idee:", "info :", "info:", "a retenir :", "a retenir:")
+
+# Tournures qu'on ne traite pas : conversation, questions, indications de
+# temps qu'on ne sait pas résoudre seules
+MOTS_CONVERSATION = {"bonjour", "salut", "coucou", "hello", "merci", "bonsoir", "qui", "comment", "pourquoi"}
+MOTS_TEMPS_FLOUS = {
+    "semaine", "mois", "prochain", "prochaine", "matin", "soir", "midi", "apres-midi",
+    "week-end", "weekend", "avant", "apres", "dans", "jusqu", "tous", "chaque", "tot", "tard",
+}
+
+JOURS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+JOURS_RELATIFS = {"aujourd'hui": 0, "apres-demain": 2, "demain": 1}
+MOIS = ("janvier|fevrier|mars|avril|mai|juin|juillet|aout|septembre|octobre|novembre|decembre")
+
+RE_JOUR_RELATIF = re.compile(r"\b(aujourd'hui|apres-demain|demain)\b")
+RE_JOUR_SEMAINE = re.compile(r"\b(?:ce\s+)?(" + "|".join(JOURS) + r")\b")
+RE_DATE_EXPLICITE = re.compile(
+    r"\b(?:le\s+)?(\d{1,2})(?:er)?\s+(" + MOIS + r")\b|\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b"
+)
+# norm est sans accents : le « à » des intervalles partagés y devient « a »
+RE_PLAGES = [re.compile(p.replace("[-à]", "[-a]")) for p in TIME_RANGE_PATTERNS]
+RE_HEURE = [
+    re.compile(r"\b(a\s+)?(\d{1,2})h(\d{2})?\b"),      # "15h", "à 15h30"
+    re.compile(r"\b(a\s+)?(\d{1,2}):(\d{2})\b"),       # "15:00"
+]
+# Un jour juste avant l'heure (« demain 15h », « lundi 9h30 ») la rend non ambiguë
+RE_JOUR_AVANT_HEURE = re.compile(
+    r"(?:\b(?:aujourd'hui|apres-demain|demain|" + "|".join(JOURS) + r")"
+    r"|\b\d{1,2}(?:er)?\s+(?:" + MOIS + r")|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?)\s*$"
+)
+RE_ACTIONS_MULTIPLES = re.compile(r"[,;]|\bet\b|\bpuis\b|\bensuite\b")
+
+
+def _normaliser(text: str) -> str:
+    """Minuscules, sans accents, apostrophes droites (les positions sont conservées)."""
+    text = text.replace("’", "'").lower()
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+# -------------------------------------------------
+# Dates et heures
+# -------------------------------------------------
+def _trouver_heure(norm: str):
+    """Retourne ((heure, minute), span, sûre) ou (None, None, False)."""
+    for pattern in RE_PLAGES:
+        match = pattern.search(norm)
+        if match:
+            heure, minute = int(match.group(1)), int(match.group(2) or 0)
+            return (heure, minute), match.span(), True
+    for pattern in RE_HEURE:
+        match = pattern.search(norm)
+        if match:
+            heure, minute = int(match.group(2)), int(match.group(3) or 0)
+            # « 15:00 » ou « à 15h » : heure ; « 2h » seul : peut-être une durée
+            sure = (
+                bool(match.group(1))
+                or ":" in match.group(0)
+                or bool(RE_JOUR_AVANT_HEURE.search(norm, 0, match.start()))
+            )
+            return (heure, minute), match.span(), sure
+    return None, None, False
+
+
+def _trouver_jour(norm: str, maintenant: datetime, heure=None):
+    """Retourne (date, span), (None, None) si aucune date, ou (False, span) si illisible."""
+    match = RE_JOUR_RELATIF.search(norm)
+    if match:
+        return (maintenant + timedelta(days=JOURS_RELATIFS[match.group(1)])).date(), match.span()
+
+    match = RE_JOUR_SEMAINE.search(norm)
+    if match:
+        # Prochain jour de ce nom ; aujourd'hui seulement si l'heure donnée est encore à venir
+        delta = (JOURS.index(match.group(1)) - maintenant.weekday()) % 7
+        if delta == 0 and (heure is None or heure <= (maintenant.hour, maintenant.minute)):
+            delta = 7
+        return (maintenant + timedelta(days=delta)).date(), match.span()
+
+    match = RE_DATE_EXPLICITE.search(norm)
+    if match:
+        import dateparser
+
+        parsed = dateparser.parse(
+            match.group(0),
+            languages=["fr"],
+            settings={"PREFER_DATES_FROM": "future", "DATE_ORDER": "DMY", "RELATIVE_BASE": maintenant},
+        )
+        if not parsed:
+            return False, match.span()
+        sans_annee = match.group(3) is None or match.group(5) is None
+        limite = maintenant.date() + timedelta(days=365 - JOURS_PASSES_AMBIGUS)
+        if sans_annee and parsed.date() > limite:
+            return False, match.span()
+        return parsed.date(), match.span()
+
+    return None, None
+
+
+# -------------------------------------------------
+# Pré-extraction
+# -------------------------------------------------
+def _message(categorie: str, texte: str, datetime_raw: Optional[str]) -> str:
+    quand = f" ({datetime_raw})" if datetime_raw else ""
+    if categorie == "agenda":
+        return f"J'ai repéré un rendez-vous : « {texte} »{quand}."
+    if categorie == "to_do":
+        return f"J'ai repéré une tâche : « {texte} »{quand}."
+    return f"J'ai repéré une note : « {texte} »."
+
+
+def pre_extraire(text_brut: str, maintenant: datetime = None):
+    """
+    Tente une extraction locale. Retourne ``(message, items)`` si la confiance
+    atteint ``SEUIL_CONFIANCE``, sinon None.
+    """
+    texte = (text_brut or "").strip().rstrip(".!")
+    if not texte or len(texte) > LONGUEUR_MAX or "\n" in texte or "?" in texte:
+        return None
+    if re.search(r"[.!]\s", texte):
+        return None  # plusieurs phrases
+
+    maintenant = maintenant or datetime.now()
+    norm = _normaliser(texte)
+    mots = re.findall(r"[\w'-]+", norm)
+    if not mots or MOTS_CONVERSATION.intersection(mots):
+        return None
+
+    # Note explicite : « Idée : ... »
+    for prefixe in PREFIXES_NOTE:
+        if norm.startswith(prefixe):
+            contenu = texte[len(prefixe):].strip()
+            if not contenu:
+                return None
+            item = {"category": "note", "text": contenu, "datetime_iso": None, "datetime_raw": None, "confidence": 0.95}
+            return _message("note", contenu, None), [item]
+
+    if RE_ACTIONS_MULTIPLES.search(norm):
+        return None  # probablement plusieurs items : le LLM sait découper
+
+    heure, span_heure, heure_sure = _trouver_heure(norm)
+    jour, span_jour = _trouver_jour(norm, maintenant, heure)
+    if jour is False:
+        return None
+
+    # Les indices temporels restants doivent tous avoir été compris
+    reste = norm
+    for span in (span_heure, span_jour):
+        if span:
+            reste = reste[:span[0]] + " " * (span[1] - span[0]) + reste[span[1]:]
+    if MOTS_TEMPS_FLOUS.intersection(re.findall(r"[\w'-]+", reste)):
+        return None
+    if re.search(r"\d", reste):
+        return None  # chiffres non interprétés (quantité ? date ?) : prudence
+
+    premier = mots[0]
+    est_tache = premier in VERBES_TACHE or norm.startswith(PREFIXES_TACHE)
+    est_agenda = bool(MOTS_AGENDA.intersection(mots)) or (premier in VERBES_AGENDA and heure is not None)
+
+    if est_agenda:
+        if heure is None:
+            return None  # rendez-vous sans heure : laisser le LLM décider
+        categorie, confiance = "agenda", 0.9
+    elif est_tache:
+        categorie, confiance = "to_do", 0.95 if heure is None and jour is None else 0.9
+    else:
+        return None
+    if heure is not None and not heure_sure:
+        confiance = min(confiance, CONFIANCE_HEURE_ISOLEE)
+
+    datetime_iso = None
+    datetime_raw = None
+    if heure is not None or jour is not None:
+        if heure is not None and not (0 <= heure[0] < 24 and 0 <= heure[1] < 60):
+            return None
+        date = jour or maintenant.date()
+        if heure is None:
+            datetime_iso = date.isoformat()
+        else:
+            moment = datetime(date.year, date.month, date.day, *heure)
+            if jour is None and moment < maintenant:
+                moment += timedelta(days=1)  # « à 15h » déjà passé → demain
+            datetime_iso = moment.isoformat()
+        spans = [s for s in (span_heure, span_jour) if s]
+        debut, fin = min(s[0] for s in spans), max(s[1] for s in spans)
+        datetime_raw = texte[debut:fin].strip()
+
+    if confiance < SEUIL_CONFIANCE:
+        return None
+
+    texte_item = texte[0].upper() + texte[1:]
+    item = {
+        "category": categorie,
+        "text": texte_item,
+        "datetime_iso": datetime_iso,
+        "datetime_raw": datetime_raw,
+        "confidence": confiance,
+    }
+    return _message(categorie, texte_item, datetime_raw), [item]
@@ -1,10 +1,17 @@
 import os
 import json
-import requests
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
-MODEL_NAME = "llama-3.3-70b-versatile"
+import json_store
+import llm_cache
+from groq_client import post_chat
+from model_router import STRONG_MODEL, route
+from json_locator import loads_lenient, strip_code_fences
+
+# Default (largest) model; calls are routed through ``model_router``
+MODEL_NAME = STRONG_MODEL
 
 # -------------------------------------------------
 # Load text prompts from files
@@ -19,8 +26,19 @@ def load_prompt(path):
 SYSTEM_PROMPT_FILE = "./prompt/smart_suggest_system.txt"
 USER_PROMPT_FILE = "./prompt/smart_suggest_user.txt"
 
-SYSTEM_PROMPT = load_prompt(SYSTEM_PROMPT_FILE)
-USER_PROMPT_TEMPLATE = load_prompt(USER_PROMPT_FILE)
+@lru_cache(maxsize=None)
+def get_prompts():
+    """Return the (system prompt, user template) pair, read on first use."""
+    return load_prompt(SYSTEM_PROMPT_FILE), load_prompt(USER_PROMPT_FILE)
+
+
+def __getattr__(name):
+    # Backwards compatibility: module-level prompt constants, loaded lazily
+    if name == "SYSTEM_PROMPT":
+        return get_prompts()[0]
+    if name == "USER_PROMPT_TEMPLATE":
+        return get_prompts()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -------------------------------------------------
 # Helper: summarize extracted items for smarter suggestions
@@ -72,26 +90,37 @@ def _summarize_extracted(data):
 # Generic Smart Suggest Agent
 # -------------------------------------------------
 def smart_suggest(
-    json_path: str = "./json_files/extracted_items.json",
+    json_path: Optional[str] = None,
     output_path: str = "./json_files/smart_suggest_output.json",
     temperature: float = 0.7,
+    use_cache: bool = False,
+    data: Optional[list] = None,
 ):
     """
     General-purpose LLM agent that:
-      - Reads ANY JSON file
+      - Reads ANY JSON file (or the ``data`` list given by the caller)
       - Sends content into a flexible prompt
       - Asks the LLM for improved structure / organization
       - The behavior is fully controlled by the prompt files
+
+    With ``use_cache=True`` the completion is reused from ``llm_cache`` as long
+    as the input data (and the current date) are unchanged, even though the
+    temperature is above zero.
     """
-    # If the caller does not provide a path, we default to the extracted items
-    # file used throughout the application. This ensures the agent always works
-    # with the latest extracted data.
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"JSON file not found: {json_path}")
+    # Without a path or data, we default to the extracted items stored in the
+    # local database used throughout the application. This ensures the agent
+    # always works with the latest extracted data.
+    if data is None and json_path is None:
+        from storage import get_item_store
+
+        data = get_item_store().list_items()
+    elif data is None:
+        if not os.path.exists(json_path):
+            raise FileNotFoundError(f"JSON file not found: {json_path}")
 
-    # Load JSON content
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        # Load JSON content
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
 
     # Build a concise summary that the LLM can use to reason about tasks,
     # notes and agenda items.
@@ -99,57 +128,70 @@ def smart_suggest(
 
     # Inject both the raw data and the summary into the user prompt. The prompt
     # files can reference ``{{JSON_DATA}}`` and ``{{SUMMARY}}`` placeholders.
-    user_prompt = USER_PROMPT_TEMPLATE.replace("{{JSON_DATA}}", json.dumps(data, indent=2))
+    system_prompt, user_template = get_prompts()
+    user_prompt = user_template.replace("{{JSON_DATA}}", json.dumps(data, indent=2))
     user_prompt = user_prompt.replace("{{SUMMARY}}", json.dumps(summary, indent=2))
 
-    # Adding a random UUID to the user prompt helps the model treat each request
-    # as a distinct conversation, reducing the chance of identical completions.
-    import uuid
-    unique_id = str(uuid.uuid4())
-    user_prompt_with_id = f"<!-- request_id: {unique_id} -->\n" + user_prompt
-
-    payload = {
-        "model": MODEL_NAME,
-        "temperature": temperature,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt_with_id}
-        ],
-    }
-
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(GROQ_CHAT_URL, headers=headers, json=payload)
-
-    if response.status_code != 200:
-        raise Exception(f"Groq API Error: {response.text}")
-
-    result = response.json()
-    # Extract the suggestion text from the LLM response
-    suggestion_text = result["choices"][0]["message"]["content"]
+    def call(model):
+        # The cache key is computed on the prompt *before* the request id below is
+        # added, so identical input data maps to the same entry.
+        cache_key = None
+        if llm_cache.should_cache(temperature, allow_nonzero=use_cache):
+            today = datetime.now().strftime("%Y-%m-%d")
+            cache_key = llm_cache.make_key(model, temperature, system_prompt, user_prompt, today)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        # Adding a random UUID to the user prompt helps the model treat each request
+        # as a distinct conversation, reducing the chance of identical completions.
+        import uuid
+        unique_id = str(uuid.uuid4())
+        user_prompt_with_id = f"<!-- request_id: {unique_id} -->\n" + user_prompt
+
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt_with_id}
+            ],
+        }
 
+        response = post_chat(payload)
+
+        if response.status_code != 200:
+            raise Exception(f"Groq API Error: {response.text}")
+
+        result = response.json()
+        # Extract the suggestion text from the LLM response
+        suggestion_text = result["choices"][0]["message"]["content"]
+        if cache_key:
+            llm_cache.put(cache_key, suggestion_text)
+        return suggestion_text
+
+    # Start on the fast model; escalate to the 70B model when the answer is not
+    # valid JSON or the input data is large.
+    suggestion_text, _ = route(
+        call,
+        validate=loads_lenient,
+        text=json.dumps(data, ensure_ascii=False),
+        label="smart_suggest",
+    )
     # The LLM may wrap the JSON in markdown fences (```json ... ```). Clean it.
-    cleaned = suggestion_text.strip()
-    if cleaned.startswith("```json"):
-        cleaned = cleaned[len("```json"):]
-    if cleaned.endswith("```"):
-        cleaned = cleaned[:-3]
-    cleaned = cleaned.strip()
+    cleaned = strip_code_fences(suggestion_text).strip()
 
     # Try to parse the cleaned string as JSON. If parsing fails, fall back to
     # storing the raw string under the key "suggestions".
     try:
-        parsed = json.loads(cleaned)
-    except Exception:
+        parsed = loads_lenient(cleaned)
+    except ValueError:
         parsed = {"suggestions": cleaned}
 
-    # Write the parsed JSON to the output file.
+    # Write the parsed JSON to the output file (atomically: concurrent sessions
+    # never observe a half-written file).
     try:
-        with open(output_path, "w", encoding="utf-8") as out_f:
-            json.dump(parsed, out_f, ensure_ascii=False, indent=2)
+        json_store.write_json(output_path, parsed, indent=2)
     except Exception as e:
         raise IOError(f"Failed to write smart suggest output to {output_path}: {e}")
 
@@ -161,11 +203,10 @@ if __name__ == "__main__":
 
     The original example attempted to load a non‑existent ``sample.json`` file,
     which caused a ``FileNotFoundError``. We now simply call ``smart_suggest``
-    without arguments so it defaults to the ``extracted_items.json`` file used
-    throughout the application. If that file is also missing, a clear error is
-    raised.
+    without arguments so it defaults to the extracted items stored in the local
+    database used throughout the application.
     """
-    # Use the default path (extracted_items.json) for the demo.
+    # Use the default source (stored extracted items) for the demo.
     output = smart_suggest()
     print("\n=== SMART SUGGEST OUTPUT ===\n")
     print(output)
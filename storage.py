@@ -0,0 +1,578 @@
+"""
+Stockage local SQLite (mode WAL) des items extraits, notes, événements
+d'agenda structurés et états de synchronisation.
+
+Remplace les fichiers JSON relus et réécrits en entier à chaque
+modification (``extracted_items.json``, ``google_agenda_structured.json``,
+``notes.json``, ``notes_data.json``) : un ajout est une insertion, et
+plusieurs sessions Streamlit peuvent lire pendant qu'une autre écrit.
+Au premier accès, ``migrate`` importe une seule fois les anciens fichiers
+JSON (renommés ensuite en ``*.migrated``).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DB_PATH = os.getenv("EASEMYDAY_DB", "./json_files/easemyday.db")
+# Items extraits : table SQLite ("sqlite") ou journal JSON Lines ("journal", voir items_journal)
+ITEMS_BACKEND = os.getenv("ITEMS_BACKEND", "sqlite")
+
+# Anciens fichiers JSON importés par ``migrate`` (une seule fois)
+LEGACY_FILES = {
+    "items": "./json_files/extracted_items.json",
+    "agenda_events": "./json_files/google_agenda_structured.json",
+    "notes": ["./json_files/notes.json", "./notes_data.json"],
+    "calendar_sync": "./json_files/google_agenda_sync.json",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT,
+    text TEXT,
+    datetime_iso TEXT,
+    external_id TEXT,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_category ON items(category);
+CREATE INDEX IF NOT EXISTS items_datetime_iso ON items(datetime_iso);
+CREATE UNIQUE INDEX IF NOT EXISTS items_external_id ON items(external_id) WHERE external_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT 'Sans titre',
+    text TEXT NOT NULL DEFAULT '',
+    color TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    datetime TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_archived ON notes(archived);
+
+CREATE TABLE IF NOT EXISTS agenda_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    external_id TEXT,
+    title TEXT,
+    start TEXT,
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS agenda_events_signature ON agenda_events(title, start);
+CREATE INDEX IF NOT EXISTS agenda_events_external_id ON agenda_events(external_id);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Compteur incrémenté à chaque écriture sur notes (tout processus) : les
+-- caches en mémoire ne relisent la table que s'il a changé
+INSERT OR IGNORE INTO sync_state (key, value) VALUES ('notes_version', '0');
+CREATE TRIGGER IF NOT EXISTS notes_version_insert AFTER INSERT ON notes BEGIN
+    UPDATE sync_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'notes_version';
+END;
+CREATE TRIGGER IF NOT EXISTS notes_version_update AFTER UPDATE ON notes BEGIN
+    UPDATE sync_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'notes_version';
+END;
+CREATE TRIGGER IF NOT EXISTS notes_version_delete AFTER DELETE ON notes BEGIN
+    UPDATE sync_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'notes_version';
+END;
+"""
+
+# Index plein texte (FTS5) : accents ignorés ("reunion" trouve "Réunion"),
+# tenus à jour par triggers sur notes et items. L'id des notes est un TEXT :
+# leur rowid implicite peut changer (VACUUM), l'index des notes est donc
+# contentless, indexé par une clé entière stable de notes_fts_keys.
+SEARCH_SCHEMA = """
+DROP TRIGGER IF EXISTS notes_fts_insert;
+DROP TRIGGER IF EXISTS notes_fts_delete;
+DROP TRIGGER IF EXISTS notes_fts_update;
+DROP TABLE IF EXISTS notes_fts;
+DROP TABLE IF EXISTS notes_fts_keys;
+
+CREATE TABLE notes_fts_keys (
+    key INTEGER PRIMARY KEY,
+    note_id TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE notes_fts USING fts5(
+    title, text, content='', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts_keys (note_id) VALUES (new.id);
+    INSERT INTO notes_fts (rowid, title, text)
+        SELECT key, new.title, new.text FROM notes_fts_keys WHERE note_id = new.id;
+END;
+CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, text)
+        SELECT 'delete', key, old.title, old.text FROM notes_fts_keys WHERE note_id = old.id;
+    DELETE FROM notes_fts_keys WHERE note_id = old.id;
+END;
+CREATE TRIGGER notes_fts_update AFTER UPDATE OF title, text ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, title, text)
+        SELECT 'delete', key, old.title, old.text FROM notes_fts_keys WHERE note_id = old.id;
+    INSERT INTO notes_fts (rowid, title, text)
+        SELECT key, new.title, new.text FROM notes_fts_keys WHERE note_id = new.id;
+END;
+
+-- Items acceptés conservés pour la recherche : la table items (ou le journal)
+-- est vidée après chaque acceptation, items_history ne l'est jamais
+DROP TRIGGER IF EXISTS items_fts_insert;
+DROP TRIGGER IF EXISTS items_fts_delete;
+DROP TABLE IF EXISTS items_fts;
+
+CREATE TABLE IF NOT EXISTS items_history (
+    id INTEGER PRIMARY KEY,
+    signature TEXT NOT NULL UNIQUE,
+    category TEXT,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE items_fts USING fts5(
+    text, content='items_history', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER items_fts_insert AFTER INSERT ON items_history BEGIN
+    INSERT INTO items_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER items_fts_delete AFTER DELETE ON items_history BEGIN
+    INSERT INTO items_fts (items_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+-- Index construits après coup sur une base existante
+INSERT INTO notes_fts_keys (note_id) SELECT id FROM notes;
+INSERT INTO notes_fts (rowid, title, text)
+    SELECT k.key, n.title, n.text FROM notes n JOIN notes_fts_keys k ON k.note_id = n.id;
+INSERT OR IGNORE INTO items_history (signature, category, text, created_at)
+    SELECT json_array(category, text, datetime_iso), category, text, created_at
+    FROM items WHERE text IS NOT NULL AND text != '' ORDER BY id;
+INSERT INTO items_fts (items_fts) VALUES ('rebuild');
+"""
+
+# Poids bm25 du titre et du texte des notes
+TITLE_WEIGHT = 5.0
+TEXT_WEIGHT = 1.0
+# Mots plus courts cherchés tels quels : un préfixe d'une lettre couvre tout l'index
+MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", "3"))
+# Correspondances classées par bm25 au plus, par source (les plus récentes) :
+# une requête très large reste sous la dizaine de millisecondes
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "500"))
+
+NOTE_FIELDS = ("title", "text", "color", "archived", "pinned", "datetime", "updated_at")
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def _first(item: Dict, *keys) -> Optional[str]:
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value if isinstance(value, str) else json.dumps(value, sort_keys=True)
+    return None
+
+
+def fts_query(query: str) -> Optional[str]:
+    """
+    Requête FTS5 à partir d'une saisie libre : chaque mot d'au moins
+    ``MIN_PREFIX`` caractères devient un préfixe (``"reun"*``), les plus
+    courts sont cherchés tels quels ; tous requis. None si la saisie ne
+    contient aucun mot.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"' for word in words)
+
+
+def _note_row(row: sqlite3.Row) -> Dict:
+    note = dict(row)
+    note["archived"] = bool(note["archived"])
+    note["pinned"] = bool(note["pinned"])
+    return note
+
+
+class Storage:
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # executescript valide toute transaction ouverte : BEGIN/COMMIT dans le script
+        self.conn.executescript(f"BEGIN IMMEDIATE;\n{SCHEMA}\nCOMMIT;")
+        self._create_search_index()
+
+    # -------------------------------------------------
+    # Connexions (une par thread)
+    # -------------------------------------------------
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Transaction d'écriture (verrou pris dès le début : pas d'interblocage)."""
+        conn = self.conn
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _create_search_index(self):
+        # Création (et reconstruction) seulement au premier lancement : inoffensive si concurrente.
+        # Une base indexée à l'ancienne (rowid des notes, table items) est reconstruite.
+        names = {"notes_fts", "notes_fts_keys", "items_fts", "items_history"}
+        found = self.conn.execute(
+            f"SELECT count(*) FROM sqlite_master WHERE name IN ({', '.join('?' * len(names))})", tuple(names)
+        ).fetchone()[0]
+        if found == len(names):
+            return
+        self.conn.executescript(f"BEGIN IMMEDIATE;\n{SEARCH_SCHEMA}\nCOMMIT;")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # -------------------------------------------------
+    # Items extraits
+    # -------------------------------------------------
+    def add_items(self, items: Iterable[Dict]) -> int:
+        """Ajoute des items ; ceux dont ``external_id`` existe déjà sont ignorés."""
+        rows = [
+            (item.get("category"), item.get("text"), item.get("datetime_iso"), item.get("external_id"),
+             json.dumps(item, ensure_ascii=False), _now())
+            for item in items
+        ]
+        with self.transaction() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO items (category, text, datetime_iso, external_id, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+
+    def list_items(self, category: Optional[str] = None) -> List[Dict]:
+        if category is None:
+            rows = self.conn.execute("SELECT data FROM items ORDER BY id")
+        else:
+            rows = self.conn.execute("SELECT data FROM items WHERE category = ? ORDER BY id", (category,))
+        return [json.loads(row["data"]) for row in rows]
+
+    def clear_items(self, category: Optional[str] = None) -> int:
+        with self.transaction() as conn:
+            if category is None:
+                return conn.execute("DELETE FROM items").rowcount
+            return conn.execute("DELETE FROM items WHERE category = ?", (category,)).rowcount
+
+    def index_items(self, items: Iterable[Dict]) -> int:
+        """
+        Conserve des items acceptés pour la recherche (``items_history``,
+        jamais vidée par ``clear_items``), quel que soit ``ITEMS_BACKEND``.
+        Un item déjà conservé (même catégorie, texte et date) est ignoré.
+        """
+        rows = [
+            (json.dumps([item.get("category"), item["text"], item.get("datetime_iso")],
+                        ensure_ascii=False, separators=(",", ":")),
+             item.get("category"), item["text"], _now())
+            for item in items if item.get("text")
+        ]
+        with self.transaction() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO items_history (signature, category, text, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            ).rowcount
+
+    # -------------------------------------------------
+    # Événements d'agenda structurés
+    # -------------------------------------------------
+    def add_agenda_events(self, events: Iterable[Dict]) -> int:
+        rows = [
+            (event.get("id"), _first(event, "text", "summary", "titre"),
+             _first(event, "datetime_iso", "date", "start"), json.dumps(event, ensure_ascii=False), _now())
+            for event in events
+        ]
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO agenda_events (external_id, title, start, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def upsert_agenda_events(self, events: Iterable[Dict]) -> int:
+        """Comme ``add_agenda_events``, mais remplace les événements de même ``id`` (Google)."""
+        events = list(events)
+        with self.transaction() as conn:
+            conn.executemany(
+                "DELETE FROM agenda_events WHERE external_id = ?", [(e["id"],) for e in events if e.get("id")]
+            )
+            return self.add_agenda_events(events)
+
+    def delete_agenda_events(self, external_ids: Iterable[str]) -> int:
+        with self.transaction() as conn:
+            cursor = conn.executemany(
+                "DELETE FROM agenda_events WHERE external_id = ?", [(i,) for i in external_ids]
+            )
+        return cursor.rowcount
+
+    def retain_agenda_events(self, external_ids: Iterable[str]) -> int:
+        """
+        Supprime les événements absents de ``external_ids`` (listing complet
+        de Google), y compris ceux sans id Google ; retourne le nombre supprimé.
+        """
+        with self.transaction() as conn:
+            return conn.execute(
+                "DELETE FROM agenda_events WHERE external_id IS NULL "
+                "OR external_id NOT IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(external_ids)),),
+            ).rowcount
+
+    def agenda_event_etag(self, external_id: str) -> Optional[str]:
+        """``etag`` Google de la version enregistrée (None si l'événement est inconnu)."""
+        row = self.conn.execute(
+            "SELECT data FROM agenda_events WHERE external_id = ? ORDER BY id DESC LIMIT 1", (external_id,)
+        ).fetchone()
+        return json.loads(row["data"]).get("etag") if row else None
+
+    def list_agenda_events(self) -> List[Dict]:
+        return [json.loads(row["data"]) for row in self.conn.execute("SELECT data FROM agenda_events ORDER BY id")]
+
+    def has_agenda_event(self, title: str, start: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM agenda_events WHERE title = ? AND start = ? LIMIT 1", (title, start)
+        ).fetchone()
+        return row is not None
+
+    # -------------------------------------------------
+    # Notes
+    # -------------------------------------------------
+    def list_notes(self) -> List[Dict]:
+        return [_note_row(row) for row in self.conn.execute("SELECT * FROM notes ORDER BY created_at, rowid")]
+
+    def get_note(self, note_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+        return _note_row(row) if row else None
+
+    def add_notes(self, notes: Iterable[Dict]) -> int:
+        rows = []
+        for note in notes:
+            created_at = note.get("created_at") or _now()
+            rows.append((
+                note.get("id") or str(uuid.uuid4()), note.get("title") or "Sans titre", note.get("text") or "", note.get("color"),
+                int(bool(note.get("archived"))), int(bool(note.get("pinned"))), note.get("datetime"),
+                created_at, note.get("updated_at") or created_at,
+            ))
+        with self.transaction() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO notes (id, title, text, color, archived, pinned, datetime, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            ).rowcount
+
+    def update_note(self, note_id: str, **changes) -> Optional[Dict]:
+        """Met à jour les champs donnés ; retourne la note (None si absente)."""
+        changes = {k: v for k, v in changes.items() if k in NOTE_FIELDS}
+        changes.setdefault("updated_at", _now())
+        assignments = ", ".join(f"{k} = ?" for k in changes)
+        values = [int(v) if isinstance(v, bool) else v for v in changes.values()]
+        with self.transaction() as conn:
+            cursor = conn.execute(f"UPDATE notes SET {assignments} WHERE id = ?", (*values, note_id))
+            if cursor.rowcount == 0:
+                return None
+            return self.get_note(note_id)
+
+    def delete_note(self, note_id: str) -> bool:
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM notes WHERE id = ?", (note_id,)).rowcount > 0
+
+    def notes_version(self) -> int:
+        """Compteur de modifications de la table notes (maintenu par triggers)."""
+        return int(self.get_state("notes_version", 0))
+
+    def save_notes(self, upserts: Iterable[Dict] = (), deletes: Iterable[str] = ()) -> Tuple[int, int, int]:
+        """
+        Écrit un lot de notes complètes (insertion ou remplacement) et de
+        suppressions en une transaction.
+
+        Returns:
+            ``(version_avant, version_après, lignes_modifiées)`` : le
+            ``notes_version`` lu au début et à la fin de la transaction, et le
+            nombre de lignes réellement écrites (une suppression d'une note
+            absente ne compte pas).
+        """
+        rows = [
+            (note["id"], note.get("title") or "Sans titre", note.get("text") or "", note.get("color"),
+             int(bool(note.get("archived"))), int(bool(note.get("pinned"))), note.get("datetime"),
+             note.get("created_at") or _now(), note.get("updated_at") or _now())
+            for note in upserts
+        ]
+        with self.transaction() as conn:
+            before = self.notes_version()
+            upserted = conn.executemany(
+                "INSERT INTO notes (id, title, text, color, archived, pinned, datetime, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title = excluded.title, text = excluded.text, "
+                "color = excluded.color, archived = excluded.archived, pinned = excluded.pinned, "
+                "datetime = excluded.datetime, updated_at = excluded.updated_at",
+                rows,
+            ).rowcount
+            deleted = conn.executemany("DELETE FROM notes WHERE id = ?", [(note_id,) for note_id in deletes]).rowcount
+            # rowcount ignore les écritures des triggers (FTS, compteur)
+            return before, self.notes_version(), max(upserted, 0) + max(deleted, 0)
+
+    # -------------------------------------------------
+    # Recherche plein texte
+    # -------------------------------------------------
+    def search(self, query: str, limit: int = 20, kinds=("note", "item")) -> List[Dict]:
+        """
+        Notes (titre et texte) et items acceptés (texte, ``items_history``)
+        correspondant à tous les mots de ``query``, par préfixe et sans tenir
+        compte des accents, classés par pertinence bm25 (titre des notes
+        favorisé). Au plus ``SEARCH_CANDIDATES`` correspondances par source,
+        les plus récentes, sont classées.
+
+        Returns:
+            ``[{"kind": "note"|"item", "id", "title", "text", "score"}]``,
+            meilleurs résultats d'abord (score bm25 : plus petit = meilleur).
+        """
+        match = fts_query(query)
+        if match is None or limit <= 0:
+            return []
+        results = []
+        if "note" in kinds:
+            rows = self.conn.execute(
+                "SELECT n.id, n.title, n.text, c.score FROM ("
+                "    SELECT rowid, bm25(notes_fts, ?, ?) AS score FROM notes_fts"
+                "    WHERE notes_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                ") c JOIN notes_fts_keys k ON k.key = c.rowid JOIN notes n ON n.id = k.note_id "
+                "ORDER BY c.score LIMIT ?",
+                (TITLE_WEIGHT, TEXT_WEIGHT, match, SEARCH_CANDIDATES, limit),
+            )
+            results += [{"kind": "note", **dict(row)} for row in rows]
+        if "item" in kinds:
+            rows = self.conn.execute(
+                "SELECT h.id, h.category AS title, h.text, c.score FROM ("
+                "    SELECT rowid, bm25(items_fts) AS score FROM items_fts"
+                "    WHERE items_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                ") c JOIN items_history h ON h.id = c.rowid "
+                "ORDER BY c.score LIMIT ?",
+                (match, SEARCH_CANDIDATES, limit),
+            )
+            results += [{"kind": "item", **dict(row)} for row in rows]
+        # Même formule bm25 des deux côtés : scores bruts fusionnés tels quels
+        results.sort(key=lambda r: r["score"])
+        return results[:limit]
+
+    # -------------------------------------------------
+    # États de synchronisation
+    # -------------------------------------------------
+    def get_state(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    def set_state(self, key: str, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    # -------------------------------------------------
+    # Migration des anciens fichiers JSON
+    # -------------------------------------------------
+    def migrate(self, legacy: Optional[Dict] = None) -> Dict[str, int]:
+        """
+        Importe les anciens fichiers JSON (une seule fois chacun, dans une
+        transaction), puis les renomme en ``*.migrated``. Retourne le nombre
+        d'enregistrements importés par fichier.
+        """
+        legacy = LEGACY_FILES if legacy is None else legacy
+        importers = {
+            "items": self.add_items,
+            "agenda_events": self.add_agenda_events,
+            "notes": self.add_notes,
+            "calendar_sync": self._import_calendar_sync,
+        }
+        imported = {}
+        for kind, paths in legacy.items():
+            for path in [paths] if isinstance(paths, str) else paths:
+                if not os.path.exists(path):
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[STORAGE] Fichier {path} illisible, non migré : {e}")
+                    continue
+                with self.transaction():
+                    if self.get_state(f"migrated:{os.path.abspath(path)}"):
+                        continue
+                    imported[path] = importers[kind](data)
+                    self.set_state(f"migrated:{os.path.abspath(path)}", _now())
+                os.replace(path, f"{path}.migrated")
+                print(f"[STORAGE] {path} migré ({imported[path]} enregistrement(s))")
+        return imported
+
+    def _import_calendar_sync(self, state: Dict) -> int:
+        if not state.get("sync_token"):
+            return 0
+        self.set_state(f"calendar_sync_token:{state.get('calendar_id')}", state["sync_token"])
+        return 1
+
+
+_stores: Dict[str, Storage] = {}
+_stores_lock = threading.Lock()
+
+
+def get_storage(path: Optional[str] = None) -> Storage:
+    """Base partagée par tout le processus ; migre les anciens fichiers au premier accès."""
+    path = os.path.abspath(path or DB_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = Storage(path)
+            store.migrate()
+        return store
+
+
+_journal = None
+
+
+def get_item_store():
+    """
+    Stockage des items extraits selon ``ITEMS_BACKEND`` : même interface
+    (``add_items``, ``list_items``, ``clear_items``) pour les deux backends.
+    Changer de backend ne déplace pas les items déjà enregistrés.
+    """
+    global _journal
+    if ITEMS_BACKEND != "journal":
+        return get_storage()
+    from items_journal import ItemsJournal
+
+    with _stores_lock:
+        if _journal is None:
+            _journal = ItemsJournal()
+        return _journal
@@ -0,0 +1,250 @@
+"""
+Miroir local de Google Tasks pour la barre latérale.
+
+La barre latérale lit ce miroir (mémoire, puis disque au démarrage) au lieu
+d'interroger Google à chaque rerun Streamlit. Un thread d'arrière-plan le
+rafraîchit toutes les ``REFRESH_INTERVAL`` secondes, ou sur demande, en ne
+récupérant que les tâches modifiées depuis la dernière synchro
+(``updatedMin`` + ``showDeleted``). Les mutations locales sont appliquées
+immédiatement au miroir puis confiées à l'outbox (durable : rien n'est perdu
+si le processus s'arrête) ; en cas d'échec définitif, la tâche est restaurée.
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import json_store
+from outbox import TASK_INSERT, TASK_STATUS, get_outbox
+
+MIRROR_FILE = os.getenv("TASKS_MIRROR_FILE", "./json_files/tasks_mirror.json")
+REFRESH_INTERVAL = float(os.getenv("TASKS_MIRROR_INTERVAL", "60"))  # secondes
+
+# Marge sur updatedMin : horloges et propagation côté Google
+UPDATED_MIN_MARGIN = timedelta(seconds=60)
+
+TASKLIST_FIELDS = "id,title"
+TASK_FIELDS = "id,title,status,etag,position,deleted,hidden"
+
+
+def _rfc3339(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class TasksMirror:
+    def __init__(self, agent_factory: Optional[Callable] = None, path: str = MIRROR_FILE,
+                 interval: float = REFRESH_INTERVAL, outbox=None):
+        if agent_factory is None:
+            from agent_task import EaseTasksAgent as agent_factory
+        self.agent_factory = agent_factory
+        self.outbox = outbox or get_outbox()
+        self.path = path
+        self.interval = interval
+
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.tasklists: List[Dict] = []          # ordre Google
+        self.tasks: Dict[str, Dict[str, Dict]] = {}  # list_id -> task_id -> tâche
+        self.synced_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.generation = 0  # incrémenté à chaque tentative de rafraîchissement
+
+        self._wakeup = threading.Event()
+        self._refreshed = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self.load()
+        self.outbox.listeners.append(self._on_outbox_batch)
+
+    # -------------------------------------------------
+    # Persistance
+    # -------------------------------------------------
+    def load(self):
+        data = json_store.read_json(self.path)
+        if not data:
+            return
+        with self._lock:
+            self.tasklists = data.get("tasklists", [])
+            self.tasks = data.get("tasks", {})
+            self.synced_at = data.get("synced_at")
+
+    def save(self):
+        with self._lock:
+            data = {"tasklists": self.tasklists, "tasks": self.tasks, "synced_at": self.synced_at}
+            json_store.write_json(self.path, data)
+
+    # -------------------------------------------------
+    # Lecture (barre latérale)
+    # -------------------------------------------------
+    def snapshot(self) -> List[Dict]:
+        """Tâches au format de la barre latérale, sans appel réseau."""
+        with self._lock:
+            result = []
+            for tasklist in self.tasklists:
+                tasks = self.tasks.get(tasklist["id"], {}).values()
+                for task in sorted(tasks, key=lambda t: t.get("position", "")):
+                    result.append({
+                        "title": task.get("title", "Sans titre"),
+                        "status": task.get("status", "needsAction"),
+                        "list": tasklist.get("title", "Sans nom"),
+                        "list_id": tasklist["id"],
+                        "task_id": task["id"],
+                        "etag": task.get("etag"),
+                    })
+            return result
+
+    @property
+    def is_empty(self) -> bool:
+        return self.synced_at is None
+
+    # -------------------------------------------------
+    # Synchronisation
+    # -------------------------------------------------
+    def refresh(self, full: bool = False) -> int:
+        """
+        Récupère les changements depuis la dernière synchro (tout si ``full``
+        ou premier passage). Retourne le nombre de tâches modifiées.
+        """
+        with self._refresh_lock:
+            started = datetime.now(timezone.utc)
+            agent = self.agent_factory()
+            tasklists = agent.list_tasklists(fields=TASKLIST_FIELDS)
+
+            with self._lock:
+                since = None if full or not self.synced_at else self.synced_at
+                known = set(self.tasks) if since else set()
+
+            incremental = [t for t in tasklists if t["id"] in known]
+            fresh = [t for t in tasklists if t["id"] not in known]
+            results = []
+            if incremental:
+                results += agent.get_all_tasks(
+                    incremental, fields=TASK_FIELDS, updatedMin=since, showDeleted=True, showHidden=True,
+                )
+            if fresh:
+                results += agent.get_all_tasks(fresh, fields=TASK_FIELDS)
+
+            changed = 0
+            errors = []
+            with self._lock:
+                self.tasklists = tasklists
+                live = {t["id"] for t in tasklists}
+                for list_id in [l for l in self.tasks if l not in live]:
+                    del self.tasks[list_id]
+
+                for result in results:
+                    list_id = result["tasklist"]["id"]
+                    if result["error"]:
+                        errors.append(f"{result['tasklist'].get('title', list_id)} : {result['error']}")
+                        continue
+                    tasks = self.tasks.setdefault(list_id, {}) if list_id in known else {}
+                    for task in result["tasks"]:
+                        changed += 1
+                        if task.get("deleted") or task.get("hidden"):
+                            tasks.pop(task["id"], None)
+                        else:
+                            tasks[task["id"]] = task
+                    self.tasks[list_id] = tasks
+
+                self._reapply_pending()
+                if not errors:
+                    # Une liste en échec sera relue depuis l'ancien updatedMin
+                    self.synced_at = _rfc3339(started - UPDATED_MIN_MARGIN)
+                self.last_error = "; ".join(errors) or None
+                self.save()
+                self.generation += 1
+                self._refreshed.notify_all()
+            return changed
+
+    def _reapply_pending(self):
+        """Changements de statut encore dans l'outbox : Google ne les montre pas encore."""
+        for entry in self.outbox.status():
+            if entry["kind"] != TASK_STATUS or entry["state"] != "pending":
+                continue
+            payload = entry["payload"]
+            task = self.tasks.get(payload["list_id"], {}).get(payload["task_id"])
+            if task is not None:
+                task["status"] = payload["status"]
+
+    # -------------------------------------------------
+    # Rafraîchissement en arrière-plan
+    # -------------------------------------------------
+    def start(self):
+        """Démarre le thread de rafraîchissement (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="tasks-mirror", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                with self._lock:
+                    self.last_error = str(e)
+                    self.generation += 1
+                    self._refreshed.notify_all()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def request_refresh(self, wait: float = 0):
+        """Demande un rafraîchissement immédiat ; attend au plus ``wait`` secondes."""
+        with self._lock:
+            before = self.generation
+            self._wakeup.set()
+            if wait:
+                self._refreshed.wait_for(lambda: self.generation != before, timeout=wait)
+
+    # -------------------------------------------------
+    # Mutations optimistes
+    # -------------------------------------------------
+    def set_status(self, task_refs: List[Dict], status: str) -> List[str]:
+        """
+        Change le statut dans le miroir tout de suite et le met en file dans
+        l'outbox, qui l'envoie à Google par lot. Retourne les clés de l'outbox.
+        """
+        refs = []
+        with self._lock:
+            for ref in task_refs:
+                task = self.tasks.get(ref["list_id"], {}).get(ref["task_id"])
+                previous = task.get("status") if task else ref.get("status")
+                if task is not None:
+                    task["status"] = status
+                refs.append({**ref, "previous_status": previous})
+            self.save()
+        return self.outbox.enqueue_status(refs, status)
+
+    def _on_outbox_batch(self, kind: str, entries: List[Dict]):
+        """Abonné de l'outbox : restaure les statuts en échec, rafraîchit après un envoi."""
+        if kind not in (TASK_INSERT, TASK_STATUS):
+            return
+        if kind == TASK_STATUS:
+            failed = [e for e in entries if e["state"] == "failed"]
+            if failed:
+                with self._lock:
+                    for entry in failed:
+                        payload = entry["payload"]
+                        task = self.tasks.get(payload["list_id"], {}).get(payload["task_id"])
+                        # Un changement plus récent a pu passer entre-temps : ne pas l'écraser
+                        if task is not None and task.get("status") == payload["status"] \
+                                and payload.get("previous_status"):
+                            task["status"] = payload["previous_status"]
+                    self.last_error = "; ".join(e["error"] or "échec" for e in failed)
+                    self.save()
+        if any(e["state"] == "done" for e in entries):
+            self.request_refresh()
+
+
+_mirror: Optional[TasksMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> TasksMirror:
+    """Miroir partagé par tout le processus (toutes les sessions Streamlit)."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = TasksMirror()
+            _mirror.start()
+        return _mirror
@@ -0,0 +1,164 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import agenda_agent
+from agenda_agent import list_events, load_sync_token, save_sync_token
+from storage import Storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Storage(str(tmp_path / "test.db"))
+    with patch("agenda_agent.get_storage", return_value=store):
+        yield store
+
+
+class Gone(Exception):
+    resp = MagicMock(status=410)
+
+
+def _service(pages):
+    service = MagicMock()
+    service.events.return_value.list.return_value.execute.side_effect = pages
+    return service
+
+
+def _calls(service):
+    return [c.kwargs for c in service.events.return_value.list.call_args_list]
+
+
+def test_full_sync_paginates_from_now():
+    service = _service([
+        {"items": [{"id": "a"}], "nextPageToken": "p2"},
+        {"items": [{"id": "b"}], "nextSyncToken": "sync-1"},
+    ])
+
+    events, token, full = list_events(service)
+
+    assert [e["id"] for e in events] == ["a", "b"]
+    assert token == "sync-1"
+    assert full is True
+    first, second = _calls(service)
+    assert "syncToken" not in first and first["timeMin"].endswith("Z")
+    assert second["pageToken"] == "p2" and second["timeMin"] == first["timeMin"]
+    assert first["fields"] == agenda_agent.EVENT_FIELDS
+
+
+def test_incremental_sync_sends_token():
+    service = _service([{"items": [{"id": "a", "status": "cancelled"}], "nextSyncToken": "sync-2"}])
+
+    events, token, full = list_events(service, "sync-1")
+
+    assert token == "sync-2"
+    assert full is False
+    assert _calls(service)[0]["syncToken"] == "sync-1"
+
+
+def test_gone_token_triggers_full_resync():
+    service = _service([Gone(), {"items": [{"id": "a"}], "nextSyncToken": "fresh"}])
+
+    events, token, full = list_events(service, "expired")
+
+    assert token == "fresh"
+    assert full is True
+    assert "syncToken" not in _calls(service)[1] and "timeMin" in _calls(service)[1]
+
+
+def test_sync_token_roundtrip(store):
+    assert load_sync_token() is None
+
+    save_sync_token("abc")
+
+    assert load_sync_token() == "abc"
+    assert store.get_state("calendar_sync_token:primary") == "abc"
+
+
+def test_upcoming_skips_cancelled_and_past_events():
+    events = [
+        {"id": "past", "end": {"dateTime": "2000-01-01T10:00:00Z"}},
+        {"id": "gone", "status": "cancelled"},
+        {"id": "next", "end": {"dateTime": "2999-01-01T10:00:00+01:00"}},
+        {"id": "allday", "end": {"date": "2999-01-02"}},
+    ]
+
+    assert [e["id"] for e in agenda_agent._upcoming(events)] == ["next", "allday"]
+
+
+@pytest.fixture
+def agent_files(store):
+    with patch("agenda_agent.save_sync_token") as save, \
+            patch("agenda_agent.load_file", return_value="prompt"):
+        yield store, save
+
+
+def _event(event_id, summary="Dentiste", etag="e1", **fields):
+    return {"id": event_id, "etag": etag, "summary": summary,
+            "start": {"dateTime": "2999-01-01T10:00:00Z"}, "end": {"dateTime": "2999-01-01T11:00:00Z"}, **fields}
+
+
+def _run(changes, *replies, token="sync-2", full=False):
+    with patch("agenda_agent.fetch_google_agenda_changes", return_value=(changes, token, full)), \
+            patch("agenda_agent.groq_format", side_effect=list(replies)) as groq:
+        agenda_agent.google_agenda_agent()
+    return groq
+
+
+def test_sync_token_committed_only_after_save(agent_files):
+    store, save = agent_files
+
+    _run([_event("a")], "pas de json")
+    save.assert_not_called()
+
+    _run([_event("a")], '[{"text": "Dentiste"}]')
+    save.assert_called_once_with("sync-2")
+    assert store.list_agenda_events() == [{"text": "Dentiste", "id": "a", "etag": "e1"}]
+
+
+def test_changed_event_replaces_row_and_cancelled_is_deleted(agent_files):
+    store, save = agent_files
+    _run([_event("a"), _event("b", "Sport")], '{"evenements": [{"id": "a", "titre": "Dentiste"}, {"id": "b", "titre": "Sport"}]}')
+
+    groq = _run([_event("a", "Dentiste 11h", etag="e2"), _event("b", "Sport"), {"id": "c", "status": "cancelled"}],
+                '[{"id": "a", "titre": "Dentiste 11h"}]')
+    _run([{"id": "b", "status": "cancelled"}])
+
+    # b inchangé (même etag) : pas renvoyé au modèle
+    assert "Sport" not in groq.call_args.args[1]
+    assert [e["titre"] for e in store.list_agenda_events()] == ["Dentiste 11h"]
+    assert save.call_count == 3
+
+
+def test_truncated_reply_keeps_token_and_complete_items(agent_files):
+    store, save = agent_files
+
+    _run([_event("a"), _event("b")], '[{"id": "a", "titre": "A"}, {"id": "b", "tit')
+
+    save.assert_not_called()
+    assert [e["id"] for e in store.list_agenda_events()] == ["a"]
+
+
+def test_events_sent_to_model_in_chunks(agent_files):
+    store, save = agent_files
+    events = [_event(str(i)) for i in range(5)]
+    replies = [f'[{{"id": "{i}"}}, {{"id": "{i + 1}"}}]' for i in (0, 2)] + ['[{"id": "4"}]']
+
+    with patch.object(agenda_agent, "LLM_CHUNK_SIZE", 2):
+        groq = _run(events, *replies)
+
+    assert groq.call_count == 3
+    assert len(store.list_agenda_events()) == 5
+    save.assert_called_once_with("sync-2")
+
+
+def test_full_resync_drops_events_deleted_while_token_was_stale(agent_files):
+    store, save = agent_files
+    _run([_event("a"), _event("b", "Sport")], '[{"id": "a", "titre": "Dentiste"}, {"id": "b", "titre": "Sport"}]')
+    store.add_agenda_events([{"text": "Ancien import sans id"}])
+
+    # Jeton expiré : listing complet, b a été supprimé entre-temps (pas d'annulation renvoyée)
+    groq = _run([_event("a"), _event("c", "Piscine")], '[{"id": "c", "titre": "Piscine"}]', token="fresh", full=True)
+
+    assert "Dentiste" not in groq.call_args.args[1]
+    assert sorted(e["id"] for e in store.list_agenda_events()) == ["a", "c"]
+    save.assert_called_with("fresh")
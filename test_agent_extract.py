@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from agent_extract import extraire_batch, extraire_batch_async, FluxExtraction, normaliser_dates
+
+
+def _fake_groq(text):
+    # Les textes plus courts répondent plus vite : l'ordre d'achèvement diffère
+    time.sleep(0.01 * len(text))
+    if text == "boom":
+        raise RuntimeError("Erreur API Groq 500")
+    return f'Ok.\n[{{"category": "to_do", "text": "{text}", "datetime_iso": null, "datetime_raw": null}}]'
+
+
+@pytest.fixture
+def fake_groq():
+    with patch("agent_extract.appeler_groq", side_effect=_fake_groq):
+        yield
+
+
+def test_batch_keeps_input_order(fake_groq):
+    texts = ["ccccc", "a", "bbb"]
+    results = list(extraire_batch(texts, max_concurrency=3))
+
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert [r["items"][0]["text"] for r in results] == texts
+
+
+def test_batch_completion_order(fake_groq):
+    texts = ["ccccc", "a", "bbb"]
+    results = list(extraire_batch(texts, max_concurrency=3, ordered=False))
+
+    assert [r["text"] for r in results] == ["a", "bbb", "ccccc"]
+
+
+def test_batch_isolates_errors(fake_groq):
+    results = list(extraire_batch(["a", "boom", "b"], max_concurrency=2))
+
+    assert results[1]["error"] == "Erreur API Groq 500"
+    assert results[1]["items"] == []
+    assert results[2]["items"][0]["text"] == "b"
+
+
+def test_batch_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow(text):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight -= 1
+        return "Ok.\n[]"
+
+    with patch("agent_extract.appeler_groq", side_effect=slow):
+        results = list(extraire_batch(["x"] * 20, max_concurrency=3))
+
+    assert len(results) == 20
+    assert peak <= 3
+
+
+def test_batch_async(fake_groq):
+    async def collect():
+        return [r async for r in extraire_batch_async(["bbb", "a"], max_concurrency=2)]
+
+    results = asyncio.run(collect())
+    assert [r["text"] for r in results] == ["bbb", "a"]
+
+
+def test_flux_extraction_progressive():
+    flux = FluxExtraction()
+    assert flux.ajouter("Bonjour, j'ai")
+    assert flux.message == "Bonjour, j'ai"
+    flux.ajouter(" noté ta tâche.\n[{\"category\": \"to_do\", \"text\": \"Acheter [du] pain")
+    assert flux.message == "Bonjour, j'ai noté ta tâche."
+    assert flux.items is None
+    flux.ajouter("\", \"datetime_iso\": null}")
+    assert flux.items is None
+    flux.ajouter("]")
+
+    assert flux.items == [{"category": "to_do", "text": "Acheter [du] pain", "datetime_iso": None}]
+    assert flux.resultat()[0] == "Bonjour, j'ai noté ta tâche."
+
+
+@pytest.mark.parametrize("taille", [1, 2, 3, 7])
+def test_flux_extraction_fragments_match_one_shot(taille):
+    texte = 'Voici ``la`` liste [provisoire] :\n```json\n[{"category": "note", "text": "a"}]\n```'
+    flux = FluxExtraction()
+    for i in range(0, len(texte), taille):
+        flux.ajouter(texte[i:i + taille])
+
+    assert flux.message == "Voici ``la`` liste [provisoire] :"
+    assert flux.resultat() == ("Voici ``la`` liste [provisoire] :", [{"category": "note", "text": "a"}])
+
+
+def test_flux_extraction_incomplete_raises():
+    flux = FluxExtraction()
+    flux.ajouter("Rien à signaler.")
+    with pytest.raises(ValueError):
+        flux.resultat()
+
+
+def test_normaliser_dates_iso_fast_path():
+    with patch("agent_extract._parser_expression") as slow:
+        items = normaliser_dates([{"datetime_iso": "2025-11-27T14:00", "datetime_raw": "jeudi 14h"}])
+
+    assert items[0]["datetime_iso"] == "2025-11-27T14:00:00"
+    slow.assert_not_called()
+
+
+def test_normaliser_dates_memoizes_raw_expressions():
+    import agent_extract
+
+    agent_extract._parser_a_la_date.cache_clear()
+    normaliser_dates([
+        {"datetime_iso": None, "datetime_raw": "tomorrow 3pm"},
+        {"datetime_iso": None, "datetime_raw": "tomorrow 3pm"},
+        {"datetime_iso": None, "datetime_raw": None},
+    ])
+
+    info = agent_extract._parser_a_la_date.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
+def test_date_only_expressions_are_memoized_for_the_whole_day():
+    import agent_extract
+
+    agent_extract._parser_a_la_date.cache_clear()
+    agent_extract._parser_relatif.cache_clear()
+    matin, soir = datetime(2025, 11, 26, 9, 0), datetime(2025, 11, 26, 18, 41)
+
+    assert agent_extract._parser_expression("tomorrow 3pm", matin) == "2025-11-27T15:00:00"
+    assert agent_extract._parser_expression("tomorrow 3pm", soir) == "2025-11-27T15:00:00"
+    assert agent_extract._parser_relatif.cache_info().currsize == 0
+
+    # Relative à l'heure : résultat propre à chaque minute
+    assert agent_extract._parser_expression("in 2 hours", matin) == "2025-11-26T11:00:00"
+    assert agent_extract._parser_expression("in 2 hours", soir) == "2025-11-26T20:41:00"
@@ -0,0 +1,209 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import agent_task
+from agent_task import EaseTasksAgent
+
+
+class FakeBatch:
+    """Imite BatchHttpRequest : rejoue les appels ajoutés via le callback."""
+
+    def __init__(self, callback, fail=()):
+        self.callback = callback
+        self.fail = fail
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            body = request.body
+            if body.get("title") in self.fail:
+                self.callback(request_id, None, Exception("400 Bad Request"))
+            else:
+                self.callback(request_id, {"id": f"t{request_id}", **body}, None)
+
+
+@pytest.fixture
+def agent():
+    service = MagicMock()
+    service.tasks.return_value.insert.side_effect = lambda tasklist, body: MagicMock(body=body)
+    service.tasks.return_value.patch.side_effect = lambda tasklist, task, body: MagicMock(body=body, headers={})
+    service.batches = []
+
+    def new_batch(callback):
+        batch = FakeBatch(callback, fail={"Refusée"})
+        service.batches.append(batch)
+        return batch
+
+    service.new_batch_http_request.side_effect = new_batch
+    with patch("agent_task.get_tasks_service", return_value=service):
+        yield EaseTasksAgent()
+
+
+def test_create_tasks_single_batch(agent):
+    items = [{"text": f"Tâche {i}", "datetime_iso": None, "datetime_raw": None} for i in range(30)]
+
+    report = agent.create_tasks("liste", items)
+
+    assert report["created"] == 30
+    assert report["skipped"] == 0
+    assert len(agent.service.batches) == 1
+    assert [r["task"]["title"] for r in report["results"]] == [i["text"] for i in items]
+
+
+def test_create_tasks_writes_refs_in_notes(agent):
+    items = [{"text": "Pain", "datetime_raw": "demain"}, {"text": "Lait"}]
+
+    report = agent.create_tasks("liste", items, refs=["k1", "k2"])
+
+    notes = [r["task"]["notes"] for r in report["results"]]
+    assert notes == [f"demain\n{agent_task.TASK_REF_PREFIX}k1", f"{agent_task.TASK_REF_PREFIX}k2"]
+
+
+def test_create_tasks_chunks_at_batch_limit(agent):
+    items = [{"text": "x"} for _ in range(5)]
+
+    with patch.object(agent_task, "BATCH_LIMIT", 2):
+        report = agent.create_tasks("liste", items)
+
+    assert report["created"] == 5
+    assert [len(b.requests) for b in agent.service.batches] == [2, 2, 1]
+
+
+def test_create_tasks_reports_failures(agent):
+    items = [
+        {"text": "Ok", "datetime_iso": "2025-11-25T18:00:00", "datetime_raw": "demain 18h"},
+        {"text": "Refusée"},
+        {"text": "Date cassée", "datetime_iso": "pas une date"},
+    ]
+
+    report = agent.create_tasks("liste", items)
+
+    assert report["created"] == 1
+    assert report["skipped"] == 2
+    ok, refused, broken = report["results"]
+    assert ok["task"]["due"] == "2025-11-25T18:00:00Z"
+    assert ok["task"]["notes"] == "demain 18h"
+    assert "400" in refused["error"]
+    assert "date invalide" in broken["error"]
+
+
+def test_create_tasks_failed_chunk_does_not_abort_others(agent):
+    items = [{"text": f"Tâche {i}"} for i in range(5)]
+    executed = []
+    original = FakeBatch.execute
+
+    def execute(batch):
+        executed.append(batch)
+        if len(executed) == 2:
+            raise ConnectionError("batch perdu")
+        original(batch)
+
+    with patch.object(agent_task, "BATCH_LIMIT", 2), patch.object(FakeBatch, "execute", execute):
+        report = agent.create_tasks("liste", items)
+
+    assert report["created"] == 3
+    assert [("task" in r, r.get("error")) for r in report["results"]] == [
+        (True, None), (True, None), (False, "batch perdu"), (False, "batch perdu"), (True, None),
+    ]
+
+
+def test_create_tasks_missing_callback_is_an_error(agent):
+    with patch.object(FakeBatch, "execute", lambda batch: None):
+        report = agent.create_tasks("liste", [{"text": "x"}])
+
+    assert report["results"] == [{"title": "x", "error": "aucune réponse", "http_status": None}]
+
+
+def test_rfc3339_converts_aware_datetimes_to_utc():
+    due = datetime(2025, 11, 25, 19, 0, tzinfo=timezone.utc).astimezone()
+
+    assert agent_task._rfc3339(due) == "2025-11-25T19:00:00Z"
+
+
+def test_iter_tasks_follows_pages(agent):
+    agent.service.tasks.return_value.list.return_value.execute.side_effect = [
+        {"items": [{"id": "a"}], "nextPageToken": "p2"},
+        {"items": [{"id": "b"}]},
+    ]
+
+    tasks = agent.get_tasks("liste", fields="id,title,status")
+
+    assert [t["id"] for t in tasks] == ["a", "b"]
+    kwargs = agent.service.tasks.return_value.list.call_args.kwargs
+    assert kwargs["maxResults"] == agent_task.TASK_PAGE_SIZE
+    assert kwargs["fields"] == "nextPageToken,items(id,title,status)"
+
+
+def test_get_all_tasks_parallel_stable_order_and_isolated_errors(agent):
+    import threading
+    import time
+
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def get_tasks(tasklist_id, fields=None, **params):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02 if tasklist_id == "l0" else 0.005)
+        with lock:
+            in_flight -= 1
+        if tasklist_id == "l2":
+            raise RuntimeError("503 Backend Error")
+        return [{"id": f"{tasklist_id}-t"}]
+
+    tasklists = [{"id": f"l{i}", "title": f"Liste {i}"} for i in range(6)]
+    with patch.object(agent, "get_tasks", side_effect=get_tasks):
+        results = agent.get_all_tasks(tasklists, max_workers=3)
+
+    assert [r["tasklist"]["id"] for r in results] == [t["id"] for t in tasklists]
+    assert results[2]["tasks"] == [] and "503" in results[2]["error"]
+    assert results[0]["tasks"] == [{"id": "l0-t"}]
+    assert 1 < peak <= 3
+
+
+def test_complete_task_single_patch_with_etag(agent):
+    request = MagicMock(headers={})
+    tasks = agent.service.tasks.return_value
+    tasks.patch.side_effect = None
+    tasks.patch.return_value = request
+
+    agent.complete_task("liste", "t1", etag='"abc"')
+
+    tasks.get.assert_not_called()
+    tasks.update.assert_not_called()
+    assert tasks.patch.call_args.kwargs == {"tasklist": "liste", "task": "t1", "body": {"status": "completed"}}
+    assert request.headers == {"If-Match": '"abc"'}
+    request.execute.assert_called_once()
+
+
+def test_update_task_sends_only_changed_fields(agent):
+    agent.update_task("liste", "t1", title="Nouveau titre")
+
+    assert agent.service.tasks.return_value.patch.call_args.kwargs["body"] == {"title": "Nouveau titre"}
+
+
+def test_bulk_set_status_one_batch(agent):
+    refs = [{"list_id": "liste", "task_id": f"t{i}"} for i in range(10)]
+    refs[3]["etag"] = '"v2"'
+
+    report = agent.bulk_set_status(refs, "needsAction")
+
+    assert report["updated"] == 10
+    assert len(agent.service.batches) == 1
+    _, request = agent.service.batches[0].requests[3]
+    assert request.body == {"status": "needsAction", "completed": None}
+    assert request.headers == {"If-Match": '"v2"'}
+    assert [r["task_id"] for r in report["results"]] == [r["task_id"] for r in refs]
+
+
+def test_bulk_set_status_rejects_unknown_status(agent):
+    with pytest.raises(ValueError):
+        agent.bulk_set_status([], "done")
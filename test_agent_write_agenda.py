@@ -1,16 +1,22 @@
-import json
-import os
 import pytest
 from unittest.mock import MagicMock, patch
 
-from agent_write_agenda import create_events_from_json, INPUT_FILE
+from agent_write_agenda import create_events_from_json
+from storage import Storage
 
 
 # ------------------------------------------------------------
-# FIXTURE : crée un fichier JSON temporaire pour les tests
+# FIXTURE : base SQLite temporaire pour les tests
 # ------------------------------------------------------------
 @pytest.fixture
-def agenda_json(tmp_path):
+def store(tmp_path):
+    store = Storage(str(tmp_path / "test.db"))
+    with patch("agent_write_agenda.get_item_store", return_value=store):
+        yield store
+
+
+@pytest.fixture
+def agenda_json(store):
     data = [
         {
             "category": "agenda",
@@ -24,13 +30,9 @@ def agenda_json(tmp_path):
         }
     ]
 
-    json_path = tmp_path / "extracted_items.json"
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-    # Patch INPUT_FILE vers notre fichier temporaire
-    with patch("agent_write_agenda.INPUT_FILE", str(json_path)):
-        yield
+    store.add_items(data)
+    # Les items d'une autre catégorie ne sont pas lus
+    store.add_items([{"category": "to_do", "text": "Acheter du pain"}])
 
 
 # ------------------------------------------------------------
@@ -75,3 +77,88 @@ def test_event_conflict(mock_auth, agenda_json):
 
     assert result["created"] == 0
     assert result["skipped"] == 2  # 1 conflit + 1 sans date
+
+
+# ------------------------------------------------------------
+# TEST : plusieurs événements → une lecture, un batch
+# ------------------------------------------------------------
+@pytest.fixture
+def write_items(store):
+    def _write(items):
+        store.add_items(items)
+        return patch("agent_write_agenda.get_item_store", return_value=store)
+    return _write
+
+
+def _batch_service(existing=()):
+    service = MagicMock()
+    service.events.return_value.list.return_value.execute.return_value = {"items": list(existing)}
+    service.events.return_value.insert.side_effect = lambda calendarId, body: MagicMock(body=body)
+    service.batches = []
+
+    def new_batch(callback):
+        batch = MagicMock()
+        batch.requests = []
+        batch.add.side_effect = lambda request, request_id: batch.requests.append((request_id, request))
+        batch.execute.side_effect = lambda: [callback(rid, req.body, None) for rid, req in batch.requests]
+        service.batches.append(batch)
+        return batch
+
+    service.new_batch_http_request.side_effect = new_batch
+    return service
+
+
+@patch("agent_write_agenda.authenticate_google_calendar")
+def test_single_list_and_batch_insert(mock_auth, write_items):
+    items = [
+        {"category": "agenda", "text": f"Réunion {h}h", "datetime_iso": f"2025-03-0{d}T{h:02d}:00:00"}
+        for d, h in [(3, 9), (4, 10), (5, 11)]
+    ]
+    service = _batch_service()
+    mock_auth.return_value = service
+
+    with write_items(items):
+        result = create_events_from_json()
+
+    assert result == {"created": 3, "skipped": 0}
+    assert service.events.return_value.list.call_count == 1
+    assert len(service.batches) == 1
+    assert len(service.batches[0].requests) == 3
+
+
+@patch("agent_write_agenda.authenticate_google_calendar")
+def test_conflicts_resolved_locally(mock_auth, write_items):
+    existing = [{
+        "summary": "Dentiste",
+        "start": {"dateTime": "2025-03-03T10:00:00+00:00"},
+        "end": {"dateTime": "2025-03-03T11:00:00+00:00"},
+    }]
+    items = [
+        {"category": "agenda", "text": "Café", "datetime_iso": "2025-03-03T10:30:00+00:00"},   # chevauche le dentiste
+        {"category": "agenda", "text": "Sport", "datetime_iso": "2025-03-03T12:00:00+00:00"},
+        {"category": "agenda", "text": "Appel", "datetime_iso": "2025-03-03T12:30:00+00:00"},  # chevauche Sport (même lot)
+        {"category": "agenda", "text": "Lecture", "datetime_iso": "2025-03-03T14:00:00+00:00"},
+    ]
+    service = _batch_service(existing)
+    mock_auth.return_value = service
+
+    with write_items(items):
+        result = create_events_from_json()
+
+    assert result == {"created": 2, "skipped": 2}
+    inserted = [req.body["summary"] for _, req in service.batches[0].requests]
+    assert inserted == ["Sport", "Lecture"]
+
+
+def test_interval_index_overlap():
+    from datetime import datetime, timedelta
+    from agent_write_agenda import IntervalIndex
+
+    t0 = datetime(2025, 3, 3, 8)
+    index = IntervalIndex()
+    index.add(t0, t0 + timedelta(hours=8), "Journée")
+    index.add(t0 + timedelta(hours=10), t0 + timedelta(hours=11), "Soirée")
+
+    assert index.overlap(t0 + timedelta(hours=7), t0 + timedelta(hours=9))[2] == "Journée"
+    assert index.overlap(t0 + timedelta(hours=8), t0 + timedelta(hours=10)) is None
+    assert index.overlap(t0 + timedelta(hours=10, minutes=30), t0 + timedelta(hours=12))[2] == "Soirée"
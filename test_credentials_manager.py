@@ -0,0 +1,122 @@
+import datetime
+import json
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import credentials_manager
+from credentials_manager import CredentialManager
+
+
+class FakeCreds:
+    def __init__(self, token="t0", expires_in=3600):
+        self.token = token
+        self.refresh_token = "r"
+        self.expiry = credentials_manager._utcnow() + datetime.timedelta(seconds=expires_in)
+
+    @property
+    def valid(self):
+        return self.expiry > credentials_manager._utcnow()
+
+    def to_json(self):
+        return json.dumps({"token": self.token, "expiry": self.expiry.isoformat()})
+
+
+def _refresh(calls, delay=0.0):
+    def refresh(creds):
+        calls.append(creds.token)
+        time.sleep(delay)
+        creds.token = f"t{len(calls)}"
+        creds.expiry = credentials_manager._utcnow() + datetime.timedelta(hours=1)
+    return refresh
+
+
+@pytest.fixture
+def token_file(tmp_path):
+    path = tmp_path / "token.json"
+    path.write_text("{}")
+    return str(path)
+
+
+def _manager(token_file, creds, calls, delay=0.0):
+    manager = CredentialManager(token_file, ["scope"])
+    patch.object(manager, "_read_token", return_value=creds).start()
+    patch.object(manager, "_refresh_creds", side_effect=_refresh(calls, delay)).start()
+    return manager
+
+
+@pytest.fixture(autouse=True)
+def stop_patches():
+    yield
+    patch.stopall()
+
+
+def test_valid_token_loaded_without_rewrite(token_file):
+    calls = []
+    manager = _manager(token_file, FakeCreds(), calls)
+    mtime = os.path.getmtime(token_file)
+
+    creds = manager.get()
+    manager.stop()
+
+    assert creds.token == "t0"
+    assert calls == []
+    assert os.path.getmtime(token_file) == mtime
+    assert open(token_file).read() == "{}"
+
+
+def test_expired_token_refreshed_and_written_atomically(token_file):
+    calls = []
+    manager = _manager(token_file, FakeCreds(expires_in=-10), calls)
+
+    creds = manager.get()
+    manager.stop()
+
+    assert calls == ["t0"]
+    assert json.loads(open(token_file).read())["token"] == creds.token == "t1"
+    assert [f for f in os.listdir(os.path.dirname(token_file)) if f.endswith(".tmp")] == []
+
+
+def test_concurrent_refreshes_coalesced(token_file):
+    calls = []
+    manager = _manager(token_file, FakeCreds(expires_in=60), calls, delay=0.05)
+    manager.get()
+
+    threads = [threading.Thread(target=manager.refresh) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    manager.stop()
+
+    assert len(calls) == 1
+
+
+def test_proactive_refresh_before_expiry(token_file):
+    calls = []
+    margin = credentials_manager.REFRESH_MARGIN.total_seconds()
+    manager = _manager(token_file, FakeCreds(expires_in=margin + 0.05), calls)
+
+    manager.get()
+    deadline = time.time() + 2
+    while not calls and time.time() < deadline:
+        time.sleep(0.01)
+    manager.stop()
+
+    assert calls == ["t0"]
+    assert manager.creds.token == "t1"
+
+
+def test_sync_from_disk_ignores_own_writes(token_file):
+    calls = []
+    manager = _manager(token_file, FakeCreds(expires_in=-10), calls)
+    manager.get()
+    assert manager.sync_from_disk() is False
+
+    stat = os.stat(token_file)
+    os.utime(token_file, (stat.st_atime, stat.st_mtime + 10))
+    assert manager.sync_from_disk() is True
+    manager.stop()
@@ -0,0 +1,137 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import google_services
+from google_services import get_service, invalidate_services
+
+SCOPES = ["https://www.googleapis.com/auth/tasks"]
+
+
+@pytest.fixture
+def token(tmp_path):
+    path = tmp_path / "token.json"
+    path.write_text("{}")
+    invalidate_services()
+    manager = MagicMock()
+    manager.sync_from_disk.return_value = False
+    with patch("google_services.get_manager", return_value=manager), \
+            patch("google_services.build_service", side_effect=lambda *a: MagicMock()) as build:
+        yield str(path), manager, build
+    invalidate_services()
+
+
+def test_service_built_once(token):
+    path, manager, build = token
+
+    first = get_service("tasks", "v1", path, SCOPES)
+    second = get_service("tasks", "v1", path, list(reversed(SCOPES)))
+
+    assert first is second
+    assert build.call_count == 1
+
+
+def test_distinct_credential_sets_get_distinct_services(token):
+    path, _, build = token
+
+    tasks = get_service("tasks", "v1", path, SCOPES)
+    calendar = get_service("calendar", "v3", path, ["https://www.googleapis.com/auth/calendar"])
+
+    assert tasks is not calendar
+    assert build.call_count == 2
+
+
+def test_token_change_rebuilds_service(token):
+    path, manager, build = token
+
+    first = get_service("tasks", "v1", path, SCOPES)
+    # Jeton remplacé par un autre processus, ou nouvelle autorisation interactive
+    manager.get.return_value = MagicMock()
+
+    assert get_service("tasks", "v1", path, SCOPES) is not first
+    assert build.call_count == 2
+
+
+def test_slow_credentials_do_not_block_other_services(token):
+    path, manager, _ = token
+    get_service("tasks", "v1", path, SCOPES)
+    refreshing, release = threading.Event(), threading.Event()
+    slow = MagicMock()
+    slow.get.side_effect = lambda: refreshing.set() or release.wait(5) and MagicMock()
+
+    with patch("google_services.get_manager", return_value=slow):
+        other = threading.Thread(target=get_service, args=("calendar", "v3", path, SCOPES))
+        other.start()
+        assert refreshing.wait(2)
+
+    # Rafraîchissement en cours pour le calendrier : Tasks reste servi
+    served = []
+    tasks = threading.Thread(target=lambda: served.append(get_service("tasks", "v1", path, SCOPES)))
+    tasks.start()
+    tasks.join(1)
+    blocked = tasks.is_alive()
+    release.set()
+    other.join()
+    tasks.join()
+    assert not blocked
+    assert served[0] is not None
+
+
+def test_invalidate_services(token):
+    path, _, build = token
+
+    first = get_service("tasks", "v1", path, SCOPES)
+    invalidate_services(path)
+
+    assert get_service("tasks", "v1", path, SCOPES) is not first
+
+
+def test_missing_credentials_not_cached(token):
+    path, manager, _ = token
+    manager.get.return_value = None
+
+    assert get_service("tasks", "v1", path, SCOPES) is None
+    assert get_service("tasks", "v1", path, SCOPES) is None
+    assert manager.get.call_count == 2
+
+
+def test_concurrent_first_calls_build_once(token):
+    path, _, build = token
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(get_service("tasks", "v1", path, SCOPES)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert build.call_count == 1
+    assert len({id(r) for r in results}) == 1
+
+
+def test_build_service_uses_static_discovery():
+    with patch("googleapiclient.discovery.build") as mock_build:
+        google_services.build_service("tasks", "v1", MagicMock())
+
+    kwargs = mock_build.call_args.kwargs
+    assert kwargs["static_discovery"] is True
+    assert kwargs["cache_discovery"] is False
+    assert kwargs["requestBuilder"] is not None
+
+
+def test_iter_items_pages_lazily_with_fields_mask():
+    pages = [{"items": [{"id": 1}, {"id": 2}], "nextPageToken": "p2"}, {"items": [{"id": 3}]}]
+    method = MagicMock()
+    method.return_value.execute.side_effect = pages
+
+    items = google_services.iter_items(method, fields="id,title", tasklist="l", maxResults=2)
+    assert next(items) == {"id": 1}
+    assert method.call_count == 1
+
+    assert [i["id"] for i in items] == [2, 3]
+    first, second = (c.kwargs for c in method.call_args_list)
+    assert first["fields"] == "nextPageToken,items(id,title)"
+    assert "pageToken" not in first
+    assert second["pageToken"] == "p2"
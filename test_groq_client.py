@@ -0,0 +1,139 @@
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import groq_client
+from groq_client import get_session, post_chat, post_transcription
+
+
+def test_session_is_shared():
+    assert get_session() is get_session()
+
+
+def test_post_chat_uses_pool_and_timeout():
+    mock_response = MagicMock(status_code=200)
+
+    with patch("requests.Session.post", return_value=mock_response) as mock_post:
+        response = post_chat({"model": "m", "messages": []}, api_key="cle")
+
+    assert response is mock_response
+    args, kwargs = mock_post.call_args
+    assert args[0] == groq_client.GROQ_CHAT_URL
+    assert kwargs["timeout"] == groq_client.CHAT_TIMEOUT
+    assert kwargs["headers"]["Authorization"] == "Bearer cle"
+
+
+def test_post_transcription_timeout():
+    with patch("requests.Session.post", return_value=MagicMock(status_code=200)) as mock_post:
+        post_transcription({"file": ("audio.wav", b"")}, api_key="cle")
+
+    args, kwargs = mock_post.call_args
+    assert args[0] == groq_client.GROQ_TRANSCRIPTION_URL
+    assert kwargs["timeout"] == groq_client.TRANSCRIPTION_TIMEOUT
+
+
+def test_configure_rebuilds_session():
+    before = get_session()
+    groq_client.configure(pool_size=4)
+    after = get_session()
+
+    assert after is not before
+    assert after.get_adapter("https://api.groq.com")._pool_maxsize == 4
+
+
+def test_stream_chat_yields_deltas():
+    lines = [
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        b"",
+        'data: {"choices": [{"delta": {"content": "Très"}}]}'.encode("utf-8"),
+        b'data: {"choices": [{"delta": {"content": " bien"}}]}',
+        b"data: [DONE]",
+    ]
+    mock_response = MagicMock(status_code=200)
+    mock_response.__enter__.return_value = mock_response
+    mock_response.iter_lines.return_value = iter(lines)
+
+    with patch("requests.Session.post", return_value=mock_response) as mock_post:
+        deltas = list(groq_client.stream_chat({"model": "m", "messages": []}))
+
+    assert deltas == ["Très", " bien"]
+    assert mock_post.call_args.kwargs["json"]["stream"] is True
+    assert mock_post.call_args.kwargs["stream"] is True
+
+
+def _response(status, headers=None):
+    response = MagicMock(status_code=status)
+    response.headers = headers or {}
+    return response
+
+
+def test_parse_duration_formats():
+    assert groq_client.parse_duration("2") == 2.0
+    assert groq_client.parse_duration("7.66s") == pytest.approx(7.66)
+    assert groq_client.parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert groq_client.parse_duration("120ms") == pytest.approx(0.12)
+    assert groq_client.parse_duration("n'importe quoi") is None
+
+
+def test_retry_after_429_then_success():
+    responses = [_response(429, {"retry-after": "3"}), _response(200)]
+
+    with patch("requests.Session.post", side_effect=responses) as mock_post, \
+            patch("groq_client.time.sleep") as mock_sleep:
+        response = post_chat({"model": "m", "messages": []}, api_key="cle")
+
+    assert response.status_code == 200
+    assert mock_post.call_count == 2
+    delay = mock_sleep.call_args.args[0]
+    assert 3 <= delay <= 3 + groq_client.BACKOFF_BASE
+
+
+def test_rate_limit_reset_header_used_for_429():
+    response = _response(429, {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "7.5s"})
+    assert 7.5 <= groq_client._retry_delay(response, 0) <= 7.5 + groq_client.BACKOFF_BASE
+
+
+def test_retries_exhausted_returns_last_response():
+    with patch("requests.Session.post", return_value=_response(503)) as mock_post, \
+            patch("groq_client.time.sleep"):
+        response = post_chat({"model": "m", "messages": []}, api_key="cle")
+
+    assert response.status_code == 503
+    assert mock_post.call_count == groq_client.MAX_RETRIES + 1
+
+
+def test_transcription_retry_rewinds_file():
+    audio = io.BytesIO(b"RIFF....")
+    audio.read()
+    responses = [_response(500), _response(200)]
+
+    with patch("requests.Session.post", side_effect=responses), patch("groq_client.time.sleep"):
+        post_transcription({"file": ("audio.wav", audio)}, api_key="cle")
+
+    assert audio.tell() == 0
+
+
+def test_adaptive_limiter_aimd():
+    limiter = groq_client.AdaptiveLimiter(initial=8, minimum=1, maximum=10, cooldown=0)
+
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.9 < limiter.limit < 5.1
+
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.limit == 1
+
+
+def test_api_key_loads_dotenv_only_when_missing(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "env-key")
+    with patch("groq_client.load_env") as load_env:
+        assert groq_client.get_api_key() == "env-key"
+    load_env.assert_not_called()
+
+    monkeypatch.delenv("GROQ_API_KEY")
+    with patch("groq_client.load_env", side_effect=lambda: monkeypatch.setenv("GROQ_API_KEY", "dotenv-key")):
+        assert groq_client.get_api_key() == "dotenv-key"
@@ -0,0 +1,82 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Budget d'import à froid (µs cumulées, mesurées par ``python -X importtime``).
+# Mesure d'horloge : sensible à la charge de la machine, donc seulement sur demande
+IMPORT_BUDGET_MS = os.getenv("IMPORT_BUDGET_MS")
+
+# Modules que le premier affichage ne doit jamais charger
+HEAVY_MODULES = ["googleapiclient", "google_auth_oauthlib", "dateparser", "dotenv", "requests"]
+
+APP_MODULES = [
+    "agent_extract",
+    "agenda_agent",
+    "agent_task",
+    "agent_write_agenda",
+    "agent_notes",
+    "get_tasks_service",
+    "rule_extract",
+    "smart_suggest",
+]
+
+
+def _run(code):
+    return subprocess.run(
+        [sys.executable, *code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
+
+
+def _importtime(module):
+    timings = {}
+    for line in _run(["-X", "importtime", "-c", f"import {module}"]).stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            timings[match.group(4)] = int(match.group(2))
+    return timings
+
+
+@pytest.mark.parametrize("module", APP_MODULES)
+def test_no_heavy_import_at_startup(module):
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    loaded = _run(["-c", code]).stdout.split()
+
+    assert [name for name in loaded if name.split(".")[0] in HEAVY_MODULES] == []
+
+
+@pytest.mark.parametrize("module", ["rule_extract", "agent_extract"])
+def test_fast_path_does_not_load_google_or_storage(module):
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    loaded = set(_run(["-c", code]).stdout.split())
+
+    assert loaded & {"agent_write_agenda", "google_services", "storage"} == set()
+
+
+@pytest.mark.skipif(not IMPORT_BUDGET_MS, reason="IMPORT_BUDGET_MS non défini")
+@pytest.mark.parametrize("module", APP_MODULES)
+def test_import_time_budget(module):
+    timings = _importtime(module)
+
+    assert timings[module] < int(IMPORT_BUDGET_MS) * 1000
+
+
+def test_prompts_loaded_lazily():
+    code = (
+        "import builtins, agent_extract, smart_suggest\n"
+        "opened = []\n"
+        "real_open = builtins.open\n"
+        "builtins.open = lambda *a, **k: opened.append(a[0]) or real_open(*a, **k)\n"
+        "agent_extract.get_prompts(); smart_suggest.get_prompts()\n"
+        "agent_extract.SYSTEM_PROMPT\n"
+        "print(len(opened))\n"
+    )
+    result = _run(["-c", code])
+    # Lus au premier accès (2 fichiers par module), puis mis en cache
+    assert result.stdout.strip() == "4"
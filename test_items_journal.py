@@ -0,0 +1,117 @@
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from items_journal import ItemsJournal
+
+PAIN = {"category": "to_do", "text": "Pain"}
+DENTISTE = {"category": "agenda", "text": "Dentiste", "datetime_iso": "2025-03-10T10:00:00"}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return ItemsJournal(str(tmp_path / "items.jsonl"), compact_min=4)
+
+
+def _lines(journal):
+    with open(journal.path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_add_appends_one_fsynced_write(journal):
+    journal.add_items([PAIN])
+    with patch("items_journal.os.write", wraps=os.write) as write, \
+            patch("items_journal.os.fsync") as fsync:
+        assert journal.add_items([DENTISTE, PAIN]) == 2
+
+    assert write.call_count == 1 and fsync.call_count == 1
+    assert [r["item"] for r in _lines(journal)] == [PAIN, DENTISTE, PAIN]
+    assert journal.list_items(category="agenda") == [DENTISTE]
+
+
+def test_clear_appends_record_and_other_instances_catch_up(journal):
+    journal.add_items([PAIN, DENTISTE])
+    other = ItemsJournal(journal.path)
+    assert other.list_items() == [PAIN, DENTISTE]
+
+    assert journal.clear_items(category="agenda") == 1
+
+    assert _lines(journal)[-1] == {"op": "clear", "category": "agenda"}
+    assert other.list_items() == [PAIN]
+
+
+def test_known_external_ids_are_skipped(journal):
+    task = {"category": "to_do", "text": "Pain", "external_id": "g1"}
+    assert journal.add_items([task, task]) == 1
+    assert journal.add_items([task]) == 0
+
+
+def test_read_since_tails_new_records(journal):
+    journal.add_items([PAIN])
+    _, offset = journal.read_since(0)
+
+    journal.add_items([DENTISTE])
+
+    records, _ = journal.read_since(offset)
+    assert records == [{"op": "add", "item": DENTISTE}]
+
+
+def test_compaction_folds_cleared_records(journal):
+    journal.add_items([PAIN, DENTISTE])
+    journal.clear_items()
+    # 3 enregistrements morts (2 items + 1 clear) : sous le seuil de 4
+    assert len(_lines(journal)) == 3
+
+    journal.add_items([PAIN, DENTISTE])
+    journal.clear_items()
+    journal.add_items([PAIN])
+
+    assert _lines(journal) == [{"op": "add", "item": PAIN}]
+    reader = ItemsJournal(journal.path)
+    assert reader.list_items() == [PAIN]
+
+
+def test_journal_size_stays_bounded(journal):
+    for cycle in range(200):
+        journal.add_items([dict(PAIN, text=f"Pain {cycle}"), DENTISTE])
+        journal.clear_items(category="agenda" if cycle % 2 else None)
+
+    # État courant : au plus un item ; fichier borné par le seuil, pas par l'historique
+    assert len(journal.list_items()) <= 1
+    assert len(_lines(journal)) <= 2 * journal.compact_min + 2
+
+
+def test_add_compacts_after_clears_by_other_instance(journal):
+    other = ItemsJournal(journal.path, compact_min=1000)
+    for _ in range(3):
+        other.add_items([PAIN, DENTISTE])
+        other.clear_items()
+
+    journal.add_items([PAIN])
+
+    assert _lines(journal) == [{"op": "add", "item": PAIN}]
+    assert other.list_items() == [PAIN]
+
+
+def test_other_instance_sees_compacted_file(journal):
+    reader = ItemsJournal(journal.path)
+    journal.add_items([PAIN, DENTISTE])
+    assert len(reader.list_items()) == 2
+
+    journal.clear_items(category="agenda")
+    journal.compact()
+
+    assert reader.list_items() == [PAIN]
+
+
+def test_truncated_last_line_is_ignored(journal):
+    journal.add_items([PAIN])
+    with open(journal.path, "ab") as f:
+        f.write(b'{"op": "add", "item": {"text": "coup')  # écriture interrompue
+
+    reader = ItemsJournal(journal.path)
+    assert reader.list_items() == [PAIN]
+    reader.add_items([DENTISTE])
+    assert ItemsJournal(journal.path).list_items() == [PAIN, DENTISTE]
@@ -0,0 +1,85 @@
+import pytest
+
+from agent_extract import extraire_message_et_items
+from json_locator import JsonScanner, find_json, loads_lenient, parse_lenient, strip_code_fences
+
+
+def test_message_then_array():
+    match = find_json('Ok, c\'est noté.\n[{"category": "note", "text": "a"}]')
+    assert match.value == [{"category": "note", "text": "a"}]
+    assert not match.repaired
+
+
+def test_stray_brackets_in_prose_are_skipped():
+    texte = 'Voici [mes notes] :\n[{"category": "to_do", "text": "Acheter [du] pain"}]'
+    message, items = extraire_message_et_items(texte)
+
+    assert message == "Voici [mes notes] :"
+    assert items[0]["text"] == "Acheter [du] pain"
+
+
+def test_unclosed_stray_bracket():
+    match = find_json('Liste [ à compléter :\n[{"a": 1}, {"b": 2}]', types=(list,))
+    assert match.value == [{"a": 1}, {"b": 2}]
+
+
+def test_escaped_quotes_in_strings():
+    match = find_json(r'[{"text": "il a dit \"]\" puis {"}]')
+    assert match.value == [{"text": 'il a dit "]" puis {'}]
+
+
+def test_truncated_array_keeps_complete_items():
+    texte = 'Ok.\n[{"category": "to_do", "text": "A"}, {"category": "note", "text": "B"}, {"category": "to_do", "te'
+    message, items = extraire_message_et_items(texte)
+
+    assert message == "Ok."
+    assert [it["text"] for it in items] == ["A", "B"]
+
+
+def test_truncated_nested_object():
+    texte = '```json\n{"evenements": [{"titre": "A"}, {"titre": "B"}, {"tit'
+    assert loads_lenient(texte) == {"evenements": [{"titre": "A"}, {"titre": "B"}]}
+
+
+def test_code_fences_are_stripped():
+    assert strip_code_fences('```json\n{"a": 1}\n```').strip() == '{"a": 1}'
+    assert loads_lenient('```json\n{"a": 1}\n```') == {"a": 1}
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        loads_lenient("Aucun élément.")
+    with pytest.raises(ValueError):
+        extraire_message_et_items("Aucun élément.")
+
+
+def test_incremental_feed_matches_one_shot():
+    texte = 'Salut !\n[{"category": "to_do", "text": "x"}]'
+    scanner = JsonScanner()
+    found = []
+    for c in texte:
+        found.extend(scanner.feed(c))
+
+    assert len(found) == 1
+    assert found[0] == find_json(texte)
+
+
+def test_stray_bracket_and_quote_before_payload():
+    texte = 'Voici [la liste "courses :\n[{"category": "to_do", "text": "Pain"}]'
+    message, items = extraire_message_et_items(texte)
+
+    assert message == 'Voici [la liste "courses :'
+    assert items == [{"category": "to_do", "text": "Pain"}]
+
+
+def test_truncated_first_item_is_not_an_empty_success():
+    with pytest.raises(ValueError):
+        extraire_message_et_items('Ok.\n[{"category": "to_do", "te')
+    with pytest.raises(ValueError):
+        loads_lenient('{"evenements": [{"tit')
+
+
+def test_parse_lenient_reports_repair():
+    assert parse_lenient('[{"a": 1}]').repaired is False
+    match = parse_lenient('[{"a": 1}, {"b"')
+    assert match.repaired and match.value == [{"a": 1}]
@@ -0,0 +1,87 @@
+import json
+import multiprocessing
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import json_store
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "data.json")
+
+
+def test_write_then_read_roundtrip(path):
+    assert json_store.read_json(path, []) == []
+
+    assert json_store.write_json(path, {"a": [1, 2]}) == 1
+    assert json_store.write_json(path, {"a": [3]}) == 2
+
+    assert json_store.read_json(path) == {"a": [3]}
+    assert json_store.version(path) == 2
+
+
+def test_crash_during_dump_keeps_previous_file(path):
+    json_store.write_json(path, {"ok": True})
+
+    with patch("json_store.json.dump", side_effect=RuntimeError("crash")):
+        with pytest.raises(RuntimeError):
+            json_store.write_json(path, {"ok": False})
+
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"ok": True}
+    assert json_store.version(path) == 1
+    assert [p for p in os.listdir(os.path.dirname(path)) if p.endswith(".tmp")] == []
+
+
+def test_unchanged_version_skips_reparse(path):
+    json_store.write_json(path, {"n": 1})
+    first = json_store.read_json(path)
+    first["n"] = 99  # copie : le cache n'est pas modifié
+
+    with patch("json_store.json.load") as load:
+        assert json_store.read_json(path) == {"n": 1}
+    load.assert_not_called()
+
+
+def test_other_writer_invalidates_cache(path):
+    json_store.write_json(path, {"n": 1})
+    json_store.write_json(path, {"n": 2})
+    # Ce processus n'a vu que la version 1 : la 2 vient d'un autre processus
+    json_store._cache[os.path.abspath(path)] = (1, {"n": 1})
+
+    assert json_store.read_json(path) == {"n": 2}
+
+
+def test_nonblocking_lock_is_refused_while_held(path):
+    with json_store.file_lock(path, exclusive=True):
+        with pytest.raises(BlockingIOError):
+            with json_store.file_lock(path, exclusive=True, blocking=False):
+                pass
+        with pytest.raises(BlockingIOError):
+            with json_store.file_lock(path, blocking=False):
+                pass
+
+    with json_store.file_lock(path), json_store.file_lock(path, blocking=False):
+        pass  # deux lecteurs cohabitent
+
+
+def _increment(path, count):
+    for _ in range(count):
+        json_store.update_json(path, lambda n: (n or 0) + 1, 0)
+
+
+def test_update_json_serializes_processes_and_threads(path):
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_increment, args=(path, 20)) for _ in range(3)]
+    threads = [threading.Thread(target=_increment, args=(path, 20)) for _ in range(3)]
+    for worker in processes + threads:
+        worker.start()
+    for worker in processes + threads:
+        worker.join()
+
+    assert json_store.read_json(path) == 120
+    assert json_store.version(path) == 120
@@ -0,0 +1,83 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import llm_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    with patch("llm_cache.CACHE_DIR", str(tmp_path)), patch("llm_cache._estimate", None):
+        yield tmp_path
+
+
+def test_key_depends_on_every_field():
+    base = llm_cache.make_key("m", 0.0, "sys", "user", "2025-11-27")
+    assert base == llm_cache.make_key("m", 0.0, "sys", "user", "2025-11-27")
+    assert base != llm_cache.make_key("m2", 0.0, "sys", "user", "2025-11-27")
+    assert base != llm_cache.make_key("m", 0.0, "sys", "user", "2025-11-28")
+    assert base != llm_cache.make_key("m", 0.0, "sys", "autre", "2025-11-27")
+
+
+def test_should_cache_only_deterministic_calls():
+    assert llm_cache.should_cache(0.0)
+    assert not llm_cache.should_cache(0.7)
+    assert llm_cache.should_cache(0.7, allow_nonzero=True)
+
+
+def test_put_then_get(cache_dir):
+    llm_cache.put("abc", "réponse")
+    assert llm_cache.get("abc") == "réponse"
+    assert llm_cache.get("inconnu") is None
+
+
+def test_ttl_expiry(cache_dir):
+    llm_cache.put("abc", "réponse")
+    with patch("llm_cache.CACHE_TTL", 0):
+        time.sleep(0.01)
+        assert llm_cache.get("abc") is None
+    assert not os.path.exists(cache_dir / "abc.json")
+
+
+def test_lru_eviction(cache_dir):
+    with patch("llm_cache.CACHE_MAX_ENTRIES", 2):
+        llm_cache.put("a", "1")
+        os.utime(cache_dir / "a.json", (1, 1))
+        llm_cache.put("b", "2")
+        os.utime(cache_dir / "b.json", (2, 2))
+        llm_cache.get("a")  # "a" redevient le plus récent
+        llm_cache.put("c", "3")
+
+    assert llm_cache.get("a") == "1"
+    assert llm_cache.get("b") is None
+    assert llm_cache.get("c") == "3"
+
+
+def test_non_object_entry_is_a_miss(cache_dir):
+    for key, raw in (("liste", "[1, 2]"), ("chaine", '"texte"')):
+        (cache_dir / f"{key}.json").write_text(raw, encoding="utf-8")
+        assert llm_cache.get(key) is None
+        assert not os.path.exists(cache_dir / f"{key}.json")
+
+
+def test_eviction_scan_is_throttled(cache_dir):
+    with patch("llm_cache.os.scandir", wraps=os.scandir) as scandir:
+        for i in range(50):
+            llm_cache.put(f"k{i}", "x")
+    # Un parcours initial, puis l'estimation suffit tant que la limite est loin
+    assert scandir.call_count == 1
+
+
+def test_appeler_groq_hits_cache(cache_dir):
+    from agent_extract import appeler_groq
+
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"choices": [{"message": {"content": "Ok\n[]"}}]}
+
+    with patch("requests.Session.post", return_value=response) as mock_post:
+        assert appeler_groq("Acheter du pain") == "Ok\n[]"
+        assert appeler_groq("Acheter du pain") == "Ok\n[]"
+
+    assert mock_post.call_count == 1
@@ -0,0 +1,53 @@
+import pytest
+
+import model_router
+from model_router import FAST_MODEL, STRONG_MODEL, route
+
+
+def _strict(content):
+    if content != "ok":
+        raise ValueError("sortie invalide")
+
+
+def test_simple_input_stays_on_fast_model():
+    calls = []
+    content, model = route(lambda m: calls.append(m) or "ok", validate=_strict, text="Acheter du pain")
+
+    assert (content, model) == ("ok", FAST_MODEL)
+    assert calls == [FAST_MODEL]
+    assert model_router.derniers_appels(1)[0]["escalation_reason"] is None
+
+
+def test_invalid_output_escalates():
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        return "ok" if model == STRONG_MODEL else "pas du json"
+
+    content, model = route(call, validate=_strict, text="Acheter du pain", label="test")
+
+    assert (content, model) == ("ok", STRONG_MODEL)
+    assert calls == [FAST_MODEL, STRONG_MODEL]
+    record = model_router.derniers_appels(1)[0]
+    assert record["label"] == "test"
+    assert record["escalation_reason"].startswith("invalid_output")
+    assert record["latency_ms"] >= 0
+
+
+def test_complex_input_goes_straight_to_strong_model():
+    calls = []
+    long_text = "Réunion. " * 200
+    _, model = route(lambda m: calls.append(m) or "ok", validate=_strict, text=long_text)
+
+    assert model == STRONG_MODEL
+    assert calls == [STRONG_MODEL]
+    assert model_router.derniers_appels(1)[0]["escalation_reason"] == "complexity"
+
+
+def test_other_errors_are_not_escalated():
+    def call(model):
+        raise RuntimeError("Erreur API Groq 500")
+
+    with pytest.raises(RuntimeError):
+        route(call, validate=_strict, text="Acheter du pain")
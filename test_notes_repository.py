@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from agent_notes import EaseNotesAgent
+from notes_repository import NotesRepository
+from storage import Storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    return Storage(str(tmp_path / "test.db"))
+
+
+@pytest.fixture
+def repo(store):
+    return NotesRepository(store, flush_delay=60)
+
+
+def _note(note_id, **fields):
+    return {"id": note_id, "title": note_id.upper(), "text": "", "created_at": f"2025-01-0{len(note_id)}", **fields}
+
+
+def test_table_read_once_while_unchanged(repo, store):
+    store.add_notes([_note("a"), _note("b", pinned=True)])
+
+    with patch.object(store, "list_notes", wraps=store.list_notes) as list_notes:
+        assert [n["id"] for n in repo.all()] == ["a", "b"]
+        assert repo.get("b")["pinned"] is True
+        assert [n["id"] for n in repo.pinned()] == ["b"]
+        repo.update("a", archived=True)
+
+    assert list_notes.call_count == 1
+    assert [n["id"] for n in repo.archived()] == ["a"]
+
+
+def test_writes_are_batched_until_flush(repo, store):
+    repo.add(_note("a"))
+    repo.add(_note("bb"))
+    repo.update("a", text="modifié")
+    repo.delete("bb")
+
+    assert store.list_notes() == []
+    with patch.object(store, "save_notes", wraps=store.save_notes) as save:
+        repo.flush()
+    assert save.call_count == 1
+    assert [(n["id"], n["text"]) for n in store.list_notes()] == [("a", "modifié")]
+
+
+def test_debounced_flush(store):
+    repo = NotesRepository(store, flush_delay=0.01)
+    flushed = threading.Event()
+    original = repo.flush
+
+    def flush():
+        original()
+        flushed.set()
+
+    with patch.object(repo, "flush", side_effect=flush):
+        repo.add(_note("a"))
+        assert flushed.wait(2)
+    assert [n["id"] for n in store.list_notes()] == ["a"]
+
+
+def test_failed_background_flush_is_retried(store):
+    repo = NotesRepository(store, flush_delay=0.01)
+    original = store.save_notes
+    calls = []
+
+    def save_notes(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return original(**kwargs)
+
+    with patch.object(store, "save_notes", side_effect=save_notes):
+        repo.add(_note("a"))
+        deadline = time.time() + 2
+        while not store.list_notes() and time.time() < deadline:
+            time.sleep(0.01)
+        repo.flush()
+
+    assert [n["id"] for n in store.list_notes()] == ["a"]
+    assert len(calls) == 2
+    assert repo._failures == 0
+
+
+def test_external_change_reloads_and_keeps_pending_writes(repo, store):
+    repo.add(_note("a"))
+    repo.flush()
+    repo.update("a", text="local")
+
+    # Écriture d'un autre processus
+    store.add_notes([_note("zz")])
+
+    assert {n["id"] for n in repo.all()} == {"a", "zz"}
+    assert repo.get("a")["text"] == "local"
+
+
+def test_own_flush_does_not_trigger_reload(repo, store):
+    repo.add(_note("a"))
+    repo.flush()
+
+    with patch.object(store, "list_notes") as list_notes:
+        repo.all()
+    list_notes.assert_not_called()
+
+
+def test_flush_of_note_added_then_deleted_does_not_trigger_reload(repo, store):
+    repo.add(_note("a"))
+    repo.add(_note("bb"))
+    repo.delete("bb")
+    repo.flush()
+
+    with patch.object(store, "list_notes") as list_notes:
+        repo.all()
+    list_notes.assert_not_called()
+
+
+def test_external_write_before_flush_still_reloads(repo, store):
+    repo.add(_note("a"))
+    store.add_notes([_note("zz")])
+    repo.flush()
+
+    assert {n["id"] for n in repo.all()} == {"a", "zz"}
+
+
+def test_agent_public_api_unchanged(repo):
+    agent = EaseNotesAgent(repository=repo)
+
+    created = agent.create_note("Courses", "Lait, pain", color="BLUE")
+    assert created["success"]
+    note_id = created["id"]
+
+    assert agent.update_note(note_id, text="Lait")["text"] == "Lait"
+    assert agent.archive_note(note_id)["archived"] is True
+    assert agent.get_all_notes()[0]["color"] == "BLUE"
+    assert [n["id"] for n in agent.get_notes_by_title("cour")] == [note_id]
+    assert agent.delete_note(note_id)["success"]
+    assert agent.delete_note(note_id) == {"success": False, "error": "Note non trouvée"}
+
+
+def test_search_sees_pending_writes(repo):
+    agent = EaseNotesAgent(repository=repo)
+    note_id = agent.create_note("Réunion projet", "Préparer le budget")["id"]
+
+    assert [n["id"] for n in agent.search("reu")] == [note_id]
+    agent.update_note(note_id, title="Anniversaire")
+    assert agent.search("reunion") == []
+    agent.delete_note(note_id)
+    assert agent.search("anniv") == []
@@ -0,0 +1,211 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import outbox
+from agent_task import TASK_REF_PREFIX
+from outbox import BACKOFF_MAX, EVENT_INSERT, MAX_ATTEMPTS, TASK_INSERT, TASK_STATUS, Outbox, make_key
+
+ITEMS = [
+    {"category": "agenda", "text": "Dentiste", "datetime_iso": "2025-03-10T10:00:00"},
+    {"category": "to_do", "text": "Acheter du pain", "datetime_iso": None},
+    {"category": "note", "text": "Idée"},
+]
+
+
+@pytest.fixture
+def senders():
+    return {EVENT_INSERT: MagicMock(), TASK_INSERT: MagicMock(), TASK_STATUS: MagicMock()}
+
+
+@pytest.fixture
+def box(senders, tmp_path):
+    return Outbox(path=str(tmp_path / "outbox.json"), senders=senders)
+
+
+def _reply(state, detail=None):
+    return lambda entries: {e["key"]: (state, detail) for e in entries}
+
+
+def test_enqueue_items_maps_categories_and_dedups(box):
+    keys = box.enqueue_items(ITEMS, "a1")
+    again = box.enqueue_items(ITEMS, "a1")
+
+    assert keys == again
+    assert [e["kind"] for e in box.status(keys)] == [EVENT_INSERT, TASK_INSERT]
+    assert box.pending_count() == 2
+    # Clé hexadécimale : valide comme id d'événement Google
+    assert all(set(k) <= set("0123456789abcdef") for k in keys)
+
+
+def test_enqueue_saves_once_per_call(box):
+    refs = [{"list_id": "L1", "task_id": f"t{i}", "title": f"T{i}"} for i in range(5)]
+    with patch.object(box, "save", wraps=box.save) as save:
+        box.enqueue_items([dict(ITEMS[1], text=f"Tâche {i}") for i in range(20)])
+        box.enqueue_status(refs, "completed")
+        box.enqueue_status(refs, "needsAction")
+    assert save.call_count == 3
+    assert box.pending_count() == 20 + 5
+
+
+def test_new_acceptance_of_same_items_is_not_deduplicated(box):
+    first = box.enqueue_items(ITEMS[:2], "a1")
+    second = box.enqueue_items(ITEMS[:2], "a2")
+    anonymous = box.enqueue_items(ITEMS[:2])
+
+    assert len(set(first) | set(second) | set(anonymous)) == 6
+    assert box.pending_count() == 6
+
+
+def test_flush_records_outcomes_and_persists(box, senders, tmp_path):
+    event_key, task_key = box.enqueue_items(ITEMS, "a1")
+    senders[EVENT_INSERT].side_effect = _reply("done", {"event_id": event_key})
+    senders[TASK_INSERT].side_effect = _reply("skipped", "invalid_date")
+
+    assert box.flush() == 2
+    states = {e["key"]: e["state"] for e in box.status()}
+    assert states == {event_key: "done", task_key: "skipped"}
+
+    reloaded = Outbox(path=str(tmp_path / "outbox.json"), senders={})
+    assert reloaded.status([event_key])[0]["result"] == {"event_id": event_key}
+    # Déjà envoyé : pas de nouvel envoi
+    assert box.enqueue_items(ITEMS[:1], "a1") == [event_key]
+    assert box.pending_count() == 0
+
+
+def test_retry_with_backoff_until_failed(box, senders):
+    [key] = box.enqueue_items(ITEMS[:1], "a1")
+    senders[EVENT_INSERT].side_effect = _reply("retry", "503")
+
+    now = time.time()
+    assert box.flush(now=now) == 1
+    entry = box.status([key])[0]
+    assert entry["state"] == "pending"
+    assert entry["next_attempt"] > now
+    # Pas encore dû : rien n'est envoyé
+    assert box.flush(now=now) == 0
+
+    for attempt in range(MAX_ATTEMPTS - 1):
+        now += BACKOFF_MAX
+        assert box.flush(now=now) == 1
+    entry = box.status([key])[0]
+    assert entry["state"] == "failed"
+    assert entry["attempts"] == MAX_ATTEMPTS
+
+    # Une entrée en échec peut être remise en file
+    box.enqueue_items(ITEMS[:1], "a1")
+    assert box.status([key])[0]["state"] == "pending"
+
+
+def test_sender_exception_retries_whole_batch(box, senders):
+    keys = box.enqueue_items(ITEMS)
+    senders[EVENT_INSERT].side_effect = RuntimeError("réseau indisponible")
+    senders[TASK_INSERT].side_effect = _reply("done")
+
+    box.flush()
+
+    event, task = box.status(keys)
+    assert (event["state"], event["attempts"], event["error"]) == ("pending", 1, "réseau indisponible")
+    assert task["state"] == "done"
+
+
+def test_listeners_called_after_each_batch(box, senders):
+    calls = []
+    box.listeners.append(lambda kind, entries: calls.append((kind, [e["state"] for e in entries])))
+    box.listeners.append(MagicMock(side_effect=RuntimeError("abonné cassé")))
+    box.enqueue_items(ITEMS)
+    senders[EVENT_INSERT].side_effect = _reply("failed", "400")
+    senders[TASK_INSERT].side_effect = _reply("done")
+
+    box.flush()
+
+    assert sorted(calls) == [(EVENT_INSERT, ["failed"]), (TASK_INSERT, ["done"])]
+
+
+def test_status_change_supersedes_pending_one(box, senders):
+    ref = {"list_id": "L1", "task_id": "t1", "title": "Lait"}
+    [first] = box.enqueue_status([ref], "completed")
+    [second] = box.enqueue_status([ref], "needsAction")
+
+    assert box.status([first])[0]["state"] == "skipped"
+    senders[TASK_STATUS].side_effect = _reply("done")
+    box.flush()
+    sent = senders[TASK_STATUS].call_args.args[0]
+    assert [e["payload"]["status"] for e in sent] == ["needsAction"]
+
+    # Rejouer un statut déjà appliqué est permis (terminer à nouveau)
+    assert box.enqueue_status([ref], "completed") == [first]
+    assert box.status([first])[0]["state"] == "pending"
+
+
+def test_send_event_inserts_uses_keys_as_event_ids():
+    entries = [
+        {"key": make_key(EVENT_INSERT, {"text": t}), "payload": {"text": t}, "attempts": 0}
+        for t in ("A", "B", "C", "D")
+    ]
+    error = Exception("boom")
+    error.resp = MagicMock(status=503)
+    results = [
+        {"status": "created", "event": {"id": entries[0]["key"]}},
+        {"status": "conflict", "conflict": "Réunion"},
+        {"status": "error", "error": error},
+        {"status": "no_date"},
+    ]
+    with patch("agent_write_agenda.authenticate_google_calendar", return_value=MagicMock()), \
+            patch("agent_write_agenda.create_events", return_value=results) as create:
+        outcomes = outbox.send_event_inserts(entries)
+
+    assert create.call_args.kwargs["event_ids"] == [e["key"] for e in entries]
+    assert [outcomes[e["key"]][0] for e in entries] == ["done", "skipped", "retry", "skipped"]
+
+
+def test_send_task_inserts_finds_tasks_created_by_lost_attempt():
+    agent = MagicMock()
+    agent.list_tasklists.return_value = [{"id": "L1"}]
+    agent.get_tasks.return_value = [
+        {"id": "t1", "notes": f"demain\n{TASK_REF_PREFIX}k1"},
+        # Même titre qu'une entrée, créée par une autre acceptation : pas la nôtre
+        {"id": "t2", "title": "Lait", "notes": f"{TASK_REF_PREFIX}autre"},
+    ]
+    agent.create_tasks.return_value = {"results": [{"title": "Lait", "error": "quota", "http_status": 429}]}
+    entries = [
+        {"key": "k1", "payload": {"text": "Pain"}, "attempts": 1, "first_attempt_at": 1000.0},
+        {"key": "k2", "payload": {"text": "Lait"}, "attempts": 1, "first_attempt_at": 1000.0},
+    ]
+    with patch("agent_task.EaseTasksAgent", return_value=agent):
+        outcomes = outbox.send_task_inserts(entries)
+
+    assert outcomes["k1"] == ("done", {"task_id": "t1"})
+    assert outcomes["k2"] == ("retry", "quota")
+    assert agent.create_tasks.call_args.args[1] == [{"text": "Lait"}]
+    assert agent.create_tasks.call_args.kwargs["refs"] == ["k2"]
+
+
+def test_two_workers_share_one_file(senders, tmp_path):
+    path = str(tmp_path / "outbox.json")
+    first = Outbox(path=path, senders=senders)
+    second = Outbox(path=path, senders=senders)
+
+    [event_key] = first.enqueue_items(ITEMS[:1])
+    [task_key] = second.enqueue_items(ITEMS[1:2])
+
+    # Aucune entrée perdue : chaque écriture fusionne le fichier courant
+    keys = {e["key"] for e in Outbox(path=path, senders={}).status()}
+    assert keys == {event_key, task_key}
+
+    senders[EVENT_INSERT].side_effect = _reply("done")
+    senders[TASK_INSERT].side_effect = _reply("done")
+    assert second.flush() == 2
+    assert {e["state"] for e in first.status()} == {"pending"}
+    assert first.flush() == 0
+    assert {e["state"] for e in first.status()} == {"done"}
+
+
+def test_only_one_worker_flushes_at_a_time(box, senders):
+    import json_store
+
+    box.enqueue_items(ITEMS[:1])
+    with json_store.file_lock(f"{box.path}.flush", exclusive=True):
+        assert box.flush() == 0
+    senders[EVENT_INSERT].assert_not_called()
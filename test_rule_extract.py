@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+from agent_extract import valider_items
+from rule_extract import pre_extraire
+
+# Mercredi 26 novembre 2025, 10h
+MAINTENANT = datetime(2025, 11, 26, 10, 0)
+
+
+def test_simple_todo():
+    message, items = pre_extraire("Acheter du pain", MAINTENANT)
+
+    assert items == [{
+        "category": "to_do",
+        "text": "Acheter du pain",
+        "datetime_iso": None,
+        "datetime_raw": None,
+        "confidence": 0.95,
+    }]
+    assert "Acheter du pain" in message
+    valider_items(items)
+
+
+def test_call_with_time_is_agenda():
+    _, items = pre_extraire("Appeler le docteur lundi à 15h", MAINTENANT)
+
+    assert items[0]["category"] == "agenda"
+    assert items[0]["datetime_iso"] == "2025-12-01T15:00:00"
+    assert items[0]["datetime_raw"] == "lundi à 15h"
+
+
+def test_time_range_uses_start_time():
+    _, items = pre_extraire("RDV dentiste demain 14h-16h", MAINTENANT)
+
+    assert items[0]["category"] == "agenda"
+    assert items[0]["datetime_iso"] == "2025-11-27T14:00:00"
+    assert items[0]["text"] == "RDV dentiste demain 14h-16h"
+
+
+def test_time_range_with_a():
+    _, items = pre_extraire("RDV dentiste demain 14h à 16h", MAINTENANT)
+
+    assert items[0]["datetime_iso"] == "2025-11-27T14:00:00"
+    assert items[0]["datetime_raw"] == "demain 14h à 16h"
+
+
+def test_weekday_today_depends_on_time():
+    # MAINTENANT est un mercredi à 10h
+    _, items = pre_extraire("Appeler le docteur mercredi à 15h", MAINTENANT)
+    assert items[0]["datetime_iso"] == "2025-11-26T15:00:00"
+
+    _, items = pre_extraire("Appeler le docteur mercredi à 9h", MAINTENANT)
+    assert items[0]["datetime_iso"] == "2025-12-03T09:00:00"
+
+
+def test_explicit_note():
+    _, items = pre_extraire("Idée : un cadeau pour Marc", MAINTENANT)
+    assert items[0]["category"] == "note"
+    assert items[0]["text"] == "un cadeau pour Marc"
+
+
+@pytest.mark.parametrize("texte", [
+    "Bonjour !",
+    "Acheter du pain et du lait",
+    "Réunion d'équipe mardi prochain à 10h",
+    "Réunion jeudi",
+    "Envoyer le rapport avant vendredi",
+    "Acheter 3 pommes",
+    "Acheter 2h de parking",
+    "Le chat est malade",
+    "Tu peux m'aider ?",
+    "Appeler Marc. Puis réserver le restaurant.",
+])
+def test_low_confidence_falls_back_to_llm(texte):
+    assert pre_extraire(texte, MAINTENANT) is None
+
+
+def test_day_month_just_past_falls_back_to_llm():
+    # Mercredi 14 octobre 2026 : « 12/10 » n'est pas le 12 octobre 2027
+    maintenant = datetime(2026, 10, 14, 10, 0)
+
+    assert pre_extraire("RDV dentiste le 12/10 à 15h", maintenant) is None
+    assert pre_extraire("RDV dentiste le 12 octobre à 15h", maintenant) is None
+
+    _, items = pre_extraire("RDV dentiste le 20/10 à 15h", maintenant)
+    assert items[0]["datetime_iso"] == "2026-10-20T15:00:00"
+    _, items = pre_extraire("RDV dentiste le 12/10/2027 à 15h", maintenant)
+    assert items[0]["datetime_iso"] == "2027-10-12T15:00:00"
@@ -41,7 +41,7 @@ def test_smart_suggest_basic():
     mock_post.status_code = 200
     mock_post.json.return_value = fake_llm_response
 
-    with patch("requests.post", return_value=mock_post):
+    with patch("requests.Session.post", return_value=mock_post):
         result = smart_suggest(json_path=tmp_json_path, output_path=tmp_output)
 
     # -------------------------------------------------------
@@ -0,0 +1,224 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from storage import Storage
+
+
+@pytest.fixture
+def store(tmp_path):
+    return Storage(str(tmp_path / "test.db"))
+
+
+def test_wal_mode(store):
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_items_roundtrip_and_category_filter(store):
+    items = [
+        {"category": "agenda", "text": "Dentiste", "datetime_iso": "2025-03-10T10:00:00"},
+        {"category": "to_do", "text": "Pain", "datetime_iso": None, "extra": [1, 2]},
+    ]
+    assert store.add_items(items) == 2
+
+    assert store.list_items() == items
+    assert store.list_items(category="to_do") == items[1:]
+    assert store.clear_items(category="agenda") == 1
+    assert store.list_items() == items[1:]
+
+
+def test_items_with_known_external_id_are_ignored(store):
+    task = {"category": "to_do", "text": "Pain", "external_id": "g1"}
+    assert store.add_items([task]) == 1
+    assert store.add_items([task, {"category": "to_do", "text": "Lait"}]) == 1
+    assert len(store.list_items()) == 2
+
+
+def test_notes_crud(store):
+    store.add_notes([{"id": "n1", "title": "Idée", "text": "Texte"}])
+
+    note = store.update_note("n1", text="Nouveau", archived=True, id="ignoré")
+    assert (note["id"], note["text"], note["archived"], note["pinned"]) == ("n1", "Nouveau", True, False)
+    assert store.update_note("absent", text="x") is None
+    assert store.delete_note("n1")
+    assert not store.delete_note("n1")
+    assert store.list_notes() == []
+
+
+def test_agenda_events_and_signature_lookup(store):
+    store.add_agenda_events([{"text": "Dentiste", "datetime_iso": "2025-03-10T10:00:00"}])
+
+    assert store.has_agenda_event("Dentiste", "2025-03-10T10:00:00")
+    assert not store.has_agenda_event("Dentiste", "2025-03-11T10:00:00")
+
+
+def test_failed_transaction_rolls_back(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.add_items([{"category": "to_do", "text": "Pain"}])
+            raise RuntimeError("boom")
+
+    assert store.list_items() == []
+
+
+def test_migrate_imports_legacy_files_once(tmp_path, store):
+    items = tmp_path / "extracted_items.json"
+    items.write_text(json.dumps([{"category": "to_do", "text": "Pain"}]), encoding="utf-8")
+    app_notes = tmp_path / "notes.json"
+    app_notes.write_text(json.dumps([{"id": "a", "title": "App", "text": "x", "archived": False}]))
+    agent_notes = tmp_path / "notes_data.json"
+    agent_notes.write_text(json.dumps([{"id": "b", "title": "Agent", "text": "y", "color": "RED", "pinned": True}]))
+    sync = tmp_path / "sync.json"
+    sync.write_text(json.dumps({"calendar_id": "primary", "sync_token": "tok"}))
+    legacy = {
+        "items": str(items),
+        "notes": [str(app_notes), str(agent_notes)],
+        "calendar_sync": str(sync),
+        "agenda_events": str(tmp_path / "absent.json"),
+    }
+
+    imported = store.migrate(legacy)
+
+    assert imported == {str(items): 1, str(app_notes): 1, str(agent_notes): 1, str(sync): 1}
+    assert [n["title"] for n in store.list_notes()] == ["App", "Agent"]
+    assert store.get_note("b")["color"] == "RED"
+    assert store.get_state("calendar_sync_token:primary") == "tok"
+    assert not items.exists() and (tmp_path / "extracted_items.json.migrated").exists()
+
+    # Fichier restauré par erreur : déjà migré, pas de doublon
+    (tmp_path / "extracted_items.json.migrated").rename(items)
+    assert store.migrate(legacy) == {}
+    assert len(store.list_items()) == 1
+
+
+def test_concurrent_writers(store):
+    def write(n):
+        for i in range(20):
+            store.add_items([{"category": "to_do", "text": f"{n}-{i}"}])
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(store.list_items()) == 80
+
+
+def test_search_prefix_accents_and_ranking(store):
+    store.add_notes([
+        {"id": "a", "title": "Courses", "text": "Penser à la réunion de budget"},
+        {"id": "b", "title": "Réunion budget", "text": "Salle 3"},
+        {"id": "c", "title": "Sport", "text": "Piscine"},
+    ])
+    store.index_items([{"category": "agenda", "text": "Réunion d'équipe mardi"}])
+
+    hits = store.search("reu budg")
+    # Titre pondéré plus fort que le texte
+    assert [(h["kind"], h["id"]) for h in hits] == [("note", "b"), ("note", "a")]
+    assert [h["kind"] for h in store.search("équipe")] == ["item"]
+    assert store.search("reunion", kinds=("item",))[0]["text"] == "Réunion d'équipe mardi"
+    assert store.search('"; DROP TABLE notes --') == []
+    assert store.search("   ") == []
+
+
+def test_search_index_follows_updates_and_deletes(store):
+    store.add_notes([{"id": "a", "title": "Brouillon", "text": ""}])
+    store.save_notes(upserts=[{"id": "a", "title": "Anniversaire", "text": "Cadeau"}])
+
+    assert store.search("brouillon") == []
+    assert [h["id"] for h in store.search("cadeau anniv")] == ["a"]
+
+    store.delete_note("a")
+    assert store.search("cadeau") == []
+
+
+def test_accepted_items_stay_searchable_after_clear(store):
+    items = [{"category": "to_do", "text": "Acheter un cadeau"}, {"category": "note", "text": ""}]
+    store.add_items(items)
+    assert store.index_items(items) == 1
+    assert store.index_items(items) == 0
+    store.clear_items()
+
+    assert [(h["kind"], h["text"]) for h in store.search("cadeau")] == [("item", "Acheter un cadeau")]
+
+
+def test_search_index_built_for_existing_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    Storage(path).add_notes([{"id": "a", "title": "Médecin", "text": ""}])
+    # Base créée avant l'index plein texte
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TABLE notes_fts; DROP TRIGGER notes_fts_insert; DROP TABLE items_fts;")
+    conn.close()
+
+    assert [h["id"] for h in Storage(path).search("medecin")] == ["a"]
+
+
+def test_search_index_rebuilt_for_rowid_keyed_index(tmp_path):
+    path = str(tmp_path / "old.db")
+    Storage(path).add_notes([{"id": "a", "title": "Médecin", "text": ""}])
+    # Ancien index des notes (contenu externe par rowid implicite)
+    conn = sqlite3.connect(path)
+    conn.executescript("DROP TABLE notes_fts; DROP TABLE notes_fts_keys; CREATE VIRTUAL TABLE notes_fts "
+                       "USING fts5(title, text, content='notes', content_rowid='rowid');")
+    conn.close()
+
+    store = Storage(path)
+    store.add_notes([{"id": "b", "title": "Médecine", "text": ""}])
+    assert sorted(h["id"] for h in store.search("medecin")) == ["a", "b"]
+
+
+def test_search_survives_vacuum(store):
+    store.add_notes([{"id": n, "title": f"Note {n}", "text": ""} for n in ("z", "y", "x")])
+    store.add_notes([{"id": "w", "title": "Médecin", "text": ""}])
+    store.delete_note("z")
+    store.delete_note("y")
+    # VACUUM peut renuméroter le rowid implicite d'une table à clé TEXT
+    store.conn.execute("VACUUM")
+
+    assert [h["id"] for h in store.search("medecin")] == ["w"]
+    store.delete_note("w")
+    assert store.search("medecin") == []
+
+
+def test_search_merges_sources_on_raw_bm25(store):
+    # Item à peine pertinent (mot noyé dans un long texte) : après la bonne note
+    store.add_notes([{"id": "a", "title": "Budget", "text": "budget"}])
+    store.add_notes([{"id": str(i), "title": "Autre", "text": "divers"} for i in range(20)])
+    store.index_items([{"category": "agenda", "text": "budget " + "mot " * 200}])
+    store.index_items([{"category": "to_do", "text": f"tâche {i}"} for i in range(20)])
+
+    hits = store.search("budget")
+    assert [h["kind"] for h in hits] == ["note", "item"]
+    assert hits[0]["score"] < hits[1]["score"]
+
+
+def test_short_words_are_not_prefix_expanded(store):
+    store.add_notes([{"id": "a", "title": "Appel", "text": "rappeler"}, {"id": "b", "title": "A faire", "text": ""}])
+
+    assert [h["id"] for h in store.search("a")] == ["b"]
+    assert [h["id"] for h in store.search("app")] == ["a"]
+
+
+def test_search_latency_on_large_corpus(store):
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=8)) for _ in range(20000)]
+    store.add_notes(
+        {"id": str(i), "title": " ".join(rng.sample(vocabulary, 3)),
+         "text": " ".join(rng.sample(vocabulary, 40) + ["commun", "a"])}
+        for i in range(20000)
+    )
+
+    timings = []
+    # Requêtes ciblées, puis très larges (toutes les notes correspondent)
+    for query in [word[:6] for word in rng.sample(vocabulary, 20)] + ["a", "b", "com", "commun"]:
+        start = time.perf_counter()
+        store.search(query, limit=10)
+        timings.append(time.perf_counter() - start)
+
+    assert sorted(timings)[len(timings) // 2] < 0.010
+    assert max(timings) < 0.050
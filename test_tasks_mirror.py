@@ -0,0 +1,128 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from outbox import EVENT_INSERT, TASK_INSERT, TASK_STATUS, Outbox
+from tasks_mirror import TasksMirror
+
+
+@pytest.fixture
+def agent():
+    agent = MagicMock()
+    agent.list_tasklists.return_value = [{"id": "L1", "title": "Perso"}]
+    agent.get_all_tasks.return_value = [{
+        "tasklist": {"id": "L1", "title": "Perso"},
+        "tasks": [
+            {"id": "b", "title": "Pain", "status": "needsAction", "position": "2", "etag": "e1"},
+            {"id": "a", "title": "Lait", "status": "needsAction", "position": "1", "etag": "e1"},
+        ],
+        "error": None,
+    }]
+    return agent
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    senders = {EVENT_INSERT: MagicMock(), TASK_INSERT: MagicMock(), TASK_STATUS: MagicMock()}
+    return Outbox(path=str(tmp_path / "outbox.json"), senders=senders)
+
+
+@pytest.fixture
+def mirror(agent, outbox, tmp_path):
+    return TasksMirror(agent_factory=lambda: agent, path=str(tmp_path / "mirror.json"), outbox=outbox)
+
+
+def test_initial_refresh_and_snapshot(mirror, agent, outbox, tmp_path):
+    assert mirror.is_empty
+    mirror.refresh()
+
+    assert [t["title"] for t in mirror.snapshot()] == ["Lait", "Pain"]
+    assert "updatedMin" not in agent.get_all_tasks.call_args.kwargs
+
+    reloaded = TasksMirror(agent_factory=lambda: agent, path=str(tmp_path / "mirror.json"), outbox=outbox)
+    assert reloaded.snapshot() == mirror.snapshot()
+
+
+def test_incremental_refresh_merges_changes(mirror, agent):
+    mirror.refresh()
+    synced = mirror.synced_at
+    agent.get_all_tasks.return_value = [{
+        "tasklist": {"id": "L1", "title": "Perso"},
+        "tasks": [
+            {"id": "a", "deleted": True},
+            {"id": "b", "title": "Pain complet", "status": "needsAction", "position": "2"},
+        ],
+        "error": None,
+    }]
+
+    mirror.refresh()
+
+    kwargs = agent.get_all_tasks.call_args.kwargs
+    assert kwargs["updatedMin"] == synced
+    assert kwargs["showDeleted"] is True
+    assert [t["title"] for t in mirror.snapshot()] == ["Pain complet"]
+
+
+def test_failed_list_keeps_previous_sync_point(mirror, agent):
+    mirror.refresh()
+    synced = mirror.synced_at
+    agent.get_all_tasks.return_value = [{"tasklist": {"id": "L1", "title": "Perso"}, "tasks": [], "error": "503"}]
+
+    mirror.refresh()
+
+    assert mirror.synced_at == synced
+    assert "503" in mirror.last_error
+    assert len(mirror.snapshot()) == 2
+
+
+def _status(mirror, task_id):
+    return next(t for t in mirror.snapshot() if t["task_id"] == task_id)["status"]
+
+
+def test_set_status_goes_through_outbox(mirror, agent, outbox, tmp_path):
+    mirror.refresh()
+    task = next(t for t in mirror.snapshot() if t["task_id"] == "a")
+
+    [key] = mirror.set_status([task], "completed")
+    assert _status(mirror, "a") == "completed"
+    assert outbox.status([key])[0]["payload"]["previous_status"] == "needsAction"
+    agent.bulk_set_status.assert_not_called()
+
+    # Un refresh (Google pas encore à jour) ne doit pas écraser le changement en file,
+    # même après un redémarrage : l'outbox est sur disque
+    restarted = TasksMirror(agent_factory=lambda: agent, path=str(tmp_path / "mirror.json"),
+                            outbox=Outbox(path=outbox.path, senders=outbox.senders))
+    restarted.refresh(full=True)
+    assert _status(restarted, "a") == "completed"
+
+    outbox.senders[TASK_STATUS].side_effect = lambda entries: {e["key"]: ("done", None) for e in entries}
+    with patch.object(mirror, "request_refresh") as refresh:
+        outbox.flush()
+    assert outbox.status([key])[0]["state"] == "done"
+    refresh.assert_called_once()
+
+
+def test_set_status_rolls_back_on_failure(mirror, agent, outbox):
+    mirror.refresh()
+    outbox.senders[TASK_STATUS].side_effect = lambda entries: {
+        e["key"]: ("failed", "412 Precondition Failed") for e in entries
+    }
+    task = next(t for t in mirror.snapshot() if t["task_id"] == "a")
+
+    mirror.set_status([task], "completed")
+    outbox.flush()
+
+    assert _status(mirror, "a") == "needsAction"
+    assert "412" in mirror.last_error
+
+
+def test_background_refresh_on_request(mirror, agent):
+    mirror.interval = 3600
+    mirror.start()
+    with mirror._refreshed:
+        assert mirror._refreshed.wait_for(lambda: mirror.generation == 1, timeout=1)
+
+    mirror.request_refresh(wait=1)
+
+    assert mirror.generation == 2
+    assert agent.list_tasklists.call_count == 2
@@ -0,0 +1,12 @@
+"""
+Motifs d'heures partagés par la pré-extraction (``rule_extract``) et l'écriture
+d'agenda (``agent_write_agenda``). Module sans dépendance : la pré-extraction,
+sur le chemin rapide, l'importe sans charger Google ni le stockage.
+"""
+
+# Patterns pour matcher les intervalles horaires
+# groupes : heure début, minutes début, heure fin, minutes fin
+TIME_RANGE_PATTERNS = [
+    r'(\d{1,2})h(\d{0,2})\s*[-à]\s*(\d{1,2})h(\d{0,2})',  # "16h-19h", "16h30-18h45"
+    r'(\d{1,2}):(\d{2})\s*[-à]\s*(\d{1,2}):(\d{2})',       # "16:00-19:00"
+]